@@ -0,0 +1,72 @@
+"""
+Benchmark of the data-parallel scaling of batched JAX agents across devices.
+
+A population of agents is rolled out against a batch of environments (``pymdp.jax.task.rollout``) with the agent and environment
+batches sharded over 1, 2, 4, ... devices (``pymdp.jax.sharding``). For each device count, the script reports the wall-clock time
+per episode, the throughput in agent-steps per second and the scaling efficiency, i.e. the speed-up over a single device divided by the number of devices.
+
+On a CPU host, devices are emulated with one device per core:
+
+    python examples/sharding_benchmark.py --devices 8 --batch_size 1024
+"""
+
+import argparse
+import os
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--devices", type=int, default=os.cpu_count(), help="number of (host) devices to emulate")
+parser.add_argument("--batch_size", type=int, default=512, help="number of agents, must be a multiple of the number of devices")
+parser.add_argument("--num_timesteps", type=int, default=50)
+parser.add_argument("--policy_len", type=int, default=2)
+parser.add_argument("--repeats", type=int, default=5)
+args = parser.parse_args()
+
+# the number of host devices has to be set before jax is imported
+os.environ["XLA_FLAGS"] = os.environ.get("XLA_FLAGS", "") + f" --xla_force_host_platform_device_count={args.devices}"
+
+import jax
+import jax.numpy as jnp
+from jax import random as jr
+
+from pymdp.jax.agent import Agent
+from pymdp.jax.task import PyMDPEnv, rollout
+from pymdp.jax.sharding import make_batch_mesh, shard_batch
+from pymdp.utils import random_A_matrix, random_B_matrix
+
+num_obs = [4, 4]
+num_states = [4, 3]
+num_controls = [3, 2]
+batch_size = args.batch_size
+
+A = [jnp.broadcast_to(a, (batch_size,) + a.shape) for a in random_A_matrix(num_obs, num_states)]
+B = [jnp.broadcast_to(b, (batch_size,) + b.shape) for b in random_B_matrix(num_states, num_controls)]
+C = [jnp.zeros((batch_size, no)) for no in num_obs]
+D = [jnp.ones((batch_size, ns)) / ns for ns in num_states]
+
+agent = Agent(A, B, C, D, None, None, None, policy_len=args.policy_len, action_selection="stochastic")
+env = PyMDPEnv({"A": A, "B": B, "D": D}, {"A": agent.A_dependencies, "B": agent.B_dependencies})
+
+device_counts = [n for n in [2 ** i for i in range(16)] if n <= len(jax.devices())]
+
+print(f"{'devices':>8} {'s / episode':>12} {'agent-steps / s':>16} {'efficiency':>11}")
+base_time = None
+for num_devices in device_counts:
+    if batch_size % num_devices != 0:
+        continue
+
+    mesh = make_batch_mesh(jax.devices()[:num_devices])
+    sharded_agent = shard_batch(agent, batch_size, mesh)
+    sharded_env = shard_batch(env, batch_size, mesh)
+
+    # the first call compiles the episode
+    jax.block_until_ready(rollout(sharded_agent, sharded_env, args.num_timesteps, jr.PRNGKey(0)))
+
+    start = time.perf_counter()
+    for i in range(args.repeats):
+        jax.block_until_ready(rollout(sharded_agent, sharded_env, args.num_timesteps, jr.PRNGKey(i)))
+    episode_time = (time.perf_counter() - start) / args.repeats
+
+    base_time = episode_time if base_time is None else base_time
+    efficiency = base_time / (episode_time * num_devices)
+    print(f"{num_devices:>8} {episode_time:>12.4f} {batch_size * args.num_timesteps / episode_time:>16.0f} {efficiency:>11.2f}")
@@ -7,4 +7,6 @@ from . import inference
 from . import learning
 from . import algos
 from . import default_models
+from . import trajectory
+from . import runner
 from . import jax
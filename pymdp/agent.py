@@ -11,6 +11,7 @@ import warnings
 import numpy as np
 from pymdp import inference, control, learning
 from pymdp import utils, maths
+from pymdp.algos.mmp import get_mmp_message_operators
 import copy
 
 class Agent(object):
@@ -64,7 +65,18 @@ class Agent(object):
         policy_sep_prior=False,
         save_belief_hist=False,
         A_factor_list=None,
-        B_factor_list=None
+        B_factor_list=None,
+        planner="full", # how policies are evaluated: exhaustively ("full"), re-using the plan of the previous timestep ("receding"), with beam search ("beam") or with Monte Carlo tree search ("mcts")
+        num_reused_plans=None,
+        plan_reuse_tol=1e-8,
+        beam_width=8,
+        num_simulations=100,
+        mcts_time_budget=None,
+        mcts_exploration=1.0,
+        policy_prune_threshold=None, # policies whose prior probability in `E` is below this threshold are not evaluated
+        policy_prune_top_k=None, # only the `policy_prune_top_k` policies with highest prior probability in `E` are evaluated
+        policy_prune_tol=None, # tolerance of the branch-and-bound pruning of policies (see `control.update_posterior_policies_pruned`)
+        max_joint_states=4096 # with `inference_algo` FILTER, the largest joint state space that is filtered exactly, above which fixed point iteration is used
     ):
 
         ### Constant parameters ###
@@ -78,6 +90,17 @@ class Agent(object):
         self.use_utility = use_utility
         self.use_states_info_gain = use_states_info_gain
         self.use_param_info_gain = use_param_info_gain
+        self.planner = planner
+        self.num_reused_plans = num_reused_plans
+        self.plan_reuse_tol = plan_reuse_tol
+        self.beam_width = beam_width
+        self.num_simulations = num_simulations
+        self.mcts_time_budget = mcts_time_budget
+        self.mcts_exploration = mcts_exploration
+        self.policy_prune_threshold = policy_prune_threshold
+        self.policy_prune_top_k = policy_prune_top_k
+        self.policy_prune_tol = policy_prune_tol
+        self.max_joint_states = max_joint_states
 
         # learning parameters
         self.modalities_to_learn = modalities_to_learn
@@ -187,7 +210,11 @@ class Agent(object):
         # Again, the use can specify a set of possible policies, or
         # all possible combinations of actions and timesteps will be considered
         if policies == None:
-            policies = self._construct_policies()
+            if self.planner in ["beam", "mcts"]:
+                # these planners do not enumerate policies: `self.policies` is replaced by the policies found by each search
+                policies = control.construct_policies(self.num_states, self.num_controls, 1, self.control_fac_idx)
+            else:
+                policies = self._construct_policies()
         self.policies = policies
 
         assert all([len(self.num_controls) == policy.shape[1] for policy in self.policies]), "Number of control states is not consistent with policy dimensionalities"
@@ -238,6 +265,8 @@ class Agent(object):
 
         # Construct prior over policies (uniform if not specified) 
         if E is not None:
+            if self.planner in ["beam", "mcts"]:
+                raise ValueError(f"A prior over policies `E` cannot be used with the '{self.planner}' planner, since the set of policies changes with every search")
             if not isinstance(E, np.ndarray):
                 raise TypeError(
                     'E vector must be a numpy array'
@@ -284,11 +313,29 @@ class Agent(object):
             self.inference_params = self._get_default_params()
             self.inference_horizon = inference_horizon
 
+        if self.inference_algo == "FB":
+            independent_factors = all([list(self.B_factor_list[f]) == [f] for f in range(self.num_factors)]) and all([len(self.A_factor_list[m]) == 1 for m in range(self.num_modalities)])
+            if not independent_factors:
+                raise ValueError(
+                    "`inference_algo` FB requires independent hidden state factors: each modality must depend on a single factor (`A_factor_list`) and the dynamics of each factor only on itself (`B_factor_list`)"
+                )
+
+        if self.planner not in ["full", "receding", "beam", "mcts"]:
+            raise ValueError(f"`planner` must be one of 'full', 'receding', 'beam' or 'mcts', got '{self.planner}'")
+        if self.planner != "full" and self.inference_algo not in ["VANILLA", "FILTER"]:
+            raise NotImplementedError(f"The '{self.planner}' planner is only implemented for `inference_algo` VANILLA or FILTER")
+
+        self.prune_policies = any([p is not None for p in [self.policy_prune_threshold, self.policy_prune_top_k, self.policy_prune_tol]])
+        if self.prune_policies and (self.planner != "full" or self.inference_algo not in ["VANILLA", "FILTER"]):
+            raise NotImplementedError("Pruning of policies is only implemented for the 'full' planner and `inference_algo` VANILLA or FILTER")
+
         if save_belief_hist:
             self.qs_hist = []
             self.q_pi_hist = []
         
         self.prev_obs = []
+        self.lh_cache = None # rolling cache of the likelihoods of the observations within the inference horizon, used when `self.inference_algo` is "MMP" or "FB"
+        self.msg_ops = None # transition operators of MMP, re-computed whenever `self.B` changes
         self.reset()
         
         self.action = None
@@ -342,9 +389,12 @@ class Agent(object):
         """
 
         self.curr_timestep = 0
+        self.policy_tree = None # tree of policy prefixes evaluated at the previous timestep, re-used when `self.planner == "receding"`
+        self.search_tree = None # Monte Carlo search tree of the previous timestep, re-used when `self.planner == "mcts"`
+        self.qs_joint = None # joint posterior over hidden states, kept when `self.inference_algo == "FILTER"`
 
         if init_qs is None:
-            if self.inference_algo == 'VANILLA':
+            if self.inference_algo in ['VANILLA', 'FILTER']:
                 self.qs = utils.obj_array_uniform(self.num_states)
             else: # in the case you're doing MMP (i.e. you have an inference_horizon > 1), we have to account for policy- and timestep-conditioned posterior beliefs
                 self.qs = utils.obj_array(len(self.policies))
@@ -391,7 +441,7 @@ class Agent(object):
 
         self.curr_timestep += 1
 
-        if self.inference_algo == "MMP" and (self.curr_timestep - self.inference_horizon) >= 0:
+        if self.inference_algo in ["MMP", "FB"] and (self.curr_timestep - self.inference_horizon) >= 0:
             self.set_latest_beliefs()
         
         return self.curr_timestep
@@ -481,7 +531,20 @@ class Agent(object):
         if not hasattr(self, "qs"):
             self.reset()
 
-        if self.inference_algo == "VANILLA":
+        if self.inference_algo == "FILTER" and np.prod(self.num_states) <= self.max_joint_states:
+            if self.action is not None and self.qs_joint is not None:
+                joint_prior = control.get_expected_joint_states(self.qs_joint, self.B, self.B_factor_list, self.action)
+            else:
+                joint_prior = maths.spm_cross(self.D)
+            qs, self.qs_joint = inference.update_posterior_states_filter(
+                self.A,
+                observation,
+                self.num_obs,
+                self.num_states,
+                self.mb_dict,
+                joint_prior
+            )
+        elif self.inference_algo in ["VANILLA", "FILTER"]: # `FILTER` falls back to fixed point iteration when the joint state space is too large
             if self.action is not None:
                 empirical_prior = control.get_expected_states_interactions(
                     self.qs, self.B, self.B_factor_list, self.action.reshape(1, -1) 
@@ -497,7 +560,7 @@ class Agent(object):
                 empirical_prior,
                 **self.inference_params
             )
-        elif self.inference_algo == "MMP":
+        elif self.inference_algo in ["MMP", "FB"]:
 
             self.prev_obs.append(observation)
             if len(self.prev_obs) > self.inference_horizon:
@@ -507,6 +570,37 @@ class Agent(object):
                 latest_obs = self.prev_obs
                 latest_actions = self.prev_actions
 
+            # only the likelihood of the new observation is computed, the likelihoods of the earlier observations in the horizon are re-used
+            self.lh_cache = inference.update_likelihood_cache(
+                self.lh_cache,
+                self.A,
+                observation,
+                self.num_obs,
+                self.num_states,
+                self.A_factor_list,
+                self.inference_horizon
+            )
+
+        if self.inference_algo == "FB":
+
+            qs, F = inference.update_posterior_states_forward_backward(
+                self.A,
+                self.mb_dict,
+                self.B,
+                latest_obs,
+                self.policies,
+                latest_actions,
+                prior = self.latest_belief,
+                policy_sep_prior = self.edge_handling_params['policy_sep_prior'],
+                lh_cache = self.lh_cache
+            )
+
+            self.F = F # negative log evidence of the observations, under each policy
+
+        elif self.inference_algo == "MMP":
+
+            self.msg_ops = get_mmp_message_operators(self.B, self.B_factor_list, self.msg_ops)
+
             qs, F = inference.update_posterior_states_full_factorized(
                 self.A,
                 self.mb_dict,
@@ -517,6 +611,8 @@ class Agent(object):
                 latest_actions, 
                 prior = self.latest_belief, 
                 policy_sep_prior = self.edge_handling_params['policy_sep_prior'],
+                lh_cache = self.lh_cache,
+                msg_ops = self.msg_ops,
                 **self.inference_params
             )
 
@@ -646,7 +742,7 @@ class Agent(object):
         self.G = G
         return q_pi, G
     
-    def infer_policies(self):
+    def infer_policies(self, deadline=None):
         """
         Perform policy inference by optimizing a posterior (categorical) distribution over policies.
         This distribution is computed as the softmax of ``G * gamma + lnE`` where ``G`` is the negative expected
@@ -654,6 +750,23 @@ class Agent(object):
         This function returns the posterior over policies as well as the negative expected free energy of each policy.
         In this version of the function, the expected free energy of policies is computed using known factorized structure 
         in the model, which speeds up computation (particular the state information gain calculations).
+        If ``self.planner == "receding"``, the plan evaluated at the previous timestep is re-used (see ``control.update_posterior_policies_receding``).
+        If ``self.planner == "beam"``, policies are found with beam search (see ``control.update_posterior_policies_beam``) and ``self.policies``
+        is set to the policies that survived the search, so that ``q_pi`` and ``G`` refer to those policies.
+        If ``self.planner == "mcts"``, policies are found with Monte Carlo tree search under a budget of ``self.num_simulations`` simulations and/or
+        ``self.mcts_time_budget`` seconds (see ``control.update_posterior_policies_mcts``), re-using the search tree below the last action taken,
+        and ``self.policies`` is likewise set to the policies found by the search.
+        If any of ``self.policy_prune_threshold``, ``self.policy_prune_top_k`` or ``self.policy_prune_tol`` is set, policies with low prior probability
+        in ``self.E`` are pruned before their expected free energy is computed (see ``control.update_posterior_policies_pruned``). The mask of pruned
+        policies is stored in ``self.policies_pruned`` and their number in ``self.num_pruned_policies``.
+
+        Parameters
+        ----------
+        deadline: ``float``, default ``None``
+            If given, policies are evaluated in an anytime fashion (see ``control.update_posterior_policies_anytime``): they are evaluated in order of
+            their posterior probability at the previous timestep (or of their prior probability ``self.E`` at the first timestep) and the evaluation
+            stops after ``deadline`` seconds. Policies that were not evaluated in time are masked out of ``q_pi`` and ``G``, and the mask is stored
+            in ``self.policies_evaluated``.
 
         Returns
         ----------
@@ -663,7 +776,123 @@ class Agent(object):
             Negative expected free energies of each policy, i.e. a vector containing one negative expected free energy per policy.
         """
 
-        if self.inference_algo == "VANILLA":
+        if deadline is not None and (self.inference_algo not in ["VANILLA", "FILTER"] or self.planner != "full" or self.prune_policies):
+            raise NotImplementedError("A `deadline` is only supported with the 'VANILLA' or 'FILTER' inference algorithms and the 'full' planner, without pruning of policies")
+
+        if self.inference_algo in ["VANILLA", "FILTER"] and deadline is not None:
+            q_pi_prev = getattr(self, "q_pi", None)
+            q_pi, G, evaluated = control.update_posterior_policies_anytime(
+                self.qs,
+                self.A,
+                self.B,
+                self.C,
+                self.A_factor_list,
+                self.B_factor_list,
+                self.policies,
+                deadline=deadline,
+                priority=q_pi_prev if q_pi_prev is not None and len(q_pi_prev) == len(self.policies) else None,
+                use_utility=self.use_utility,
+                use_states_info_gain=self.use_states_info_gain,
+                use_param_info_gain=self.use_param_info_gain,
+                pA=self.pA,
+                pB=self.pB,
+                E=self.E,
+                I=self.I,
+                gamma=self.gamma
+            )
+        elif self.inference_algo in ["VANILLA", "FILTER"] and self.prune_policies:
+            q_pi, G, pruned = control.update_posterior_policies_pruned(
+                self.qs,
+                self.A,
+                self.B,
+                self.C,
+                self.A_factor_list,
+                self.B_factor_list,
+                self.policies,
+                E_threshold=self.policy_prune_threshold,
+                top_k=self.policy_prune_top_k,
+                bound_tol=self.policy_prune_tol,
+                use_utility=self.use_utility,
+                use_states_info_gain=self.use_states_info_gain,
+                use_param_info_gain=self.use_param_info_gain,
+                pA=self.pA,
+                pB=self.pB,
+                E=self.E,
+                I=self.I,
+                gamma=self.gamma
+            )
+            self.policies_pruned = pruned
+            self.num_pruned_policies = int(pruned.sum())
+        elif self.inference_algo in ["VANILLA", "FILTER"] and self.planner == "receding":
+            q_pi, G, self.policy_tree = control.update_posterior_policies_receding(
+                self.qs,
+                self.A,
+                self.B,
+                self.C,
+                self.A_factor_list,
+                self.B_factor_list,
+                self.policies,
+                action=self.action,
+                q_pi_prev=self.q_pi if hasattr(self, "q_pi") else None,
+                policy_tree=self.policy_tree,
+                num_reused_plans=self.num_reused_plans,
+                reuse_tol=self.plan_reuse_tol,
+                use_utility=self.use_utility,
+                use_states_info_gain=self.use_states_info_gain,
+                use_param_info_gain=self.use_param_info_gain,
+                pA=self.pA,
+                pB=self.pB,
+                E=self.E,
+                I=self.I,
+                gamma=self.gamma
+            )
+        elif self.inference_algo in ["VANILLA", "FILTER"] and self.planner == "beam":
+            q_pi, G, policies = control.update_posterior_policies_beam(
+                self.qs,
+                self.A,
+                self.B,
+                self.C,
+                self.A_factor_list,
+                self.B_factor_list,
+                self.num_controls,
+                policy_len=self.policy_len,
+                beam_width=self.beam_width,
+                use_utility=self.use_utility,
+                use_states_info_gain=self.use_states_info_gain,
+                use_param_info_gain=self.use_param_info_gain,
+                pA=self.pA,
+                pB=self.pB,
+                I=self.I,
+                gamma=self.gamma
+            )
+            self.policies = policies
+            self.E = self._construct_E_prior()
+        elif self.inference_algo in ["VANILLA", "FILTER"] and self.planner == "mcts":
+            q_pi, G, policies, self.search_tree = control.update_posterior_policies_mcts(
+                self.qs,
+                self.A,
+                self.B,
+                self.C,
+                self.A_factor_list,
+                self.B_factor_list,
+                self.num_controls,
+                policy_len=self.policy_len,
+                num_simulations=self.num_simulations,
+                time_budget=self.mcts_time_budget,
+                exploration=self.mcts_exploration,
+                action=self.action,
+                search_tree=self.search_tree,
+                use_utility=self.use_utility,
+                use_states_info_gain=self.use_states_info_gain,
+                use_param_info_gain=self.use_param_info_gain,
+                pA=self.pA,
+                pB=self.pB,
+                I=self.I,
+                gamma=self.gamma
+            )
+            self.policies = policies
+            self.E = self._construct_E_prior()
+        elif self.inference_algo in ["VANILLA", "FILTER"]:
             q_pi, G = control.update_posterior_policies_factorized(
                 self.qs,
                 self.A,
@@ -681,7 +910,7 @@ class Agent(object):
                 I=self.I,
                 gamma=self.gamma
             )
-        elif self.inference_algo == "MMP":
+        elif self.inference_algo in ["MMP", "FB"]:
 
             future_qs_seq = self.get_future_qs()
 
@@ -712,6 +941,7 @@ class Agent(object):
 
         self.q_pi = q_pi
         self.G = G
+        self.policies_evaluated = evaluated if deadline is not None else np.ones(len(q_pi), dtype=bool)
         return q_pi, G
 
     def sample_action(self):
@@ -796,6 +1026,7 @@ class Agent(object):
 
         self.pA = qA # set new prior to posterior
         self.A = utils.norm_dist_obj_arr(qA) # take expected value of posterior Dirichlet parameters to calculate posterior over A array
+        self.policy_tree, self.search_tree = None, None # the expected free energies of the previous plans were computed with the old model, so they cannot be re-used
 
         return qA
 
@@ -826,6 +1057,7 @@ class Agent(object):
 
         self.pA = qA # set new prior to posterior
         self.A = utils.norm_dist_obj_arr(qA) # take expected value of posterior Dirichlet parameters to calculate posterior over A array
+        self.policy_tree, self.search_tree = None, None # the expected free energies of the previous plans were computed with the old model, so they cannot be re-used
 
         return qA
 
@@ -857,6 +1089,7 @@ class Agent(object):
 
         self.pB = qB # set new prior to posterior
         self.B = utils.norm_dist_obj_arr(qB)  # take expected value of posterior Dirichlet parameters to calculate posterior over B array
+        self.policy_tree, self.search_tree = None, None # the expected free energies of the previous plans were computed with the old model, so they cannot be re-used
 
         return qB
     
@@ -887,6 +1120,7 @@ class Agent(object):
 
         self.pB = qB # set new prior to posterior
         self.B = utils.norm_dist_obj_arr(qB)  # take expected value of posterior Dirichlet parameters to calculate posterior over B array
+        self.policy_tree, self.search_tree = None, None # the expected free energies of the previous plans were computed with the old model, so they cannot be re-used
 
         return qB
     
@@ -909,7 +1143,7 @@ class Agent(object):
             Posterior Dirichlet parameters over initial hidden state prior (same shape as ``qs_t0``), after having updated it with state beliefs.
         """
         
-        if self.inference_algo == "VANILLA":
+        if self.inference_algo in ["VANILLA", "FILTER"]:
             
             if qs_t0 is None:
                 
@@ -918,7 +1152,7 @@ class Agent(object):
                 except ValueError:
                     print("qs_t0 must either be passed as argument to `update_D` or `save_belief_hist` must be set to True!")             
 
-        elif self.inference_algo == "MMP":
+        elif self.inference_algo in ["MMP", "FB"]:
             
             if self.edge_handling_params['use_BMA']:
                 qs_t0 = self.latest_belief
@@ -945,10 +1179,12 @@ class Agent(object):
     def _get_default_params(self):
         method = self.inference_algo
         default_params = None
-        if method == "VANILLA":
+        if method in ["VANILLA", "FILTER"]: # `FILTER` uses these parameters when it falls back to fixed point iteration
             default_params = {"num_iter": 10, "dF": 1.0, "dF_tol": 0.001, "compute_vfe": True}
         elif method == "MMP":
             default_params = {"num_iter": 10, "grad_descent": True, "tau": 0.25}
+        elif method == "FB":
+            default_params = {} # forward-backward inference is exact, so it has no parameters
         elif method == "VMP":
             raise NotImplementedError("VMP is not implemented")
         elif method == "BP":
@@ -1,2 +1,3 @@
 from .fpi import run_vanilla_fpi, run_vanilla_fpi_factorized
 from .mmp import run_mmp, run_mmp_factorized, _run_mmp_testing
+from .fb import run_forward_backward
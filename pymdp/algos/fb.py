@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from scipy import special
+
+from pymdp.utils import obj_array, is_obj_array
+from pymdp.maths import spm_log_single
+
+def run_forward_backward(lh_seq, B, policies, prev_actions=None, prior=None):
+    """
+    Exact (forward-backward) inference of the marginal posterior beliefs about hidden states over time, for all policies at once. This assumes
+    that the hidden state factors are independent of each other, i.e. that the dynamics of each factor only depend on itself and that
+    each observation modality only depends on a single factor. Each factor is then a hidden Markov model, whose posterior is computed with
+    the forward (alpha) and backward (beta) recursions in log space. The posterior beliefs about the past only depend on the policies through ``prior``,
+    so the backward messages are shared by all policies, and the forward messages of all policies are computed together.
+
+    Parameters
+    ----------
+    lh_seq: ``numpy.ndarray`` of dtype object
+        Likelihoods of hidden states under a sequence of observations over time. Each ``lh_seq[t]`` is an object array, whose entry ``lh_seq[t][f]``
+        stores the likelihood of the states of factor ``f`` given the observation at time ``t`` (the product of the likelihoods of the modalities that depend on ``f``).
+    B: ``numpy.ndarray`` of dtype object
+        Dynamics likelihood mapping or 'transition model', mapping from hidden states at ``t`` to hidden states at ``t+1``, given some control state ``u``.
+        Each element ``B[f]`` of this object array stores a 3-D tensor for hidden state factor ``f``, whose entries ``B[f][s, v, u]`` store the probability
+        of hidden state level ``s`` at the current time, given hidden state level ``v`` and action ``u`` at the previous time.
+    policies: ``list`` of 2D ``numpy.ndarray``
+        List that stores each policy in ``policies[p_idx]``. Shape of ``policies[p_idx]`` is ``(num_timesteps, num_factors)`` where `num_timesteps` is the temporal
+        depth of the policy and ``num_factors`` is the number of control factors.
+    prev_actions: ``numpy.ndarray``, default None
+        If provided, should be a matrix of previous actions of shape ``(infer_len - 1, num_factors)`` that indicates the indices of each action taken between the timesteps of ``lh_seq``.
+    prior: ``numpy.ndarray`` of dtype object, default None
+        If provided, the prior beliefs about the states at the first timestep of ``lh_seq``. This is either an object array with one entry per factor, shared by all policies,
+        or an object array with one such object array per policy. If ``None``, this defaults to a flat (uninformative) prior over hidden states.
+
+    Returns
+    ---------
+    qs_seq_pi: ``numpy.ndarray`` of dtype object
+        Posterior beliefs over hidden states for each policy. Nesting structure is policies, timepoints, factors,
+        where e.g. ``qs_seq_pi[p][t][f]`` stores the marginal belief about factor ``f`` at timepoint ``t`` under policy ``p``.
+        The last ``num_timesteps`` timepoints are the beliefs about future states expected under the policy.
+    F: 1D ``numpy.ndarray``
+        Vector of variational free energies for each policy. As the posterior is exact, these are the negative log evidence of the observations in ``lh_seq``.
+    """
+
+    past_len = len(lh_seq)
+    future_len = policies[0].shape[0]
+    num_policies = len(policies)
+    num_factors = len(B)
+
+    policy_sep_prior = prior is not None and is_obj_array(prior[0])
+    future_actions = np.stack(policies, 0) # shape (num_policies, future_len, num_factors)
+
+    qs_seq_pi = obj_array(num_policies)
+    for p_idx in range(num_policies):
+        qs_seq_pi[p_idx] = obj_array(past_len + future_len)
+        for t in range(past_len + future_len):
+            qs_seq_pi[p_idx][t] = obj_array(num_factors)
+
+    log_evidence = np.zeros(num_policies)
+
+    for f in range(num_factors):
+
+        num_states_f = B[f].shape[0]
+        log_lh = spm_log_single(np.stack([lh_seq[t][f] for t in range(past_len)], 0)) # shape (past_len, num_states_f)
+        log_B = spm_log_single(B[f])
+
+        if prior is None:
+            log_prior = np.full((num_policies, num_states_f), -np.log(num_states_f))
+        elif policy_sep_prior:
+            log_prior = spm_log_single(np.stack([prior[p_idx][f] for p_idx in range(num_policies)], 0))
+        else:
+            log_prior = np.tile(spm_log_single(prior[f]), (num_policies, 1))
+
+        # forward messages, for all policies at once
+        log_alpha = np.zeros((past_len, num_policies, num_states_f))
+        log_alpha_t = log_prior + log_lh[0]
+        for t in range(past_len):
+            if t > 0:
+                log_B_t = log_B[..., int(prev_actions[t - 1, f])]
+                log_alpha_t = special.logsumexp(log_B_t[None] + log_alpha_t[:, None, :], axis=-1) + log_lh[t]
+            log_norm = special.logsumexp(log_alpha_t, axis=-1, keepdims=True)
+            log_alpha_t = log_alpha_t - log_norm
+            log_evidence += log_norm[:, 0]
+            log_alpha[t] = log_alpha_t
+
+        # backward messages, which do not depend on the prior and are shared by all policies
+        log_beta = np.zeros((past_len, num_states_f))
+        for t in range(past_len - 2, -1, -1):
+            log_B_t = log_B[..., int(prev_actions[t, f])]
+            log_beta_t = special.logsumexp(log_B_t + (log_lh[t + 1] + log_beta[t + 1])[:, None], axis=0)
+            log_beta[t] = log_beta_t - special.logsumexp(log_beta_t)
+
+        log_qs = log_alpha + log_beta[:, None, :]
+        qs = np.exp(log_qs - special.logsumexp(log_qs, axis=-1, keepdims=True)) # shape (past_len, num_policies, num_states_f)
+
+        # beliefs about future states, predicted with the actions of each policy
+        qs_future = np.zeros((future_len, num_policies, num_states_f))
+        qs_t = qs[-1]
+        for t in range(future_len):
+            B_t = B[f][..., future_actions[:, t, f]] # shape (num_states_f, num_states_f, num_policies)
+            qs_t = np.einsum("svp,pv->ps", B_t, qs_t)
+            qs_future[t] = qs_t
+
+        qs_f = np.concatenate([qs, qs_future], 0)
+        for p_idx in range(num_policies):
+            for t in range(past_len + future_len):
+                qs_seq_pi[p_idx][t][f] = qs_f[t, p_idx]
+
+    return qs_seq_pi, -log_evidence
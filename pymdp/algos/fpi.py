@@ -19,9 +19,10 @@ def run_vanilla_fpi(A, obs, num_obs, num_states, prior=None, num_iter=10, dF=1.0
         Sensory likelihood mapping or 'observation model', mapping from hidden states to observations. Each element ``A[m]`` of
         stores an ``np.ndarray`` multidimensional array for observation modality ``m``, whose entries ``A[m][i, j, k, ...]`` store 
         the probability of observation level ``i`` given hidden state levels ``j, k, ...``
-    obs: numpy 1D array or numpy ndarray of dtype object
+    obs: numpy 1D array, numpy ndarray of dtype object or ``list`` of ``int``
         The observation (generated by the environment). If single modality, this should be a 1D ``np.ndarray``
         (one-hot vector representation). If multi-modality, this should be ``np.ndarray`` of dtype object whose entries are 1D one-hot vectors.
+        Alternatively, a ``list`` with the index of the observation in each modality, which avoids building one-hot vectors.
     num_obs: list of ints
         List of dimensionalities of each observation modality
     num_states: list of ints
@@ -168,9 +169,10 @@ def run_vanilla_fpi_factorized(A, obs, num_obs, num_states, mb_dict, prior=None,
         Sensory likelihood mapping or 'observation model', mapping from hidden states to observations. Each element ``A[m]`` of
         stores an ``np.ndarray`` multidimensional array for observation modality ``m``, whose entries ``A[m][i, j, k, ...]`` store 
         the probability of observation level ``i`` given hidden state levels ``j, k, ...``
-    obs: numpy 1D array or numpy ndarray of dtype object
+    obs: numpy 1D array, numpy ndarray of dtype object or ``list`` of ``int``
         The observation (generated by the environment). If single modality, this should be a 1D ``np.ndarray``
         (one-hot vector representation). If multi-modality, this should be ``np.ndarray`` of dtype object whose entries are 1D one-hot vectors.
+        Alternatively, a ``list`` with the index of the observation in each modality, which avoids building one-hot vectors.
     num_obs: ``list`` of ints
         List of dimensionalities of each observation modality
     num_states: ``list`` of ints
@@ -210,7 +212,7 @@ def run_vanilla_fpi_factorized(A, obs, num_obs, num_states, mb_dict, prior=None,
     """
 
     likelihood = obj_array(n_modalities)
-    obs = to_obj_array(obs)
+    obs = obs if isinstance(obs, list) else to_obj_array(obs) # observations given as a list of indices are used as is
     for (m, A_m) in enumerate(A):
         likelihood[m] = dot_likelihood(A_m, obs[m])
 
@@ -131,8 +131,68 @@ def run_mmp(
 
     return qs_seq, F
 
+def get_joint_likelihood_from_modalities(lh, num_states, A_factor_list):
+    """
+    Combines the modality-specific likelihoods of a single timestep into one array over all hidden state factors.
+
+    Parameters
+    ----------
+    lh: ``numpy.ndarray`` of dtype object
+        Likelihoods of hidden states for each modality, where ``lh[m]`` is defined over the hidden state factors in ``A_factor_list[m]``
+    num_states: ``list`` of ``int``
+        List of dimensionalities of each hidden state factor
+    A_factor_list: ``list`` of ``list`` of ``int``
+        List of the hidden state factor indices that each modality depends on
+
+    Returns
+    ---------
+    joint_loglikelihood: ``numpy.ndarray``
+        Sum of the modality-specific likelihoods, broadcast to the shape ``num_states``
+    """
+
+    num_factors = len(num_states)
+    joint_loglikelihood = np.zeros(tuple(num_states))
+    for m in range(len(A_factor_list)):
+        reshape_dims = num_factors*[1]
+        for _f_id in A_factor_list[m]:
+            reshape_dims[_f_id] = num_states[_f_id]
+        joint_loglikelihood += lh[m].reshape(reshape_dims) # add up all the log-likelihoods after reshaping them to the global common dimensions of all hidden state factors
+    return joint_loglikelihood
+
+def get_mmp_message_operators(B, B_factor_list, msg_ops=None):
+    """
+    Returns the transition operators used to pass messages between timesteps in ``run_mmp_factorized``. These only depend on ``B``, so they are
+    computed once and can be re-used across policies, timesteps and iterations. If ``msg_ops`` was computed from the same ``B`` array, it is returned as is.
+
+    Parameters
+    ----------
+    B: ``numpy.ndarray`` of dtype object
+        Dynamics likelihood mapping or 'transition model', mapping from hidden states at ``t`` to hidden states at ``t+1``, given some control state ``u``.
+    B_factor_list: ``list`` of ``list`` of ``int``
+        List of lists of hidden state factors each hidden state factor depends on.
+    msg_ops: ``dict``, default None
+        Message operators returned by a previous call
+
+    Returns
+    ---------
+    msg_ops: ``dict``
+        Dictionary that stores the ``B`` array the operators were computed from (``msg_ops['B']``) and, for each hidden state factor ``f`` whose
+        dynamics only depend on itself, the normalized transpose of its transition matrices ``msg_ops['trans_B'][f]``, indexed as ``[v, s, u]``.
+        The backward message for factor ``f`` under action ``u`` is ``msg_ops['trans_B'][f][..., u].dot(qs_next)``. The entry is ``None`` for factors
+        with multiple parents, whose backward messages depend on the beliefs about the co-parents.
+    """
+
+    if msg_ops is not None and msg_ops['B'] is B:
+        return msg_ops
+
+    trans_B = obj_array(len(B))
+    for f, B_f in enumerate(B):
+        trans_B[f] = spm_norm(np.swapaxes(B_f, 0, 1)) if list(B_factor_list[f]) == [f] else None
+
+    return {'B': B, 'trans_B': trans_B}
+
 def run_mmp_factorized(
-    lh_seq, mb_dict, B, B_factor_list, policy, prev_actions=None, prior=None, num_iter=10, grad_descent=True, tau=0.25, last_timestep = False):
+    lh_seq, mb_dict, B, B_factor_list, policy, prev_actions=None, prior=None, num_iter=10, grad_descent=True, tau=0.25, last_timestep = False, joint_lh_seq=None, msg_ops=None):
     """
     Marginal message passing scheme for updating marginal posterior beliefs about hidden states over time, 
     conditioned on a particular policy.
@@ -166,6 +226,11 @@ def run_mmp_factorized(
         Decay constant for use in ``grad_descent`` version. Tunes the size of the gradient descent updates to the posterior.
     last_timestep: Bool, default False
         Flag for whether we are at the last timestep of belief updating
+    joint_lh_seq: ``numpy.ndarray`` of dtype object, default None
+        If provided, the likelihoods of ``lh_seq`` already combined across modalities at each timestep (see ``get_joint_likelihood_from_modalities``).
+        If ``None``, these are computed from ``lh_seq``.
+    msg_ops: ``dict``, default None
+        If provided, the transition operators returned by ``get_mmp_message_operators`` for ``B``. If ``None``, these are computed from ``B``.
         
     Returns
     ---------
@@ -202,27 +267,18 @@ def run_mmp_factorized(
     if prior is None:
         prior = obj_array_uniform(num_states)
 
-    # transposed transition
-    trans_B = obj_array(num_factors)
-        
-    for f in range(num_factors):
-        trans_B[f] = spm_norm(np.swapaxes(B[f],0,1))
+    # normalized transposed transitions, for the backward messages
+    trans_B = get_mmp_message_operators(B, B_factor_list, msg_ops)['trans_B']
 
     if prev_actions is not None:
         policy = np.vstack((prev_actions, policy))
 
     A_factor_list, A_modality_list = mb_dict['A_factor_list'], mb_dict['A_modality_list']
 
-    joint_lh_seq = obj_array(len(lh_seq))
-    num_modalities = len(A_factor_list)
-    for t in range(len(lh_seq)):
-        joint_loglikelihood = np.zeros(tuple(num_states))
-        for m in range(num_modalities):
-            reshape_dims = num_factors*[1]
-            for _f_id in A_factor_list[m]:
-                reshape_dims[_f_id] = num_states[_f_id]
-            joint_loglikelihood += lh_seq[t][m].reshape(reshape_dims) # add up all the log-likelihoods after reshaping them to the global common dimensions of all hidden state factors
-        joint_lh_seq[t] = joint_loglikelihood
+    if joint_lh_seq is None:
+        joint_lh_seq = obj_array(len(lh_seq))
+        for t in range(len(lh_seq)):
+            joint_lh_seq[t] = get_joint_likelihood_from_modalities(lh_seq[t], num_states, A_factor_list)
 
     # compute inverse B dependencies, which is a list that for each hidden state factor, lists the indices of the other hidden state factors that it 'drives' or is a parent of in the HMM graphical model
     inv_B_deps = [[i for i, d in enumerate(B_factor_list) if f in d] for f in range(num_factors)]
@@ -235,7 +291,6 @@ def run_mmp_factorized(
                 if t < past_len:
                     for m in A_modality_list[f]:
                         lnA += spm_log_single(spm_dot(lh_seq[t][m], qs_seq[t][A_factor_list[m]], [A_factor_list[m].index(f)]))  
-                    print(f'Factorized version: lnA at time {t}: {lnA}')                
                 
                 # past message
                 if t == 0:
@@ -250,8 +305,13 @@ def run_mmp_factorized(
                 else:
                     # list of future_msgs, one for each of the factors that factor f is driving
 
+                    lnB_future = np.zeros(num_states[f])
                     B_marg_list = [] # list of the marginalized B matrices, that correspond to mapping between the factor of interest `f` and each of its children factors `i`
+                    B_marg_children = [] # the children factors of `f` that the matrices in `B_marg_list` map to
                     for i in inv_B_deps[f]: #loop over all the hidden state factors that are driven by f
+                        if trans_B[i] is not None: # `f` is the only parent of `i`, so the normalized transposed transition is precomputed
+                            lnB_future += spm_log_single(trans_B[i][..., int(policy[t,i])].dot(qs_seq[t + 1][i]))
+                            continue
                         b = B[i][...,int(policy[t,i])]
                         keep_dims = (0,1+B_factor_list[i].index(f))
                         dims = []
@@ -262,11 +322,11 @@ def run_mmp_factorized(
                                 idxs.append(d)
                         xs = [qs_seq[t+1][f_i] for f_i in idxs]
                         B_marg_list.append( factor_dot_flex(b, xs, tuple(dims), keep_dims=keep_dims) ) # marginalize out all parents of `i` besides `f`
+                        B_marg_children.append(i)
 
-                    lnB_future = np.zeros(num_states[f])
-                    for i, b in enumerate(B_marg_list):
+                    for i, b in zip(B_marg_children, B_marg_list):
                         b_norm_T = spm_norm(b.T)
-                        lnB_future += spm_log_single(b_norm_T.dot(qs_seq[t + 1][inv_B_deps[f][i]]))
+                        lnB_future += spm_log_single(b_norm_T.dot(qs_seq[t + 1][i]))
                     
                     
                     lnB_future *= 0.5
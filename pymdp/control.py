@@ -4,7 +4,9 @@
 # pylint: disable=not-an-iterable
 
 import itertools
+import time
 import numpy as np
+from opt_einsum import contract
 from pymdp.maths import softmax, softmax_obj_arr, spm_dot, spm_wnorm, spm_MDP_G, spm_log_single, spm_log_obj_array
 from pymdp import utils
 import copy
@@ -466,6 +468,683 @@ def update_posterior_policies_factorized(
 
     return q_pi, G
 
+def update_posterior_policies_anytime(
+    qs,
+    A,
+    B,
+    C,
+    A_factor_list,
+    B_factor_list,
+    policies,
+    deadline=None,
+    priority=None,
+    use_utility=True,
+    use_states_info_gain=True,
+    use_param_info_gain=False,
+    pA=None,
+    pB=None,
+    E=None,
+    I=None,
+    gamma=16.0
+):
+    """
+    Anytime version of ``update_posterior_policies_factorized``: policies are evaluated in order of decreasing ``priority``
+    until ``deadline`` seconds have elapsed, and the posterior over policies is computed from the policies evaluated so far.
+    Policies that could not be evaluated in time are explicitly masked out, with a negative expected free energy of ``-np.inf``
+    and a posterior probability of 0. At least one policy is always evaluated.
+
+    Parameters
+    ----------
+    qs: ``numpy.ndarray`` of dtype object
+        Marginal posterior beliefs over hidden states at current timepoint (unconditioned on policies)
+    A: ``numpy.ndarray`` of dtype object
+        Sensory likelihood mapping or 'observation model', mapping from hidden states to observations. Each element ``A[m]`` of
+        stores an ``numpy.ndarray`` multidimensional array for observation modality ``m``, whose entries ``A[m][i, j, k, ...]`` store
+        the probability of observation level ``i`` given hidden state levels ``j, k, ...``
+    B: ``numpy.ndarray`` of dtype object
+        Dynamics likelihood mapping or 'transition model', mapping from hidden states at ``t`` to hidden states at ``t+1``, given some control state ``u``.
+        Each element ``B[f]`` of this object array stores a 3-D tensor for hidden state factor ``f``, whose entries ``B[f][s, v, u]`` store the probability
+        of hidden state level ``s`` at the current time, given hidden state level ``v`` and action ``u`` at the previous time.
+    C: ``numpy.ndarray`` of dtype object
+       Prior over observations or 'prior preferences', storing the "value" of each outcome in terms of relative log probabilities.
+       This is softmaxed to form a proper probability distribution before being used to compute the expected utility term of the expected free energy.
+    A_factor_list: ``list`` of ``list``s of ``int``
+        ``list`` that stores the indices of the hidden state factor indices that each observation modality depends on.
+    B_factor_list: ``list`` of ``list``s of ``int``
+        ``list`` that stores the indices of the hidden state factor indices that each hidden state factor depends on.
+    policies: ``list`` of 2D ``numpy.ndarray``
+        ``list`` that stores each policy in ``policies[p_idx]``. Shape of ``policies[p_idx]`` is ``(num_timesteps, num_factors)`` where `num_timesteps` is the temporal
+        depth of the policy and ``num_factors`` is the number of control factors.
+    deadline: ``float``, default ``None``
+        Maximum wall-clock duration of the policy evaluation, in seconds, measured from the start of the call. If ``None``, all policies are evaluated.
+    priority: 1D ``numpy.ndarray``, default ``None``
+        Priority of each policy (e.g. the posterior over policies at the previous timestep). Policies with higher priority are evaluated first.
+        If ``None``, the prior over policies ``E`` is used.
+    use_utility: ``Bool``, default ``True``
+        Boolean flag that determines whether expected utility should be incorporated into computation of EFE.
+    use_states_info_gain: ``Bool``, default ``True``
+        Boolean flag that determines whether state epistemic value (info gain about hidden states) should be incorporated into computation of EFE.
+    use_param_info_gain: ``Bool``, default ``False`` 
+        Boolean flag that determines whether parameter epistemic value (info gain about generative model parameters) should be incorporated into computation of EFE. 
+    pA: ``numpy.ndarray`` of dtype object, optional
+        Dirichlet parameters over observation model (same shape as ``A``)
+    pB: ``numpy.ndarray`` of dtype object, optional
+        Dirichlet parameters over transition model (same shape as ``B``)
+    E: 1D ``numpy.ndarray``, optional
+        Vector of prior probabilities of each policy (what's referred to in the active inference literature as "habits")
+    I: ``numpy.ndarray`` of dtype object
+        For each state factor, contains a 2D ``numpy.ndarray`` whose element i,j yields the probability 
+        of reaching the goal state backwards from state j after i steps.
+    gamma: float, default 16.0
+        Prior precision over policies, scales the contribution of the expected free energy to the posterior over policies
+
+    Returns
+    ----------
+    q_pi: 1D ``numpy.ndarray``
+        Posterior beliefs over policies, i.e. a vector containing one posterior probability per policy. Policies that were not evaluated have probability 0.
+    G: 1D ``numpy.ndarray``
+        Negative expected free energies of each policy, i.e. a vector containing one negative expected free energy per policy. Policies that were not
+        evaluated have a negative expected free energy of ``-np.inf``.
+    evaluated: 1D ``numpy.ndarray`` of dtype bool
+        Mask of the policies that were evaluated before the deadline.
+    """
+
+    start_time = time.perf_counter()
+
+    n_policies = len(policies)
+    G = np.full(n_policies, -np.inf)
+    evaluated = np.zeros(n_policies, dtype=bool)
+
+    if E is None:
+        lnE = spm_log_single(np.ones(n_policies) / n_policies)
+    else:
+        lnE = spm_log_single(E) 
+
+    if priority is None:
+        priority = lnE
+
+    for idx in np.argsort(-np.asarray(priority), kind="stable"):
+        if evaluated.any() and deadline is not None and (time.perf_counter() - start_time) >= deadline:
+            break
+
+        policy = policies[idx]
+        qs_prev = qs
+        G[idx] = 0.
+        for t in range(policy.shape[0]):
+            qs_next = get_expected_states_interactions(qs_prev, B, B_factor_list, policy[t:t+1])[0]
+            G[idx] += calc_neg_efe_step(
+                qs, qs_prev, qs_next, policy[t], A, C, A_factor_list, B_factor_list, t=t,
+                use_utility=use_utility, use_states_info_gain=use_states_info_gain, use_param_info_gain=use_param_info_gain,
+                pA=pA, pB=pB, I=I
+            )
+            qs_prev = qs_next
+
+        evaluated[idx] = True
+
+    q_pi = np.zeros(n_policies)
+    q_pi[evaluated] = softmax(G[evaluated] * gamma + lnE[evaluated])
+
+    return q_pi, G, evaluated
+
+def update_posterior_policies_pruned(
+    qs,
+    A,
+    B,
+    C,
+    A_factor_list,
+    B_factor_list,
+    policies,
+    E_threshold=None,
+    top_k=None,
+    bound_tol=None,
+    use_utility=True,
+    use_states_info_gain=True,
+    use_param_info_gain=False,
+    pA=None,
+    pB=None,
+    E=None,
+    I=None,
+    gamma=16.0
+):
+    """
+    Version of ``update_posterior_policies_factorized`` that prunes policies based on their prior probability ``E`` before computing
+    their expected free energy. Three (combinable) pruning rules are available: policies whose prior probability is below ``E_threshold`` are pruned,
+    only the ``top_k`` policies with highest prior probability are kept, and, if ``bound_tol`` is given, policies are evaluated in order of
+    decreasing prior probability until the remaining ones cannot have a posterior probability larger than ``bound_tol`` times that of the best
+    policy evaluated so far (branch-and-bound, using the upper bound on the negative expected free energy of ``calc_neg_efe_upper_bound``).
+    Pruned policies have a negative expected free energy of ``-np.inf`` and a posterior probability of 0. The policy with the
+    highest prior probability is never pruned.
+
+    Parameters
+    ----------
+    qs: ``numpy.ndarray`` of dtype object
+        Marginal posterior beliefs over hidden states at current timepoint (unconditioned on policies)
+    A: ``numpy.ndarray`` of dtype object
+        Sensory likelihood mapping or 'observation model', mapping from hidden states to observations. Each element ``A[m]`` of
+        stores an ``numpy.ndarray`` multidimensional array for observation modality ``m``, whose entries ``A[m][i, j, k, ...]`` store
+        the probability of observation level ``i`` given hidden state levels ``j, k, ...``
+    B: ``numpy.ndarray`` of dtype object
+        Dynamics likelihood mapping or 'transition model', mapping from hidden states at ``t`` to hidden states at ``t+1``, given some control state ``u``.
+        Each element ``B[f]`` of this object array stores a 3-D tensor for hidden state factor ``f``, whose entries ``B[f][s, v, u]`` store the probability
+        of hidden state level ``s`` at the current time, given hidden state level ``v`` and action ``u`` at the previous time.
+    C: ``numpy.ndarray`` of dtype object
+       Prior over observations or 'prior preferences', storing the "value" of each outcome in terms of relative log probabilities.
+       This is softmaxed to form a proper probability distribution before being used to compute the expected utility term of the expected free energy.
+    A_factor_list: ``list`` of ``list``s of ``int``
+        ``list`` that stores the indices of the hidden state factor indices that each observation modality depends on.
+    B_factor_list: ``list`` of ``list``s of ``int``
+        ``list`` that stores the indices of the hidden state factor indices that each hidden state factor depends on.
+    policies: ``list`` of 2D ``numpy.ndarray``
+        ``list`` that stores each policy in ``policies[p_idx]``. Shape of ``policies[p_idx]`` is ``(num_timesteps, num_factors)`` where `num_timesteps` is the temporal
+        depth of the policy and ``num_factors`` is the number of control factors.
+    E_threshold: ``float``, default ``None``
+        Policies whose prior probability is below this threshold are pruned.
+    top_k: ``int``, default ``None``
+        Number of policies with highest prior probability that are kept.
+    bound_tol: ``float``, default ``None``
+        Tolerance of the branch-and-bound pruning: policies are pruned once they are guaranteed to have a posterior probability smaller than
+        ``bound_tol`` times the (unnormalized) posterior probability of the best policy evaluated so far. Cannot be used together with parameter information gain.
+    use_utility: ``Bool``, default ``True``
+        Boolean flag that determines whether expected utility should be incorporated into computation of EFE.
+    use_states_info_gain: ``Bool``, default ``True``
+        Boolean flag that determines whether state epistemic value (info gain about hidden states) should be incorporated into computation of EFE.
+    use_param_info_gain: ``Bool``, default ``False`` 
+        Boolean flag that determines whether parameter epistemic value (info gain about generative model parameters) should be incorporated into computation of EFE. 
+    pA: ``numpy.ndarray`` of dtype object, optional
+        Dirichlet parameters over observation model (same shape as ``A``)
+    pB: ``numpy.ndarray`` of dtype object, optional
+        Dirichlet parameters over transition model (same shape as ``B``)
+    E: 1D ``numpy.ndarray``, optional
+        Vector of prior probabilities of each policy (what's referred to in the active inference literature as "habits")
+    I: ``numpy.ndarray`` of dtype object
+        For each state factor, contains a 2D ``numpy.ndarray`` whose element i,j yields the probability 
+        of reaching the goal state backwards from state j after i steps.
+    gamma: float, default 16.0
+        Prior precision over policies, scales the contribution of the expected free energy to the posterior over policies
+
+    Returns
+    ----------
+    q_pi: 1D ``numpy.ndarray``
+        Posterior beliefs over policies, i.e. a vector containing one posterior probability per policy. Pruned policies have probability 0.
+    G: 1D ``numpy.ndarray``
+        Negative expected free energies of each policy, i.e. a vector containing one negative expected free energy per policy. Pruned policies
+        have a negative expected free energy of ``-np.inf``.
+    pruned: 1D ``numpy.ndarray`` of dtype bool
+        Mask of the policies that were pruned.
+    """
+
+    n_policies = len(policies)
+    G = np.full(n_policies, -np.inf)
+
+    if E is None:
+        E = np.ones(n_policies) / n_policies
+    lnE = spm_log_single(E)
+
+    order = np.argsort(-lnE, kind="stable")
+    pruned = np.zeros(n_policies, dtype=bool)
+
+    if E_threshold is not None:
+        pruned[E < E_threshold] = True
+    if top_k is not None:
+        pruned[order[top_k:]] = True
+    pruned[order[0]] = False
+
+    if bound_tol is not None:
+        if use_param_info_gain and (pA is not None or pB is not None):
+            raise ValueError("Branch-and-bound pruning (`bound_tol`) cannot be used with parameter information gain, which has no upper bound")
+        policy_len = max([policy.shape[0] for policy in policies])
+        G_bound = calc_neg_efe_upper_bound(A, C, policy_len, use_utility=use_utility, use_states_info_gain=use_states_info_gain)
+        log_tol = np.log(bound_tol)
+
+    best_score = -np.inf
+    for rank, idx in enumerate(order):
+        if pruned[idx]:
+            continue
+
+        # since policies are visited in order of decreasing prior probability, all the remaining policies can be pruned as well
+        if bound_tol is not None and G_bound * gamma + lnE[idx] < best_score + log_tol:
+            pruned[order[rank:]] = True
+            break
+
+        policy = policies[idx]
+        qs_prev = qs
+        G[idx] = 0.
+        for t in range(policy.shape[0]):
+            qs_next = get_expected_states_interactions(qs_prev, B, B_factor_list, policy[t:t+1])[0]
+            G[idx] += calc_neg_efe_step(
+                qs, qs_prev, qs_next, policy[t], A, C, A_factor_list, B_factor_list, t=t,
+                use_utility=use_utility, use_states_info_gain=use_states_info_gain, use_param_info_gain=use_param_info_gain,
+                pA=pA, pB=pB, I=I
+            )
+            qs_prev = qs_next
+
+        best_score = max(best_score, G[idx] * gamma + lnE[idx])
+
+    q_pi = np.zeros(n_policies)
+    q_pi[~pruned] = softmax(G[~pruned] * gamma + lnE[~pruned])
+
+    return q_pi, G, pruned
+
+def update_posterior_policies_receding(
+    qs,
+    A,
+    B,
+    C,
+    A_factor_list,
+    B_factor_list,
+    policies,
+    action=None,
+    q_pi_prev=None,
+    policy_tree=None,
+    num_reused_plans=None,
+    reuse_tol=1e-8,
+    use_utility=True,
+    use_states_info_gain=True,
+    use_param_info_gain=False,
+    pA=None,
+    pB=None,
+    E=None,
+    I=None,
+    gamma=16.0
+):
+    """
+    Receding-horizon version of ``update_posterior_policies_factorized``, that re-uses the plan of the previous timestep.
+    Policies are evaluated over a tree of policy prefixes (see ``get_policy_tree_neg_efe``), so that policies which share their first ``t`` actions
+    also share the expected states and expected free energy terms of those ``t`` timesteps. After an action has been taken, the
+    sub-tree of the previous timestep's plan that begins with that action (i.e. the surviving policy suffixes) is carried over:
+
+    - if ``num_reused_plans`` is not ``None``, only the ``num_reused_plans`` most probable policies of the previous timestep that begin with ``action`` survive.
+      Their suffixes, extended by every possible final action, form the set of candidate policies for the current timestep. Policies that are not candidates are
+      masked out, i.e. they are assigned ``-np.inf`` negative expected free energy and zero posterior probability.
+    - if the current posterior ``qs`` matches the belief that was predicted for the current timestep under ``action`` (up to ``reuse_tol``), the partial
+      expected free energies of the surviving suffixes are re-used as well, so that only the new tail actions need to be evaluated. Partial evaluations
+      are never re-used when ``C`` is time-dependent or when inductive planning is used (``I`` is not ``None``), since these terms depend on the timestep and on ``qs``.
+
+    Parameters
+    ----------
+    qs: ``numpy.ndarray`` of dtype object
+        Marginal posterior beliefs over hidden states at current timepoint (unconditioned on policies)
+    A: ``numpy.ndarray`` of dtype object
+        Sensory likelihood mapping or 'observation model', mapping from hidden states to observations. Each element ``A[m]`` of
+        stores an ``numpy.ndarray`` multidimensional array for observation modality ``m``, whose entries ``A[m][i, j, k, ...]`` store
+        the probability of observation level ``i`` given hidden state levels ``j, k, ...``
+    B: ``numpy.ndarray`` of dtype object
+        Dynamics likelihood mapping or 'transition model', mapping from hidden states at ``t`` to hidden states at ``t+1``, given some control state ``u``.
+        Each element ``B[f]`` of this object array stores a 3-D tensor for hidden state factor ``f``, whose entries ``B[f][s, v, u]`` store the probability
+        of hidden state level ``s`` at the current time, given hidden state level ``v`` and action ``u`` at the previous time.
+    C: ``numpy.ndarray`` of dtype object
+       Prior over observations or 'prior preferences', storing the "value" of each outcome in terms of relative log probabilities.
+       This is softmaxed to form a proper probability distribution before being used to compute the expected utility term of the expected free energy.
+    A_factor_list: ``list`` of ``list``s of ``int``
+        ``list`` that stores the indices of the hidden state factor indices that each observation modality depends on.
+    B_factor_list: ``list`` of ``list``s of ``int``
+        ``list`` that stores the indices of the hidden state factor indices that each hidden state factor depends on.
+    policies: ``list`` of 2D ``numpy.ndarray``
+        ``list`` that stores each policy in ``policies[p_idx]``. Shape of ``policies[p_idx]`` is ``(num_timesteps, num_factors)`` where `num_timesteps` is the temporal
+        depth of the policy and ``num_factors`` is the number of control factors.
+    action: 1D ``numpy.ndarray``, default ``None``
+        The action taken at the previous timestep (one entry per control factor). If ``None``, the plan of the previous timestep is not re-used.
+    q_pi_prev: 1D ``numpy.ndarray``, default ``None``
+        Posterior beliefs over policies at the previous timestep, used to rank the surviving policies.
+    policy_tree: ``dict``, default ``None``
+        The policy tree returned by this function at the previous timestep. If ``None``, all policies are evaluated from scratch.
+    num_reused_plans: ``int``, default ``None``
+        Number of surviving policies of the previous timestep whose suffixes are carried over. If ``None``, all policies are candidates.
+    reuse_tol: ``float``, default 1e-8
+        Maximum absolute difference between ``qs`` and the predicted belief of the previous timestep, under which partial expected free energies are re-used.
+    use_utility: ``Bool``, default ``True``
+        Boolean flag that determines whether expected utility should be incorporated into computation of EFE.
+    use_states_info_gain: ``Bool``, default ``True``
+        Boolean flag that determines whether state epistemic value (info gain about hidden states) should be incorporated into computation of EFE.
+    use_param_info_gain: ``Bool``, default ``False``
+        Boolean flag that determines whether parameter epistemic value (info gain about generative model parameters) should be incorporated into computation of EFE.
+    pA: ``numpy.ndarray`` of dtype object, optional
+        Dirichlet parameters over observation model (same shape as ``A``)
+    pB: ``numpy.ndarray`` of dtype object, optional
+        Dirichlet parameters over transition model (same shape as ``B``)
+    E: 1D ``numpy.ndarray``, optional
+        Vector of prior probabilities of each policy (what's referred to in the active inference literature as "habits")
+    I: ``numpy.ndarray`` of dtype object
+        For each state factor, contains a 2D ``numpy.ndarray`` whose element i,j yields the probability
+        of reaching the goal state backwards from state j after i steps.
+    gamma: float, default 16.0
+        Prior precision over policies, scales the contribution of the expected free energy to the posterior over policies
+
+    Returns
+    ----------
+    q_pi: 1D ``numpy.ndarray``
+        Posterior beliefs over policies, i.e. a vector containing one posterior probability per policy.
+    G: 1D ``numpy.ndarray``
+        Negative expected free energies of each policy, i.e. a vector containing one negative expected free energy per policy.
+    policy_tree: ``dict``
+        The tree of evaluated policy prefixes, to be passed to this function at the next timestep.
+    """
+
+    n_policies = len(policies)
+
+    if E is None:
+        lnE = spm_log_single(np.ones(n_policies) / n_policies)
+    else:
+        lnE = spm_log_single(E)
+
+    candidates = list(range(n_policies))
+    reused_tree = None
+
+    if action is not None and policy_tree is not None:
+        action_key = tuple(int(a) for a in action)
+
+        # re-use the partial evaluations of the surviving suffixes, if the posterior is (close to) the one that was predicted for the current timestep
+        if (action_key,) in policy_tree:
+            qs_pred = policy_tree[(action_key,)][0]
+            is_reusable = all([C_m.ndim == 1 for C_m in C]) and I is None
+            if is_reusable and all([np.abs(qs_pred[f] - qs[f]).max() <= reuse_tol for f in range(len(qs))]):
+                reused_tree = {prefix[1:]: node for prefix, node in policy_tree.items() if prefix[0] == action_key and len(prefix) > 1}
+
+        # restrict the candidate policies to those that extend the suffixes of the most probable surviving policies
+        if num_reused_plans is not None and q_pi_prev is not None:
+            ranked = np.argsort(-q_pi_prev, kind="stable")
+            survivors = [p_idx for p_idx in ranked if q_pi_prev[p_idx] > 0 and tuple(policies[p_idx][0]) == action_key][:num_reused_plans]
+            suffixes = set([tuple(map(tuple, policies[p_idx][1:])) for p_idx in survivors])
+            reused_candidates = [p_idx for p_idx, policy in enumerate(policies) if tuple(map(tuple, policy[:-1])) in suffixes]
+            if len(reused_candidates) > 0:
+                candidates = reused_candidates
+
+    G_candidates, policy_tree = get_policy_tree_neg_efe(
+        qs,
+        [policies[p_idx] for p_idx in candidates],
+        A,
+        B,
+        C,
+        A_factor_list,
+        B_factor_list,
+        use_utility,
+        use_states_info_gain,
+        use_param_info_gain,
+        pA,
+        pB,
+        I,
+        policy_tree=reused_tree
+    )
+
+    G = np.full(n_policies, -np.inf)
+    G[candidates] = G_candidates
+
+    q_pi = np.zeros(n_policies)
+    q_pi[candidates] = softmax(G[candidates] * gamma + lnE[candidates])
+
+    return q_pi, G, policy_tree
+
+def update_posterior_policies_beam(
+    qs,
+    A,
+    B,
+    C,
+    A_factor_list,
+    B_factor_list,
+    num_controls,
+    policy_len=1,
+    beam_width=8,
+    use_utility=True,
+    use_states_info_gain=True,
+    use_param_info_gain=False,
+    pA=None,
+    pB=None,
+    I=None,
+    gamma=16.0
+):
+    """
+    Update posterior beliefs about policies using beam search, rather than by enumerating all ``prod(num_controls) ** policy_len`` policies.
+    Policies are expanded one timestep at a time, by appending every possible combination of actions to the partial policies in the beam.
+    The partial policies are scored by the sum of their per-timestep negative expected free energies (see ``calc_neg_efe_step``),
+    and only the best ``beam_width`` partial policies are kept at each depth. The cost of planning therefore grows linearly with ``policy_len``.
+
+    Parameters
+    ----------
+    qs: ``numpy.ndarray`` of dtype object
+        Marginal posterior beliefs over hidden states at current timepoint (unconditioned on policies)
+    A: ``numpy.ndarray`` of dtype object
+        Sensory likelihood mapping or 'observation model', mapping from hidden states to observations. Each element ``A[m]`` of
+        stores an ``numpy.ndarray`` multidimensional array for observation modality ``m``, whose entries ``A[m][i, j, k, ...]`` store
+        the probability of observation level ``i`` given hidden state levels ``j, k, ...``
+    B: ``numpy.ndarray`` of dtype object
+        Dynamics likelihood mapping or 'transition model', mapping from hidden states at ``t`` to hidden states at ``t+1``, given some control state ``u``.
+        Each element ``B[f]`` of this object array stores a 3-D tensor for hidden state factor ``f``, whose entries ``B[f][s, v, u]`` store the probability
+        of hidden state level ``s`` at the current time, given hidden state level ``v`` and action ``u`` at the previous time.
+    C: ``numpy.ndarray`` of dtype object
+       Prior over observations or 'prior preferences', storing the "value" of each outcome in terms of relative log probabilities.
+       This is softmaxed to form a proper probability distribution before being used to compute the expected utility term of the expected free energy.
+    A_factor_list: ``list`` of ``list``s of ``int``
+        ``list`` that stores the indices of the hidden state factor indices that each observation modality depends on.
+    B_factor_list: ``list`` of ``list``s of ``int``
+        ``list`` that stores the indices of the hidden state factor indices that each hidden state factor depends on.
+    num_controls: ``list`` of ``int``
+        ``list`` of the dimensionalities of each control state factor.
+    policy_len: ``int``, default 1
+        Temporal depth ("planning horizon") of the policies
+    beam_width: ``int``, default 8
+        Number of partial policies kept at each depth of the search
+    use_utility: ``Bool``, default ``True``
+        Boolean flag that determines whether expected utility should be incorporated into computation of EFE.
+    use_states_info_gain: ``Bool``, default ``True``
+        Boolean flag that determines whether state epistemic value (info gain about hidden states) should be incorporated into computation of EFE.
+    use_param_info_gain: ``Bool``, default ``False``
+        Boolean flag that determines whether parameter epistemic value (info gain about generative model parameters) should be incorporated into computation of EFE.
+    pA: ``numpy.ndarray`` of dtype object, optional
+        Dirichlet parameters over observation model (same shape as ``A``)
+    pB: ``numpy.ndarray`` of dtype object, optional
+        Dirichlet parameters over transition model (same shape as ``B``)
+    I: ``numpy.ndarray`` of dtype object
+        For each state factor, contains a 2D ``numpy.ndarray`` whose element i,j yields the probability
+        of reaching the goal state backwards from state j after i steps.
+    gamma: float, default 16.0
+        Prior precision over policies, scales the contribution of the expected free energy to the posterior over policies
+
+    Returns
+    ----------
+    q_pi: 1D ``numpy.ndarray``
+        Posterior beliefs over the policies that survived the search, i.e. a vector containing one posterior probability per policy.
+    G: 1D ``numpy.ndarray``
+        Negative expected free energies of each surviving policy.
+    policies: ``list`` of 2D ``numpy.ndarray``
+        ``list`` that stores each surviving policy in ``policies[p_idx]``, with shape ``(policy_len, num_factors)``
+    """
+
+    multiactions = [np.array(action) for action in itertools.product(*[range(n_c) for n_c in num_controls])]
+
+    # each entry of the beam stores a partial policy, the states expected at its last timestep, and its negative expected free energy
+    beam = [([], qs, 0.)]
+
+    for t in range(policy_len):
+        expansions = []
+        for partial_policy, qs_prev, neg_G in beam:
+            for action in multiactions:
+                qs_next = get_expected_states_interactions(qs_prev, B, B_factor_list, action.reshape(1, -1))[0]
+                neg_efe_t = calc_neg_efe_step(
+                    qs, qs_prev, qs_next, action, A, C, A_factor_list, B_factor_list, t=t,
+                    use_utility=use_utility, use_states_info_gain=use_states_info_gain, use_param_info_gain=use_param_info_gain,
+                    pA=pA, pB=pB, I=I
+                )
+                expansions.append((partial_policy + [action], qs_next, neg_G + neg_efe_t))
+
+        best = np.argsort([-neg_G for _, _, neg_G in expansions], kind="stable")[:beam_width]
+        beam = [expansions[idx] for idx in best]
+
+    policies = [np.array(partial_policy) for partial_policy, _, _ in beam]
+    G = np.array([neg_G for _, _, neg_G in beam])
+
+    q_pi = softmax(G * gamma)
+
+    return q_pi, G, policies
+
+def update_posterior_policies_mcts(
+    qs,
+    A,
+    B,
+    C,
+    A_factor_list,
+    B_factor_list,
+    num_controls,
+    policy_len=1,
+    num_simulations=100,
+    time_budget=None,
+    exploration=1.0,
+    action=None,
+    search_tree=None,
+    use_utility=True,
+    use_states_info_gain=True,
+    use_param_info_gain=False,
+    pA=None,
+    pB=None,
+    I=None,
+    gamma=16.0
+):
+    """
+    Update posterior beliefs about policies using Monte Carlo tree search (MCTS), so that the cost of planning is bounded by a simulation budget
+    rather than by the number of policies. Each simulation selects a sequence of actions by descending the search tree with the UCT rule,
+    expands one new node, completes the sequence to ``policy_len`` timesteps with uniformly random actions, and scores it with its negative expected free energy
+    (see ``get_policy_tree_neg_efe``). The negative expected free energy is then backed up along the nodes of the search tree that were visited.
+    The returned policies are the best action sequences found below each action at the root of the tree.
+
+    Parameters
+    ----------
+    qs: ``numpy.ndarray`` of dtype object
+        Marginal posterior beliefs over hidden states at current timepoint (unconditioned on policies)
+    A: ``numpy.ndarray`` of dtype object
+        Sensory likelihood mapping or 'observation model', mapping from hidden states to observations. Each element ``A[m]`` of
+        stores an ``numpy.ndarray`` multidimensional array for observation modality ``m``, whose entries ``A[m][i, j, k, ...]`` store
+        the probability of observation level ``i`` given hidden state levels ``j, k, ...``
+    B: ``numpy.ndarray`` of dtype object
+        Dynamics likelihood mapping or 'transition model', mapping from hidden states at ``t`` to hidden states at ``t+1``, given some control state ``u``.
+        Each element ``B[f]`` of this object array stores a 3-D tensor for hidden state factor ``f``, whose entries ``B[f][s, v, u]`` store the probability
+        of hidden state level ``s`` at the current time, given hidden state level ``v`` and action ``u`` at the previous time.
+    C: ``numpy.ndarray`` of dtype object
+       Prior over observations or 'prior preferences', storing the "value" of each outcome in terms of relative log probabilities.
+       This is softmaxed to form a proper probability distribution before being used to compute the expected utility term of the expected free energy.
+    A_factor_list: ``list`` of ``list``s of ``int``
+        ``list`` that stores the indices of the hidden state factor indices that each observation modality depends on.
+    B_factor_list: ``list`` of ``list``s of ``int``
+        ``list`` that stores the indices of the hidden state factor indices that each hidden state factor depends on.
+    num_controls: ``list`` of ``int``
+        ``list`` of the dimensionalities of each control state factor.
+    policy_len: ``int``, default 1
+        Temporal depth ("planning horizon") of the policies
+    num_simulations: ``int``, default 100
+        Maximum number of simulations. If ``None``, the search is only bounded by ``time_budget``.
+    time_budget: ``float``, default ``None``
+        Maximum wall-clock duration of the search, in seconds. If ``None``, the search is only bounded by ``num_simulations``.
+        At least one simulation is always run.
+    exploration: ``float``, default 1.0
+        Exploration constant of the UCT rule
+    action: 1D ``numpy.ndarray``, default ``None``
+        The action taken at the previous timestep (one entry per control factor). If given together with ``search_tree``, the sub-tree below
+        this action is re-used as the starting point of the search.
+    search_tree: ``dict``, default ``None``
+        The search tree returned by this function at the previous timestep. Keys are tuples of actions (one tuple of action indices per timestep)
+        and values are the visit count and the total negative expected free energy backed up through the node.
+    use_utility: ``Bool``, default ``True``
+        Boolean flag that determines whether expected utility should be incorporated into computation of EFE.
+    use_states_info_gain: ``Bool``, default ``True``
+        Boolean flag that determines whether state epistemic value (info gain about hidden states) should be incorporated into computation of EFE.
+    use_param_info_gain: ``Bool``, default ``False``
+        Boolean flag that determines whether parameter epistemic value (info gain about generative model parameters) should be incorporated into computation of EFE.
+    pA: ``numpy.ndarray`` of dtype object, optional
+        Dirichlet parameters over observation model (same shape as ``A``)
+    pB: ``numpy.ndarray`` of dtype object, optional
+        Dirichlet parameters over transition model (same shape as ``B``)
+    I: ``numpy.ndarray`` of dtype object
+        For each state factor, contains a 2D ``numpy.ndarray`` whose element i,j yields the probability
+        of reaching the goal state backwards from state j after i steps.
+    gamma: float, default 16.0
+        Prior precision over policies, scales the contribution of the expected free energy to the posterior over policies
+
+    Returns
+    ----------
+    q_pi: 1D ``numpy.ndarray``
+        Posterior beliefs over the policies found by the search, i.e. a vector containing one posterior probability per policy.
+    G: 1D ``numpy.ndarray``
+        Negative expected free energies of each policy found by the search.
+    policies: ``list`` of 2D ``numpy.ndarray``
+        ``list`` that stores the best policy found below each visited root action, with shape ``(policy_len, num_factors)``
+    search_tree: ``dict``
+        The search tree, to be passed to this function at the next timestep.
+    """
+
+    if num_simulations is None and time_budget is None:
+        raise ValueError("At least one of `num_simulations` and `time_budget` must be given")
+
+    multiactions = list(itertools.product(*[range(n_c) for n_c in num_controls]))
+
+    if action is not None and search_tree is not None:
+        action_key = tuple(int(a) for a in action)
+        search_tree = {prefix[1:]: stats for prefix, stats in search_tree.items() if len(prefix) > 1 and prefix[0] == action_key}
+    else:
+        search_tree = {}
+
+    policy_tree = {} # expected states and EFE terms of the action sequences that have been rolled out from `qs`
+    best_policies = {} # best negative EFE and action sequence found below each root action
+
+    start_time = time.perf_counter()
+    n_simulations = 0
+
+    while n_simulations == 0 or (
+        (num_simulations is None or n_simulations < num_simulations) and
+        (time_budget is None or (time.perf_counter() - start_time) < time_budget)
+    ):
+        # selection and expansion of the search tree, followed by a random rollout until `policy_len`
+        path = ()
+        expanded = False
+        for t in range(policy_len):
+            children = [path + (a,) for a in multiactions]
+            if expanded:
+                path = children[np.random.randint(len(children))]
+                continue
+            unvisited = [child for child in children if child not in search_tree]
+            if len(unvisited) > 0:
+                path = unvisited[np.random.randint(len(unvisited))]
+                search_tree[path] = [0, 0.]
+                expanded = True
+            else:
+                N_parent = sum([search_tree[child][0] for child in children])
+                ucb = [search_tree[child][1] / search_tree[child][0] + exploration * np.sqrt(np.log(N_parent) / search_tree[child][0]) for child in children]
+                path = children[int(np.argmax(ucb))]
+
+        G_path, policy_tree = get_policy_tree_neg_efe(
+            qs,
+            [np.array(path)],
+            A,
+            B,
+            C,
+            A_factor_list,
+            B_factor_list,
+            use_utility,
+            use_states_info_gain,
+            use_param_info_gain,
+            pA,
+            pB,
+            I,
+            policy_tree=policy_tree
+        )
+        neg_G = G_path[0]
+
+        # back up the negative EFE through the nodes of the search tree
+        for t in range(1, policy_len + 1):
+            if path[:t] in search_tree:
+                search_tree[path[:t]][0] += 1
+                search_tree[path[:t]][1] += neg_G
+
+        if path[0] not in best_policies or neg_G > best_policies[path[0]][0]:
+            best_policies[path[0]] = (neg_G, path)
+
+        n_simulations += 1
+
+    root_actions = [a for a in multiactions if a in best_policies]
+    policies = [np.array(best_policies[a][1]) for a in root_actions]
+    G = np.array([best_policies[a][0] for a in root_actions])
+
+    q_pi = softmax(G * gamma)
+
+    return q_pi, G, policies, search_tree
+
 def get_expected_states(qs, B, policy):
     """
     Compute the expected states under a policy, also known as the posterior predictive density over states
@@ -538,6 +1217,40 @@ def get_expected_states_interactions(qs, B, B_factor_list, policy):
             qs_pi[t+1][control_factor] = spm_dot(B[control_factor][...,int(action)], qs_pi[t][factor_idx])
 
     return qs_pi[1:]
+
+def get_expected_joint_states(qs_joint, B, B_factor_list, action):
+    """
+    Compute the expected joint distribution over hidden states after taking an action, given a joint distribution over hidden states.
+    Unlike ``get_expected_states_interactions``, this keeps the correlations between hidden state factors.
+
+    Parameters
+    ----------
+    qs_joint: ``numpy.ndarray``
+        Joint beliefs over hidden states at a given timepoint, of shape ``num_states``
+    B: ``numpy.ndarray`` of dtype object
+        Dynamics likelihood mapping or 'transition model', mapping from hidden states at ``t`` to hidden states at ``t+1``, given some control state ``u``.
+        Each element ``B[f]`` of this object array stores a tensor for hidden state factor ``f``, whose entries ``B[f][s, v, ..., u]`` store the probability
+        of hidden state level ``s`` at the current time, given the levels ``v, ...`` of the hidden state factors in ``B_factor_list[f]`` and action ``u`` at the previous time.
+    B_factor_list: ``list`` of ``list`` of ``int``
+        List of lists of hidden state factors each hidden state factor depends on. Each element ``B_factor_list[i]`` is a list of the factor indices that factor i's dynamics depend on.
+    action: 1D ``numpy.ndarray``
+        The action taken, with one entry per hidden state factor
+
+    Returns
+    -------
+    qs_joint_next: ``numpy.ndarray``
+        Joint beliefs over hidden states expected at the next timepoint, of shape ``num_states``
+    """
+
+    num_factors = len(B)
+
+    # indices `0, ..., num_factors - 1` label the current states and `num_factors, ..., 2 * num_factors - 1` the next states
+    args = [qs_joint, list(range(num_factors))]
+    for f in range(num_factors):
+        args += [B[f][..., int(action[f])], [num_factors + f] + list(B_factor_list[f])]
+    args.append(list(range(num_factors, 2 * num_factors)))
+
+    return contract(*args, backend='numpy')
  
 def get_expected_obs(qs_pi, A):
     """
@@ -660,6 +1373,46 @@ def calc_expected_utility(qo_pi, C):
     return expected_util
 
 
+def calc_neg_efe_upper_bound(A, C, policy_len, use_utility=True, use_states_info_gain=True):
+    """
+    Computes an upper bound on the negative expected free energy that any policy of a given length can attain,
+    for use in pruning policies before evaluating them. The expected utility of each timestep and modality is bounded by the largest
+    log preference, and the state information gain by the entropy of a uniform distribution over observations. Inductive costs are never positive.
+
+    Parameters
+    ----------
+    A: ``numpy.ndarray`` of dtype object
+        Sensory likelihood mapping or 'observation model', mapping from hidden states to observations. Each element ``A[m]`` of
+        stores an ``numpy.ndarray`` multidimensional array for observation modality ``m``, whose entries ``A[m][i, j, k, ...]`` store
+        the probability of observation level ``i`` given hidden state levels ``j, k, ...``
+    C: ``numpy.ndarray`` of dtype object
+       Prior over observations or 'prior preferences', storing the "value" of each outcome in terms of relative log probabilities.
+    policy_len: ``int``
+        Temporal depth of the policies
+    use_utility: ``Bool``, default ``True``
+        Boolean flag that determines whether expected utility is included in the bound.
+    use_states_info_gain: ``Bool``, default ``True``
+        Boolean flag that determines whether state epistemic value is included in the bound.
+
+    Returns
+    -------
+    G_bound: float
+        Upper bound on the negative expected free energy of policies of length ``policy_len``
+    """
+
+    G_bound = 0.
+
+    for modality in range(len(A)):
+        if use_utility:
+            C_m = C[modality] if C[modality].ndim == 2 else np.tile(C[modality][:, None], (1, policy_len))
+            lnC = spm_log_single(softmax(C_m[:, :policy_len]))
+            G_bound += lnC.max(axis=0).sum()
+        if use_states_info_gain:
+            G_bound += policy_len * np.log(A[modality].shape[0])
+
+    return G_bound
+
+
 def calc_states_info_gain(A, qs_pi):
     """
     Computes the Bayesian surprise or information gain about states of a policy, 
@@ -949,6 +1702,179 @@ def calc_inductive_cost(qs, qs_pi, I, epsilon=1e-3):
                 
     return inductive_cost
 
+def calc_neg_efe_step(
+    qs,
+    qs_prev,
+    qs_next,
+    action,
+    A,
+    C,
+    A_factor_list,
+    B_factor_list,
+    t=0,
+    use_utility=True,
+    use_states_info_gain=True,
+    use_param_info_gain=False,
+    pA=None,
+    pB=None,
+    I=None
+):
+    """
+    Computes the contribution of a single timestep of a policy to its negative expected free energy. Summing the output of this function
+    over the timesteps of a policy gives the same negative expected free energy as ``update_posterior_policies_factorized``.
+
+    Parameters
+    ----------
+    qs: ``numpy.ndarray`` of dtype object
+        Marginal posterior beliefs over hidden states at the current timepoint (the root of the policy rollout)
+    qs_prev: ``numpy.ndarray`` of dtype object
+        Predictive beliefs over hidden states at the timestep before ``t`` (equal to ``qs`` when ``t == 0``)
+    qs_next: ``numpy.ndarray`` of dtype object
+        Predictive beliefs over hidden states at timestep ``t``, expected after taking ``action`` from ``qs_prev``
+    action: 1D ``numpy.ndarray``
+        Vector containing the indices of the actions taken for each control factor at timestep ``t``
+    A: ``numpy.ndarray`` of dtype object
+        Sensory likelihood mapping or 'observation model', mapping from hidden states to observations.
+    C: ``numpy.ndarray`` of dtype object
+       Prior over observations or 'prior preferences', storing the "value" of each outcome in terms of relative log probabilities.
+       If ``C[m]`` is 2-D, its ``t``-th column stores the preferences at timestep ``t``.
+    A_factor_list: ``list`` of ``list``s of ``int``
+        ``list`` that stores the indices of the hidden state factor indices that each observation modality depends on.
+    B_factor_list: ``list`` of ``list``s of ``int``
+        ``list`` that stores the indices of the hidden state factor indices that each hidden state factor depends on.
+    t: ``int``, default 0
+        Index of the timestep within the policy
+    use_utility: ``Bool``, default ``True``
+        Boolean flag that determines whether expected utility should be incorporated into computation of EFE.
+    use_states_info_gain: ``Bool``, default ``True``
+        Boolean flag that determines whether state epistemic value (info gain about hidden states) should be incorporated into computation of EFE.
+    use_param_info_gain: ``Bool``, default ``False``
+        Boolean flag that determines whether parameter epistemic value (info gain about generative model parameters) should be incorporated into computation of EFE.
+    pA: ``numpy.ndarray`` of dtype object, optional
+        Dirichlet parameters over observation model (same shape as ``A``)
+    pB: ``numpy.ndarray`` of dtype object, optional
+        Dirichlet parameters over transition model (same shape as ``B``)
+    I: ``numpy.ndarray`` of dtype object
+        For each state factor, contains a 2D ``numpy.ndarray`` whose element i,j yields the probability
+        of reaching the goal state backwards from state j after i steps.
+
+    Returns
+    -------
+    neg_efe_t: float
+        Negative expected free energy of the policy at timestep ``t``
+    """
+
+    qo_next = get_expected_obs_factorized([qs_next], A, A_factor_list)
+
+    neg_efe_t = 0.
+
+    if use_utility:
+        C_t = utils.obj_array(len(C))
+        for modality, C_m in enumerate(C):
+            C_t[modality] = C_m if C_m.ndim == 1 else C_m[:, t]
+        neg_efe_t += calc_expected_utility(qo_next, C_t)
+
+    if use_states_info_gain:
+        neg_efe_t += calc_states_info_gain_factorized(A, [qs_next], A_factor_list)
+
+    if use_param_info_gain:
+        if pA is not None:
+            neg_efe_t += calc_pA_info_gain_factorized(pA, qo_next, [qs_next], A_factor_list).item()
+        if pB is not None:
+            neg_efe_t += calc_pB_info_gain_interactions(pB, [qs_next], qs_prev, B_factor_list, action.reshape(1, -1)).item()
+
+    if I is not None:
+        neg_efe_t += calc_inductive_cost(qs, [qs_next], I)
+
+    return neg_efe_t
+
+def get_policy_tree_neg_efe(
+    qs,
+    policies,
+    A,
+    B,
+    C,
+    A_factor_list,
+    B_factor_list,
+    use_utility=True,
+    use_states_info_gain=True,
+    use_param_info_gain=False,
+    pA=None,
+    pB=None,
+    I=None,
+    policy_tree=None
+):
+    """
+    Computes the negative expected free energy of each policy by rolling out a tree of policy prefixes. Policies that share their first ``t`` actions
+    share the expected states and the expected free energy terms of those ``t`` timesteps, which are only computed once.
+
+    Parameters
+    ----------
+    qs: ``numpy.ndarray`` of dtype object
+        Marginal posterior beliefs over hidden states at current timepoint (unconditioned on policies)
+    policies: ``list`` of 2D ``numpy.ndarray``
+        ``list`` that stores each policy in ``policies[p_idx]``. Shape of ``policies[p_idx]`` is ``(num_timesteps, num_factors)`` where `num_timesteps` is the temporal
+        depth of the policy and ``num_factors`` is the number of control factors.
+    A: ``numpy.ndarray`` of dtype object
+        Sensory likelihood mapping or 'observation model', mapping from hidden states to observations.
+    B: ``numpy.ndarray`` of dtype object
+        Dynamics likelihood mapping or 'transition model', mapping from hidden states at ``t`` to hidden states at ``t+1``, given some control state ``u``.
+    C: ``numpy.ndarray`` of dtype object
+       Prior over observations or 'prior preferences', storing the "value" of each outcome in terms of relative log probabilities.
+    A_factor_list: ``list`` of ``list``s of ``int``
+        ``list`` that stores the indices of the hidden state factor indices that each observation modality depends on.
+    B_factor_list: ``list`` of ``list``s of ``int``
+        ``list`` that stores the indices of the hidden state factor indices that each hidden state factor depends on.
+    use_utility: ``Bool``, default ``True``
+        Boolean flag that determines whether expected utility should be incorporated into computation of EFE.
+    use_states_info_gain: ``Bool``, default ``True``
+        Boolean flag that determines whether state epistemic value (info gain about hidden states) should be incorporated into computation of EFE.
+    use_param_info_gain: ``Bool``, default ``False``
+        Boolean flag that determines whether parameter epistemic value (info gain about generative model parameters) should be incorporated into computation of EFE.
+    pA: ``numpy.ndarray`` of dtype object, optional
+        Dirichlet parameters over observation model (same shape as ``A``)
+    pB: ``numpy.ndarray`` of dtype object, optional
+        Dirichlet parameters over transition model (same shape as ``B``)
+    I: ``numpy.ndarray`` of dtype object
+        For each state factor, contains a 2D ``numpy.ndarray`` whose element i,j yields the probability
+        of reaching the goal state backwards from state j after i steps.
+    policy_tree: ``dict``, default ``None``
+        Previously evaluated policy prefixes rooted at ``qs``. Keys are tuples of actions (one tuple of action indices per timestep)
+        and values are tuples ``(qs_t, neg_efe_t)`` of the expected states and the negative expected free energy at the last timestep of the prefix.
+
+    Returns
+    -------
+    G: 1D ``numpy.ndarray``
+        Negative expected free energies of each policy, i.e. a vector containing one negative expected free energy per policy.
+    policy_tree: ``dict``
+        The tree of policy prefixes, including the prefixes evaluated during this call.
+    """
+
+    if policy_tree is None:
+        policy_tree = {}
+
+    G = np.zeros(len(policies))
+
+    for idx, policy in enumerate(policies):
+        qs_prev = qs
+        prefix = ()
+        for t in range(policy.shape[0]):
+            action = policy[t, :]
+            prefix = prefix + (tuple(int(a) for a in action),)
+            if prefix not in policy_tree:
+                qs_next = get_expected_states_interactions(qs_prev, B, B_factor_list, action.reshape(1, -1))[0]
+                neg_efe_t = calc_neg_efe_step(
+                    qs, qs_prev, qs_next, action, A, C, A_factor_list, B_factor_list, t=t,
+                    use_utility=use_utility, use_states_info_gain=use_states_info_gain, use_param_info_gain=use_param_info_gain,
+                    pA=pA, pB=pB, I=I
+                )
+                policy_tree[prefix] = (qs_next, neg_efe_t)
+
+            qs_prev, neg_efe_t = policy_tree[prefix]
+            G[idx] += neg_efe_t
+
+    return G, policy_tree
+
 def construct_policies(num_states, num_controls = None, policy_len=1, control_fac_idx=None):
     """
     Generate a ``list`` of policies. The returned array ``policies`` is a ``list`` that stores one policy per entry.
@@ -75,41 +75,22 @@ def generate_grid_world_transitions(action_labels, num_rows = 3, num_cols = 3):
     that an agent can use to navigate in a 2-dimensional grid world
     """
 
+    moves = {"LEFT": (0, -1), "DOWN": (1, 0), "RIGHT": (0, 1), "UP": (-1, 0), "STAY": (0, 0)}
+    for action_label in action_labels:
+        if action_label not in moves:
+            raise ValueError(f"Unknown action label `{action_label}`, must be one of {list(moves)}")
+
     num_grid_locs = num_rows * num_cols
 
     transition_matrix = np.zeros( (num_grid_locs, num_grid_locs, len(action_labels)) )
 
-    grid = np.arange(num_grid_locs).reshape(num_rows, num_cols)
-    it = np.nditer(grid, flags=["multi_index"])
-
-    loc_list = []
-    while not it.finished:
-        loc_list.append(it.multi_index)
-        it.iternext()
-
+    # grid locations are indexed in row-major order; moves off the edge of the grid leave the location unchanged
+    curr_state = np.arange(num_grid_locs)
+    curr_row, curr_col = np.divmod(curr_state, num_cols)
     for action_id, action_label in enumerate(action_labels):
-
-        for curr_state, grid_location in enumerate(loc_list):
-
-            curr_row, curr_col = grid_location
-            
-            if action_label == "LEFT":
-                next_col = curr_col - 1 if curr_col > 0 else curr_col 
-                next_row = curr_row
-            elif action_label == "DOWN":
-                next_row = curr_row + 1 if curr_row < (num_rows-1) else curr_row 
-                next_col = curr_col
-            elif action_label == "RIGHT":
-                next_col = curr_col + 1 if curr_col < (num_cols-1) else curr_col 
-                next_row = curr_row
-            elif action_label == "UP":
-                next_row = curr_row - 1 if curr_row > 0 else curr_row 
-                next_col = curr_col
-            elif action_label == "STAY":
-                next_row, next_col = curr_row, curr_col
-
-            new_location = (next_row, next_col)
-            next_state = loc_list.index(new_location)
-            transition_matrix[next_state, curr_state, action_id] = 1.0
+        d_row, d_col = moves[action_label]
+        next_row = np.clip(curr_row + d_row, 0, num_rows - 1)
+        next_col = np.clip(curr_col + d_col, 0, num_cols - 1)
+        transition_matrix[next_row * num_cols + next_col, curr_state, action_id] = 1.0
     
     return transition_matrix
@@ -2,3 +2,5 @@ from .env import Env
 from .grid_worlds import GridWorldEnv, DGridWorldEnv
 from .visual_foraging import VisualForagingEnv, SceneConstruction, RandomDotMotion, initialize_scene_construction_GM, initialize_RDM_GM
 from .tmaze import TMazeEnv, TMazeEnvNullOutcome
+from .tabular import TabularEnv
+from .vec_env import VecEnv
@@ -68,6 +68,11 @@ class Env(object):
             "<{}> does not provide a model specification".format(type(self).__name__)
         )
 
+    def get_init_state_dist(self):
+        raise ValueError(
+            "<{}> does not provide a model specification".format(type(self).__name__)
+        )
+
     def get_uniform_posterior(self):
         raise ValueError(
             "<{}> does not provide a model specification".format(type(self).__name__)
@@ -100,7 +100,7 @@ class GridWorldEnv(Env):
         state: ``int``
             The new, updated state of the environment, i.e. the location of the agent in grid world after the action has been made. Will be discrete index in the range ``(0, (shape[0] * shape[1])-1)``. It is thus a "linear index" of the location of the agent in grid world.
         """
-        state = self.P[self.state][action]
+        state = int(self.P[self.state, int(action)])
         self.state = state
         self.last_action = action
         return state
@@ -139,28 +139,16 @@ class GridWorldEnv(Env):
         self.state = self.init_state
 
     def _build(self):
-        P = {}
-        grid = np.arange(self.n_states).reshape(self.shape)
-        it = np.nditer(grid, flags=["multi_index"])
+        # table of next states, indexed by the current state and the action
+        s = np.arange(self.n_states)
+        y, x = np.divmod(s, self.max_x)
 
-        while not it.finished:
-            s = it.iterindex
-            y, x = it.multi_index
-            P[s] = {a: [] for a in range(self.n_control)}
-
-            next_up = s if y == 0 else s - self.max_x
-            next_right = s if x == (self.max_x - 1) else s + 1
-            next_down = s if y == (self.max_y - 1) else s + self.max_x
-            next_left = s if x == 0 else s - 1
-            next_stay = s
-
-            P[s][self.UP] = next_up
-            P[s][self.RIGHT] = next_right
-            P[s][self.DOWN] = next_down
-            P[s][self.LEFT] = next_left
-            P[s][self.STAY] = next_stay
-
-            it.iternext()
+        P = np.empty((self.n_states, self.n_control), dtype=int)
+        P[:, self.UP] = np.where(y == 0, s, s - self.max_x)
+        P[:, self.RIGHT] = np.where(x == (self.max_x - 1), s, s + 1)
+        P[:, self.DOWN] = np.where(y == (self.max_y - 1), s, s + self.max_x)
+        P[:, self.LEFT] = np.where(x == 0, s, s - 1)
+        P[:, self.STAY] = s
 
         self.P = P
 
@@ -170,13 +158,11 @@ class GridWorldEnv(Env):
             init_state_dist[self.init_state] = 1.0
         else:
             init_state_dist[init_state] = 1.0
+        return init_state_dist
 
     def get_transition_dist(self):
         B = np.zeros([self.n_states, self.n_states, self.n_control])
-        for s in range(self.n_states):
-            for a in range(self.n_control):
-                ns = int(self.P[s][a])
-                B[ns, s, a] = 1
+        B[self.P, np.arange(self.n_states)[:, None], np.arange(self.n_control)] = 1
         return B
 
     def get_likelihood_dist(self):
@@ -222,7 +208,7 @@ class DGridWorldEnv(object):
         return state
 
     def step(self, action):
-        state = self.P[self.state][action]
+        state = int(self.P[self.state, int(action)])
         self.state = state
         self.last_action = action
         return state
@@ -253,24 +239,14 @@ class DGridWorldEnv(object):
         self.state = self.init_state
 
     def _build(self):
-        P = {}
-        grid = np.arange(self.n_states).reshape(self.shape)
-        it = np.nditer(grid, flags=["multi_index"])
-
-        while not it.finished:
-            s = it.iterindex
-            y, x = it.multi_index
-            P[s] = {a: [] for a in range(self.n_control)}
-
-            next_right = s if x == (self.max_x - 1) else s + 1
-            next_left = s if x == 0 else s - 1
-            next_stay = s
-
-            P[s][self.LEFT] = next_left
-            P[s][self.STAY] = next_stay
-            P[s][self.RIGHT] = next_right
+        # table of next states, indexed by the current state and the action
+        s = np.arange(self.n_states)
+        x = s % self.max_x
 
-            it.iternext()
+        P = np.empty((self.n_states, self.n_control), dtype=int)
+        P[:, self.LEFT] = np.where(x == 0, s, s - 1)
+        P[:, self.STAY] = s
+        P[:, self.RIGHT] = np.where(x == (self.max_x - 1), s, s + 1)
 
         self.P = P
 
@@ -280,13 +256,11 @@ class DGridWorldEnv(object):
             init_state_dist[self.init_state] = 1.0
         else:
             init_state_dist[init_state] = 1.0
+        return init_state_dist
 
     def get_transition_dist(self):
         B = np.zeros([self.n_states, self.n_states, self.n_control])
-        for s in range(self.n_states):
-            for a in range(self.n_control):
-                ns = int(self.P[s][a])
-                B[ns, s, a] = 1
+        B[self.P, np.arange(self.n_states)[:, None], np.arange(self.n_control)] = 1
         return B
 
     def get_likelihood_dist(self):
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Tabular Generative Process Environment
+
+"""
+
+import numpy as np
+
+from pymdp.envs import Env
+from pymdp import utils
+
+
+def build_alias_tables(probs):
+    """
+    Build the alias tables (Vose's method) of a set of categorical distributions, so that each of them can be sampled in constant time.
+
+    Parameters
+    ----------
+    probs: 2D ``numpy.ndarray``
+        Array of shape ``(num_distributions, num_outcomes)``, whose rows are categorical distributions
+
+    Returns
+    ----------
+    accept: 2D ``numpy.ndarray``
+        Probability of accepting outcome ``i`` when it is drawn uniformly from row ``c``, stored in ``accept[c, i]``
+    alias: 2D ``numpy.ndarray``
+        Outcome returned instead of ``i`` when it is rejected, stored in ``alias[c, i]``
+    """
+    num_rows, num_outcomes = probs.shape
+    scaled = probs * num_outcomes / probs.sum(-1, keepdims=True)
+
+    accept = np.ones((num_rows, num_outcomes))
+    alias = np.tile(np.arange(num_outcomes), (num_rows, 1))
+    for c in range(num_rows):
+        s = scaled[c].copy()
+        small = [i for i in range(num_outcomes) if s[i] < 1.0]
+        large = [i for i in range(num_outcomes) if s[i] >= 1.0]
+        while small and large:
+            i, j = small.pop(), large.pop()
+            accept[c, i], alias[c, i] = s[i], j
+            s[j] -= 1.0 - s[i]
+            (small if s[j] < 1.0 else large).append(j)
+
+    return accept, alias
+
+def sample_alias(accept, alias, rows, rng):
+    """
+    Sample one outcome for each entry of ``rows``, from the distributions whose alias tables are given (see ``build_alias_tables``)
+
+    Parameters
+    ----------
+    accept: 2D ``numpy.ndarray``
+        Acceptance probabilities of the alias tables
+    alias: 2D ``numpy.ndarray``
+        Aliases of the alias tables
+    rows: ``numpy.ndarray`` of ``int``
+        Indices of the distributions to sample from
+    rng: ``numpy.random.Generator``
+        Random number generator
+
+    Returns
+    ----------
+    samples: ``numpy.ndarray`` of ``int``
+        Sampled outcomes, with the same shape as ``rows``
+    """
+    i = rng.integers(accept.shape[-1], size=rows.shape)
+    return np.where(rng.random(rows.shape) < accept[rows, i], i, alias[rows, i])
+
+
+class TabularEnv(Env):
+    """
+    Generative process defined directly by an observation model ``A``, a transition model ``B`` and an initial state distribution ``D``,
+    with the same (optionally sparse) dependencies as an ``Agent``'s generative model, given by ``A_factor_list`` and ``B_factor_list``.
+
+    Every column of ``A``, ``B`` and ``D`` (one distribution per configuration of parent states, and action) is turned into an alias table once,
+    so that each observation and state transition is sampled in constant time, whatever the number of outcomes. Hidden states are held as
+    integer indices. If ``num_envs`` is given, that many copies of the environment are stepped at once: states are arrays of shape
+    ``(num_envs, num_factors)``, and observations and actions arrays of shape ``(num_envs, num_modalities)`` and ``(num_envs, num_factors)``.
+    Otherwise, observations and actions are lists with one index per modality or factor, as in the other environments.
+
+    >>> env = TabularEnv(A, B, D, rng=np.random.default_rng(0))
+    >>> obs = env.reset()
+    >>> obs = env.step(actions)
+    """
+
+    def __init__(self, A, B, D, A_factor_list=None, B_factor_list=None, num_envs=None, rng=None):
+        """
+        Parameters
+        ----------
+        A: ``numpy.ndarray`` of dtype object
+            Observation model of the generative process, where ``A[m]`` has shape ``(num_obs[m], *[num_states[f] for f in A_factor_list[m]])``
+        B: ``numpy.ndarray`` of dtype object
+            Transition model of the generative process, where ``B[f]`` has shape ``(num_states[f], *[num_states[i] for i in B_factor_list[f]], num_controls[f])``
+        D: ``numpy.ndarray`` of dtype object
+            Distribution of the initial hidden states
+        A_factor_list: ``list`` of ``list`` of ``int``, default ``None``
+            Hidden state factors that each observation modality depends on. All of them if ``None``.
+        B_factor_list: ``list`` of ``list`` of ``int``, default ``None``
+            Hidden state factors that the transitions of each factor depend on. Only the factor itself if ``None``.
+        num_envs: ``int``, default ``None``
+            Number of copies of the environment stepped at once. A single environment if ``None``.
+        rng: ``numpy.random.Generator``, default ``None``
+            Random number generator used for all sampling. A new, unseeded one if ``None``.
+        """
+        self.A = utils.to_obj_array(A)
+        self.B = utils.to_obj_array(B)
+        self.D = utils.to_obj_array(D)
+
+        for name, arr in [("A", self.A), ("B", self.B), ("D", self.D)]:
+            if not utils.is_normalized(arr):
+                raise ValueError(f"The columns of `{name}` must be normalized categorical distributions")
+
+        self.num_states = [B_f.shape[0] for B_f in self.B]
+        self.num_controls = [B_f.shape[-1] for B_f in self.B]
+        self.num_obs = [A_m.shape[0] for A_m in self.A]
+        self.num_factors = len(self.num_states)
+        self.num_modalities = len(self.num_obs)
+
+        self.A_factor_list = [list(range(self.num_factors))] * self.num_modalities if A_factor_list is None else A_factor_list
+        self.B_factor_list = [[f] for f in range(self.num_factors)] if B_factor_list is None else B_factor_list
+
+        self.num_envs = num_envs
+        self.rng = np.random.default_rng() if rng is None else rng
+
+        # one alias table per column, with the parent states (and action) raveled into the column index
+        self._A_tables = [build_alias_tables(A_m.reshape(A_m.shape[0], -1).T) for A_m in self.A]
+        self._B_tables = [build_alias_tables(B_f.reshape(B_f.shape[0], -1).T) for B_f in self.B]
+        self._D_tables = [build_alias_tables(D_f.reshape(1, -1)) for D_f in self.D]
+
+        self._state = None
+
+    def reset(self, state=None):
+        """
+        Reset the hidden states, either to the given ones or by sampling them from ``D``, and return the initial observations.
+
+        Parameters
+        ----------
+        state: ``list`` or ``numpy.ndarray`` of ``int``, default ``None``
+            Hidden state indices, one per factor (and copy of the environment, with shape ``(num_envs, num_factors)``)
+
+        Returns
+        ----------
+        obs: ``list`` or ``numpy.ndarray`` of ``int``
+            Observation indices, one per modality (and copy of the environment)
+        """
+        batch_shape = (1,) if self.num_envs is None else (self.num_envs,)
+        if state is None:
+            rows = np.zeros(batch_shape, dtype=int)
+            state = np.stack([sample_alias(*tables, rows, self.rng) for tables in self._D_tables], -1)
+        self._state = np.asarray(state, dtype=int).reshape(batch_shape + (self.num_factors,))
+        return self._get_observation()
+
+    def step(self, actions):
+        """
+        Sample the next hidden states given one action per factor (and copy of the environment), and return the observations they generate.
+
+        Parameters
+        ----------
+        actions: ``list`` or ``numpy.ndarray`` of ``int``
+            Action indices, one per factor (and copy of the environment, with shape ``(num_envs, num_factors)``)
+
+        Returns
+        ----------
+        obs: ``list`` or ``numpy.ndarray`` of ``int``
+            Observation indices, one per modality (and copy of the environment)
+        """
+        actions = np.asarray(actions, dtype=int).reshape(self._state.shape)
+
+        next_state = []
+        for f, tables in enumerate(self._B_tables):
+            parents = [self._state[:, i] for i in self.B_factor_list[f]] + [actions[:, f]]
+            dims = [self.num_states[i] for i in self.B_factor_list[f]] + [self.num_controls[f]]
+            next_state.append(sample_alias(*tables, np.ravel_multi_index(parents, dims), self.rng))
+        self._state = np.stack(next_state, -1)
+
+        return self._get_observation()
+
+    def sample_action(self):
+        actions = np.stack([self.rng.integers(nc, size=self._batch_size) for nc in self.num_controls], -1)
+        return actions if self.num_envs is not None else actions[0].tolist()
+
+    def get_likelihood_dist(self):
+        return self.A
+
+    def get_transition_dist(self):
+        return self.B
+
+    def get_init_state_dist(self):
+        return self.D
+
+    def _get_observation(self):
+        obs = []
+        for m, tables in enumerate(self._A_tables):
+            parents = [self._state[:, f] for f in self.A_factor_list[m]]
+            dims = [self.num_states[f] for f in self.A_factor_list[m]]
+            obs.append(sample_alias(*tables, np.ravel_multi_index(parents, dims), self.rng))
+        obs = np.stack(obs, -1)
+
+        return obs if self.num_envs is not None else obs[0].tolist()
+
+    @property
+    def _batch_size(self):
+        return 1 if self.num_envs is None else self.num_envs
+
+    @property
+    def state(self):
+        return self._state if self.num_envs is not None else self._state[0].tolist()
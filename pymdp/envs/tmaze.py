@@ -88,6 +88,11 @@ class TMazeEnv(Env):
     def get_transition_dist(self):
         return self._transition_dist
 
+    def get_init_state_dist(self):
+        D = utils.obj_array_uniform(self.num_states)
+        D[LOCATION_FACTOR_ID] = utils.onehot(0, self.num_locations)
+        return D
+
 
     def get_rand_likelihood_dist(self):
         pass
@@ -255,6 +260,11 @@ class TMazeEnvNullOutcome(Env):
     def get_transition_dist(self):
         return self._transition_dist.copy()
 
+    def get_init_state_dist(self):
+        D = utils.obj_array_uniform(self.num_states)
+        D[LOCATION_FACTOR_ID] = utils.onehot(0, self.num_locations)
+        return D
+
     def _get_observation(self):
 
         prob_obs = [maths.spm_dot(A_m, self._state) for A_m in self._likelihood_dist]
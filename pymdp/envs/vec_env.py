@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Vectorized Environment
+
+"""
+
+import numpy as np
+
+from pymdp.envs.tabular import TabularEnv
+
+
+class VecEnv(TabularEnv):
+    """
+    ``num_envs`` copies of a discrete environment with a known generative process (observation model ``A``, transition model ``B`` and
+    initial state distribution ``D``), stepped all at once. Hidden states are held as integer indices in an array of shape ``(num_envs, num_factors)``,
+    and observations are sampled for all copies at once (see ``TabularEnv``) and returned as an integer array of shape
+    ``(num_envs, num_modalities)``, e.g. to feed a batch of agents.
+
+    >>> vec_env = VecEnv.from_env(TMazeEnv(), num_envs=128)
+    >>> obs = vec_env.reset()
+    >>> obs = vec_env.step(actions) # actions.shape == (128, vec_env.num_factors)
+    """
+
+    def __init__(self, A, B, D, num_envs, seed=None):
+        """
+        Parameters
+        ----------
+        A: ``numpy.ndarray`` of dtype object
+            Observation model of the generative process, where ``A[m]`` depends on all hidden state factors
+        B: ``numpy.ndarray`` of dtype object
+            Transition model of the generative process, where ``B[f]`` has shape ``(num_states[f], num_states[f], num_controls[f])``
+        D: ``numpy.ndarray`` of dtype object
+            Distribution of the initial hidden states, from which each copy samples its initial state at ``reset``
+        num_envs: ``int``
+            Number of copies of the environment
+        seed: ``int`` or ``None``
+            Seed of the random number generator
+        """
+        super().__init__(A, B, D, num_envs=num_envs, rng=np.random.default_rng(seed))
+
+    @classmethod
+    def from_env(cls, env, num_envs, seed=None):
+        """
+        Vectorize an environment that provides its generative process through ``get_likelihood_dist``, ``get_transition_dist``
+        and ``get_init_state_dist`` (e.g. ``GridWorldEnv``, ``TMazeEnv``, ``TMazeEnvNullOutcome``, ``VisualForagingEnv`` or ``RandomDotMotion``).
+        Observations and actions are indices, in the order of the outcomes and controls of that generative process.
+        """
+        return cls(env.get_likelihood_dist(), env.get_transition_dist(), env.get_init_state_dist(), num_envs, seed=seed)
@@ -48,20 +48,16 @@ class VisualForagingEnv(Env):
             full_state = np.empty(self.n_factors, dtype=object)
             full_state[LOCATION_ID] = loc_state
             full_state[SCENE_ID] = scene_state
-            self._state = Categorical(values=full_state)
+            self._state = full_state
         else:
-            self._state = Categorical(values=state)
+            self._state = state
         return self._get_observation()
 
     def step(self, actions):
-        prob_states = np.empty(self.n_factors, dtype=object)
+        prob_states = utils.obj_array(self.n_factors)
         for f in range(self.n_factors):
-            prob_states[f] = (
-                self._transition_dist[f][:, :, actions[f]]
-                .dot(self._state[f], return_numpy=True)
-                .flatten()
-            )
-        state = Categorical(values=prob_states).sample()
+            prob_states[f] = self._transition_dist[f][:, :, int(actions[f])].dot(self._state[f])
+        state = [utils.sample(ps_i) for ps_i in prob_states]
         self._state = self._construct_state(state)
         return self._get_observation()
 
@@ -77,14 +73,13 @@ class VisualForagingEnv(Env):
     def get_transition_dist(self):
         return self._transition_dist.copy()
 
+    def get_init_state_dist(self):
+        D = utils.obj_array_uniform(self.n_states)
+        D[LOCATION_ID] = utils.onehot(0, self.n_locations)
+        return D
+
     def get_uniform_posterior(self):
-        values = np.array(
-            [
-                np.ones(self.n_states[f]) / self.n_states[f]
-                for f in range(self.n_factors)
-            ]
-        )
-        return Categorical(values=values)
+        return utils.obj_array_uniform(self.n_states)
 
     def get_rand_likelihood_dist(self):
         pass
@@ -93,8 +88,8 @@ class VisualForagingEnv(Env):
         pass
 
     def _get_observation(self):
-        prob_obs = self._likelihood_dist.dot(self._state)
-        return prob_obs.sample()
+        prob_obs = [maths.spm_dot(A_m, self._state) for A_m in self._likelihood_dist]
+        return [utils.sample(po_i) for po_i in prob_obs]
 
     def _construct_transition_dist(self):
         B_locs = np.eye(self.n_locations)
@@ -105,28 +100,22 @@ class VisualForagingEnv(Env):
         B = np.empty(self.n_factors, dtype=object)
         B[LOCATION_ID] = B_locs
         B[SCENE_ID] = np.eye(self.n_scenes).reshape(self.n_scenes, self.n_scenes, 1)
-        return Categorical(values=B)
+        return B
 
     def _construct_likelihood_dist(self):
         A = np.empty(self.n_modalities, dtype=object)
         for g in range(self.n_modalities):
             A[g] = np.zeros([self.n_observations[g]] + self.n_states)
 
-        for loc in range(self.n_states[LOCATION_ID]):
-            for scene_id in range(self.n_states[SCENE_ID]):
-                scene = self.scenes[scene_id]
-                feat_loc_ids = np.ravel_multi_index(np.where(scene), scene.shape)
-                if loc in feat_loc_ids + 1:
-                    feat_ids = np.unravel_index(
-                        feat_loc_ids[loc == (feat_loc_ids + 1)], scene.shape
-                    )
-                    feats = scene[feat_ids]
-                    A[SCENE_ID][int(feats), loc, scene_id] = 1.0
-                else:
-                    A[SCENE_ID][0, loc, scene_id] = 1.0
-
-                A[LOCATION_ID][loc, loc, scene_id] = 1.0
-        return Categorical(values=A)
+        # location `loc > 0` fixates the scene cell `loc - 1` (in row-major order) and observes its feature, where empty cells (and location 0) give feature 0
+        locs = np.arange(self.n_states[LOCATION_ID])
+        scene_ids = np.arange(self.n_states[SCENE_ID])
+        feats = np.zeros((self.n_states[LOCATION_ID], self.n_states[SCENE_ID]), dtype=int)
+        feats[1:] = self.scenes.reshape(self.n_scenes, -1).T
+
+        A[SCENE_ID][feats, locs[:, None], scene_ids] = 1.0
+        A[LOCATION_ID][locs, locs, :] = 1.0
+        return A
 
     def _construct_default_scenes(self):
         scene_one = [[2, 2], [2, 2]]
@@ -138,7 +127,7 @@ class VisualForagingEnv(Env):
         state = np.empty(self.n_factors, dtype=object)
         for f in range(self.n_factors):
             state[f] = np.eye(self.n_states[f])[state_tuple[f]]
-        return Categorical(values=state)
+        return state
 
     @property
     def state(self):
@@ -269,15 +258,44 @@ class RandomDotMotion(Env):
 
         return self._get_observation()
 
+    def get_likelihood_dist(self):
+        """
+        Observation model of the task, with hidden state factors (dot direction, sampling state) and observation modalities
+        (observed dot direction, sampling state), indexed as in ``direction_names`` and ``sampling_names``
+        """
+        A = utils.obj_array_zeros([[self.num_directions, self.n_states, len(self.sampling_names)], [len(self.sampling_names), self.n_states, len(self.sampling_names)]])
+        for dir_idx in range(self.n_states):
+            A[0][:, dir_idx, 0] = self._dot_dist_of(dir_idx)
+        A[0][0, :, 1] = 1.0 # no dot motion is observed when breaking
+        for idx in range(len(self.sampling_names)):
+            A[1][idx, :, idx] = 1.0
+        return A
+
+    def get_transition_dist(self):
+        """
+        Transition model of the task: the dot direction does not change, and the action sets the sampling state
+        """
+        num_sampling = len(self.sampling_names)
+        B = utils.obj_array(2)
+        B[0] = np.eye(self.n_states).reshape(self.n_states, self.n_states, 1)
+        B[1] = np.zeros((num_sampling, num_sampling, num_sampling))
+        for action in range(num_sampling):
+            B[1][action, :, action] = 1.0
+        return B
+
+    def get_init_state_dist(self):
+        return utils.obj_array_uniform([self.n_states, len(self.sampling_names)])
+
+    def _dot_dist_of(self, dir_idx):
+        if self.direction_names[dir_idx] == 'null':
+            return utils.onehot(dir_idx, self.n_states)
+        dot_dist = np.zeros(self.n_states)
+        dot_dist[1:] = maths.softmax(self._p * utils.onehot(dir_idx-1, len(self.direction_names)-1))
+        return dot_dist
+
     def _generate_dot_dist(self):
 
-        _stateidx = self.direction_names.index(self._dot_dir)
-        if self._dot_dir == 'null':
-            self.dot_dist = utils.onehot(_stateidx, self.n_states)
-        else:
-            dot_dist = np.zeros(self.n_states)
-            dot_dist[1:] = maths.softmax(self._p * utils.onehot(_stateidx-1, len(self.direction_names)-1))
-            self.dot_dist = dot_dist
+        self.dot_dist = self._dot_dist_of(self.direction_names.index(self._dot_dir))
 
         return self.dot_dist
     
@@ -363,24 +381,28 @@ def initialize_scene_construction_GM(T = 6, reward = 2.0, punishment = -4.0, urg
     #             A[1][loc_id, scene_id, loc_id, config_id] = 1.0
 
     # Create the A array (fully-enumerated parameterization)
-    for state_id, scene_and_config_name in enumerate(all_scenes_all_configs):
-        scene_name, config_name = scene_and_config_name
-        for loc_id, loc_name in enumerate(loc_names):
-            _, flattened_scene_array = create_2x2_array(scene_name, config_name)
-            if loc_name == 'start': # at fixation location
-                A[0][0, state_id, loc_id] = 1.0
-            elif loc_name in quadrant_names: # fixating one of the quadrants
-                A[0][0, state_id, loc_id] = 'null' == flattened_scene_array[loc_id-1]
-                A[0][1, state_id, loc_id] = 'UP' == flattened_scene_array[loc_id-1]
-                A[0][2, state_id, loc_id] = 'RIGHT' == flattened_scene_array[loc_id-1]
-                A[0][3, state_id, loc_id] = 'DOWN'  == flattened_scene_array[loc_id-1]
-                A[0][4, state_id, loc_id] = 'LEFT'  == flattened_scene_array[loc_id-1]
-            elif loc_name in choice_names: # making a choice
-                scene_choice = loc_name.split("_")[1] + "_" + loc_name.split("_")[2]
-                A[0][5,state_id, loc_id] = scene_choice== scene_name # they get correct feedback if they choose the true scene at play
-                A[0][6,state_id, loc_id] = scene_choice != scene_name # they get incorrect feedback if they choose anything other than the true scene at play
-            
-            A[1][loc_id, state_id, loc_id] = 1.0
+    num_quadrants = len(quadrant_names)
+    state_ids = np.arange(num_states[0])
+    scene_ids, config_ids = np.divmod(state_ids, len(config_names)) # `all_scenes_all_configs` enumerates the configurations of each scene in turn
+
+    # what is seen in each quadrant of each scene and configuration, as an index of `what_obs_names` (0, i.e. 'null', for the empty quadrants)
+    scene_dirs = np.array([[what_obs_names.index(dot_dir) for dot_dir in scene_name.split("_")] for scene_name in scene_names])
+    config_quadrants = np.array(config_names) - 1
+    quadrant_obs = np.zeros((num_states[0], num_quadrants), dtype=int)
+    quadrant_obs[state_ids[:, None], config_quadrants[config_ids]] = scene_dirs[scene_ids]
+
+    quadrant_locs = np.arange(1, 1 + num_quadrants)
+    choice_locs = np.arange(1 + num_quadrants, len(loc_names))
+    choice_scene_ids = np.array([scene_names.index(choice_name.split("_", 1)[1]) for choice_name in choice_names])
+
+    A[0][0, :, 0] = 1.0 # at fixation location
+    A[0][quadrant_obs, state_ids[:, None], quadrant_locs] = 1.0 # fixating one of the quadrants
+    correct = scene_ids[:, None] == choice_scene_ids # making a choice
+    A[0][5, :, choice_locs] = correct.T # they get correct feedback if they choose the true scene at play
+    A[0][6, :, choice_locs] = ~correct.T # they get incorrect feedback if they choose anything other than the true scene at play
+
+    loc_ids = np.arange(len(loc_names))
+    A[1][loc_ids, :, loc_ids] = 1.0
 
     control_fac_idx = [1]
     for f, ns in enumerate(num_states):
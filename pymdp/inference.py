@@ -5,12 +5,15 @@
 import numpy as np
 
 from pymdp import utils
-from pymdp.maths import get_joint_likelihood_seq, get_joint_likelihood_seq_by_modality
-from pymdp.algos import run_vanilla_fpi, run_vanilla_fpi_factorized, run_mmp, run_mmp_factorized, _run_mmp_testing
+from pymdp.maths import EPS_VAL, dot_likelihood, get_joint_likelihood_seq, get_joint_likelihood_seq_by_modality
+from pymdp.algos import run_vanilla_fpi, run_vanilla_fpi_factorized, run_mmp, run_mmp_factorized, _run_mmp_testing, run_forward_backward
+from pymdp.algos.mmp import get_joint_likelihood_from_modalities, get_mmp_message_operators
 
 VANILLA = "VANILLA"
 VMP = "VMP"
 MMP = "MMP"
+FB = "FB"
+FILTER = "FILTER"
 BP = "BP"
 EP = "EP"
 CV = "CV"
@@ -62,7 +65,7 @@ def update_posterior_states_full(
 
     num_obs, num_states, num_modalities, num_factors = utils.get_model_dimensions(A, B)
     
-    prev_obs = utils.process_observation_seq(prev_obs, num_modalities, num_obs)
+    prev_obs = utils.process_observation_seq(prev_obs, num_modalities, num_obs, as_indices=True)
    
     lh_seq = get_joint_likelihood_seq(A, prev_obs, num_states)
 
@@ -96,6 +99,8 @@ def update_posterior_states_full_factorized(
     prev_actions=None,
     prior=None,
     policy_sep_prior = True,
+    lh_cache=None,
+    msg_ops=None,
     **kwargs,
 ):
     """
@@ -126,6 +131,11 @@ def update_posterior_states_full_factorized(
         If ``None``, this defaults to a flat (uninformative) prior over hidden states.
     policy_sep_prior: ``Bool``, default ``True``
         Flag determining whether the prior beliefs from the past are unconditioned on policy, or separated by /conditioned on the policy variable.
+    lh_cache: ``dict``, default ``None``
+        If provided, a rolling cache of the likelihoods of the observations in ``prev_obs``, as returned by ``update_likelihood_cache``.
+        Its likelihoods are used instead of re-computing them from ``prev_obs``.
+    msg_ops: ``dict``, default ``None``
+        If provided, the transition operators returned by ``algos.mmp.get_mmp_message_operators``. They are re-computed if they were not computed from ``B``.
     **kwargs: keyword arguments
         Optional keyword arguments for the function ``algos.mmp.run_mmp``
 
@@ -138,15 +148,20 @@ def update_posterior_states_full_factorized(
         Vector of variational free energies for each policy
     """
 
-    num_obs, num_states, num_modalities, num_factors = utils.get_model_dimensions(A, B)
-    
-    prev_obs = utils.process_observation_seq(prev_obs, num_modalities, num_obs)
-   
-    lh_seq = get_joint_likelihood_seq_by_modality(A, prev_obs, num_states)
+    if lh_cache is not None:
+        lh_seq = utils.obj_array_from_list(lh_cache['lh_seq'])
+        joint_lh_seq = utils.obj_array_from_list(lh_cache['joint_lh_seq'])
+    else:
+        num_obs, num_states, num_modalities, num_factors = utils.get_model_dimensions(A, B)
+        prev_obs = utils.process_observation_seq(prev_obs, num_modalities, num_obs, as_indices=True)
+        lh_seq = get_joint_likelihood_seq_by_modality(A, prev_obs, num_states)
+        joint_lh_seq = None
 
     if prev_actions is not None:
         prev_actions = np.stack(prev_actions,0)
 
+    msg_ops = get_mmp_message_operators(B, B_factor_list, msg_ops) # shared by all policies
+
     qs_seq_pi = utils.obj_array(len(policies))
     F = np.zeros(len(policies)) # variational free energy of policies
 
@@ -161,11 +176,137 @@ def update_posterior_states_full_factorized(
                 policy,
                 prev_actions=prev_actions,
                 prior= prior[p_idx] if policy_sep_prior else prior, 
+                joint_lh_seq=joint_lh_seq,
+                msg_ops=msg_ops,
                 **kwargs
             )
 
     return qs_seq_pi, F
 
+def update_posterior_states_forward_backward(
+    A,
+    mb_dict,
+    B,
+    prev_obs,
+    policies,
+    prev_actions=None,
+    prior=None,
+    policy_sep_prior = True,
+    lh_cache=None
+):
+    """
+    Update posterior over hidden states using exact (forward-backward) inference. This requires the hidden state factors to be independent, i.e. each modality
+    depends on a single hidden state factor and the dynamics of each factor only depend on that factor.
+
+    Parameters
+    ----------
+    A: ``numpy.ndarray`` of dtype object
+        Sensory likelihood mapping or 'observation model', mapping from hidden states to observations. Each element ``A[m]`` of
+        stores an ``numpy.ndarray`` multidimensional array for observation modality ``m``, whose entries ``A[m][i, j, k, ...]`` store 
+        the probability of observation level ``i`` given hidden state levels ``j, k, ...``
+    mb_dict: ``Dict``
+        Dictionary with two keys (``A_factor_list`` and ``A_modality_list``), that stores the factor indices that influence each modality (``A_factor_list``)
+        and the modality indices influenced by each factor (``A_modality_list``).
+    B: ``numpy.ndarray`` of dtype object
+        Dynamics likelihood mapping or 'transition model', mapping from hidden states at ``t`` to hidden states at ``t+1``, given some control state ``u``.
+        Each element ``B[f]`` of this object array stores a 3-D tensor for hidden state factor ``f``, whose entries ``B[f][s, v, u]`` store the probability
+        of hidden state level ``s`` at the current time, given hidden state level ``v`` and action ``u`` at the previous time.
+    prev_obs: ``list``
+        List of observations over time. Each observation in the list can be an ``int``, a ``list`` of ints, a ``tuple`` of ints, a one-hot vector or an object array of one-hot vectors.
+    policies: ``list`` of 2D ``numpy.ndarray``
+        List that stores each policy in ``policies[p_idx]``. Shape of ``policies[p_idx]`` is ``(num_timesteps, num_factors)`` where `num_timesteps` is the temporal
+        depth of the policy and ``num_factors`` is the number of control factors.
+    prior: ``numpy.ndarray`` of dtype object, default ``None``
+        If provided, this a ``numpy.ndarray`` of dtype object, with one sub-array per hidden state factor, that stores the prior beliefs about initial states. 
+        If ``None``, this defaults to a flat (uninformative) prior over hidden states.
+    policy_sep_prior: ``Bool``, default ``True``
+        Flag determining whether the prior beliefs from the past are unconditioned on policy, or separated by /conditioned on the policy variable.
+    lh_cache: ``dict``, default ``None``
+        If provided, a rolling cache of the likelihoods of the observations in ``prev_obs``, as returned by ``update_likelihood_cache``.
+        Its likelihoods are used instead of re-computing them from ``prev_obs``.
+
+    Returns
+    ---------
+    qs_seq_pi: ``numpy.ndarray`` of dtype object
+        Posterior beliefs over hidden states for each policy. Nesting structure is policies, timepoints, factors,
+        where e.g. ``qs_seq_pi[p][t][f]`` stores the marginal belief about factor ``f`` at timepoint ``t`` under policy ``p``.
+    F: 1D ``numpy.ndarray``
+        Vector of variational free energies for each policy, i.e. the negative log evidence of the observations
+    """
+
+    num_obs, num_states, num_modalities, num_factors = utils.get_model_dimensions(A, B)
+
+    if lh_cache is not None:
+        lh_seq = lh_cache['lh_seq']
+    else:
+        prev_obs = utils.process_observation_seq(prev_obs, num_modalities, num_obs, as_indices=True)
+        lh_seq = get_joint_likelihood_seq_by_modality(A, prev_obs, num_states)
+
+    # likelihood of the states of each factor, given all the modalities that depend on it
+    lh_seq_by_factor = utils.obj_array(len(lh_seq))
+    for t, lh_t in enumerate(lh_seq):
+        lh_seq_by_factor[t] = utils.obj_array_ones(num_states)
+        for f in range(num_factors):
+            for m in mb_dict['A_modality_list'][f]:
+                lh_seq_by_factor[t][f] = lh_seq_by_factor[t][f] * lh_t[m]
+
+    if prev_actions is not None:
+        prev_actions = np.stack(prev_actions,0)
+
+    if prior is not None and not policy_sep_prior:
+        prior = utils.to_obj_array(prior)
+
+    return run_forward_backward(lh_seq_by_factor, B, policies, prev_actions=prev_actions, prior=prior)
+
+def update_likelihood_cache(lh_cache, A, obs, num_obs, num_states, A_factor_list, horizon):
+    """
+    Updates a rolling cache of the likelihoods of the last ``horizon`` observations with a new observation. Only the likelihood of the new observation
+    is computed and the likelihood of the oldest observation is evicted, so that the per-timestep cost does not grow with ``horizon``. If ``A`` is not the
+    array the cached likelihoods were computed with (e.g. after learning), the likelihoods of all cached observations are re-computed.
+
+    Parameters
+    ----------
+    lh_cache: ``dict`` or ``None``
+        The cache returned by the previous call, or ``None`` to start a new one
+    A: ``numpy.ndarray`` of dtype object
+        Sensory likelihood mapping or 'observation model', mapping from hidden states to observations
+    obs: ``int``, ``list`` or ``tuple`` of ints, or ``numpy.ndarray``
+        The new observation
+    num_obs: ``list`` of ``int``
+        List of dimensionalities of each observation modality
+    num_states: ``list`` of ``int``
+        List of dimensionalities of each hidden state factor
+    A_factor_list: ``list`` of ``list`` of ``int``
+        List of the hidden state factor indices that each modality depends on
+    horizon: ``int``
+        The number of most recent observations kept in the cache
+
+    Returns
+    ---------
+    lh_cache: ``dict``
+        The updated cache. ``lh_cache['lh_seq'][t]`` stores the likelihood of each modality given the ``t``-th cached observation, and ``lh_cache['joint_lh_seq'][t]``
+        the likelihoods combined across modalities (see ``algos.mmp.get_joint_likelihood_from_modalities``)
+    """
+
+    obs = utils.process_observation(obs, len(num_obs), num_obs, as_indices=True)
+
+    if lh_cache is None or lh_cache['A'] is not A:
+        obs_seq = ([] if lh_cache is None else lh_cache['obs_seq']) + [obs]
+        lh_seq = list(get_joint_likelihood_seq_by_modality(A, obs_seq, num_states))
+        joint_lh_seq = [get_joint_likelihood_from_modalities(lh, num_states, A_factor_list) for lh in lh_seq]
+    else:
+        obs_seq = lh_cache['obs_seq'] + [obs]
+        lh = get_joint_likelihood_seq_by_modality(A, [obs], num_states)[0]
+        lh_seq = lh_cache['lh_seq'] + [lh]
+        joint_lh_seq = lh_cache['joint_lh_seq'] + [get_joint_likelihood_from_modalities(lh, num_states, A_factor_list)]
+
+    return {
+        'A': A,
+        'obs_seq': obs_seq[-horizon:],
+        'lh_seq': lh_seq[-horizon:],
+        'joint_lh_seq': joint_lh_seq[-horizon:]
+    }
+
 def _update_posterior_states_full_test(
     A,
     B,
@@ -218,7 +359,7 @@ def _update_posterior_states_full_test(
 
     num_obs, num_states, num_modalities, num_factors = utils.get_model_dimensions(A, B)
 
-    prev_obs = utils.process_observation_seq(prev_obs, num_modalities, num_obs)
+    prev_obs = utils.process_observation_seq(prev_obs, num_modalities, num_obs, as_indices=True)
     
     lh_seq = get_joint_likelihood_seq(A, prev_obs, num_states)
 
@@ -314,7 +455,7 @@ def update_posterior_states(A, obs, prior=None, **kwargs):
 
     num_obs, num_states, num_modalities, _ = utils.get_model_dimensions(A = A)
     
-    obs = utils.process_observation(obs, num_modalities, num_obs)
+    obs = utils.process_observation(obs, num_modalities, num_obs, as_indices=True)
 
     if prior is not None:
         prior = utils.to_obj_array(prior)
@@ -363,9 +504,65 @@ def update_posterior_states_factorized(A, obs, num_obs, num_states, mb_dict, pri
     
     num_modalities = len(num_obs)
     
-    obs = utils.process_observation(obs, num_modalities, num_obs)
+    obs = utils.process_observation(obs, num_modalities, num_obs, as_indices=True)
 
     if prior is not None:
         prior = utils.to_obj_array(prior)
 
     return run_vanilla_fpi_factorized(A, obs, num_obs, num_states, mb_dict, prior, **kwargs)
+
+def update_posterior_states_filter(A, obs, num_obs, num_states, mb_dict, joint_prior):
+    """
+    Update the joint posterior over hidden states with an observation using exact Bayesian filtering, i.e. by multiplying the
+    joint prior (predicted with ``control.get_expected_joint_states``) with the likelihood of the observation. As the joint distribution
+    has ``prod(num_states)`` entries, this is meant for models with small joint state spaces.
+
+    Parameters
+    ----------
+    A: ``numpy.ndarray`` of dtype object
+        Sensory likelihood mapping or 'observation model', mapping from hidden states to observations. Each element ``A[m]`` of
+        stores an ``numpy.ndarray`` multidimensional array for observation modality ``m``, whose entries ``A[m][i, j, k, ...]`` store 
+        the probability of observation level ``i`` given hidden state levels ``j, k, ...``
+    obs: 1D ``numpy.ndarray``, ``numpy.ndarray`` of dtype object, int or tuple
+        The observation (generated by the environment). If single modality, this can be a 1D ``numpy.ndarray``
+        (one-hot vector representation) or an ``int`` (observation index)
+        If multi-modality, this can be ``numpy.ndarray`` of dtype object whose entries are 1D one-hot vectors,
+        or a tuple (of ``int``)
+    num_obs: ``list`` of ``int``
+        List of dimensionalities of each observation modality
+    num_states: ``list`` of ``int``
+        List of dimensionalities of each hidden state factor
+    mb_dict: ``Dict``
+        Dictionary with two keys (``A_factor_list`` and ``A_modality_list``), that stores the factor indices that influence each modality (``A_factor_list``)
+        and the modality indices influenced by each factor (``A_modality_list``).
+    joint_prior: ``numpy.ndarray``
+        Joint prior over hidden states, of shape ``num_states``
+
+    Returns
+    ----------
+    qs: ``numpy.ndarray`` of dtype object
+        Marginal posterior beliefs over hidden states at current timepoint
+    qs_joint: ``numpy.ndarray``
+        Joint posterior beliefs over hidden states at current timepoint, of shape ``num_states``
+    """
+
+    num_modalities = len(num_obs)
+    num_factors = len(num_states)
+
+    obs = utils.process_observation(obs, num_modalities, num_obs, as_indices=True)
+    obs = obs if isinstance(obs, list) else utils.to_obj_array(obs)
+
+    qs_joint = np.reshape(joint_prior, num_states)
+    for m, A_m in enumerate(A):
+        reshape_dims = num_factors*[1]
+        for f in mb_dict['A_factor_list'][m]:
+            reshape_dims[f] = num_states[f]
+        lh_m = dot_likelihood(A_m, obs[m]).reshape(A_m.shape[1:]).transpose(np.argsort(mb_dict['A_factor_list'][m])) # order the axes of the likelihood like the factors of `qs_joint`
+        qs_joint = qs_joint * lh_m.reshape(reshape_dims)
+    qs_joint = qs_joint / np.maximum(qs_joint.sum(), EPS_VAL)
+
+    qs = utils.obj_array(num_factors)
+    for f in range(num_factors):
+        qs[f] = qs_joint.sum(axis=tuple(i for i in range(num_factors) if i != f))
+
+    return qs, qs_joint
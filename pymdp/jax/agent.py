@@ -8,11 +8,14 @@ __author__: Conor Heins, Dimitrije Markovic, Alexander Tschantz, Daphne Demekas,
 """
 
 import math as pymath
+import numpy as np
+import jax
 import jax.numpy as jnp
 import jax.tree_util as jtu
 from jax import nn, vmap, random
+from jax.ops import segment_sum
 from . import inference, control, learning, utils, maths
-from equinox import Module, field, tree_at
+from equinox import Module, field, tree_at, filter_jit
 
 from typing import List, Optional
 from jaxtyping import Array
@@ -61,6 +64,7 @@ class Agent(Module):
     B_dependencies: Optional[List] = field(static=True)
     batch_size: int = field(static=True)
     num_iter: int = field(static=True)
+    fpi_tol: Optional[float] = field(static=True) # convergence tolerance of fixed point iteration (always runs `num_iter` iterations if None)
     num_obs: List[int] = field(static=True)
     num_modalities: int = field(static=True)
     num_states: List[int] = field(static=True)
@@ -69,7 +73,9 @@ class Agent(Module):
     control_fac_idx: Optional[List[int]] = field(static=True)
     policy_len: int = field(static=True) # depth of planning during roll-outs (i.e. number of timesteps to look ahead when computing expected free energy of policies)
     inductive_depth: int = field(static=True) # depth of inductive inference (i.e. number of future timesteps to use when computing inductive `I` matrix)
-    policies: Array = field(static=True)  # matrix of all possible policies (each row is a policy of shape (num_controls[0], num_controls[1], ..., num_controls[num_control_factors-1])
+    unique_multiaction_tuples: tuple = field(static=True) # the distinct first actions (multi-actions) of the policies, sorted and padded with -1 to the number of possible multi-actions
+    policy_multiaction_idx: tuple = field(static=True) # index of the first action of each policy in `unique_multiaction_tuples`
+    policy_tuples: tuple = field(static=True)  # all possible policies (each entry is a policy of shape (num_controls[0], num_controls[1], ..., num_controls[num_control_factors-1]), stored as nested tuples so that static fields are hashable and agents with the same policies share compiled functions
     use_utility: bool = field(static=True) # flag for whether to use expected utility ("reward" or "preference satisfaction") when computing expected free energy
     use_states_info_gain: bool = field(static=True) # flag for whether to use state information gain ("salience") when computing expected free energy
     use_param_info_gain: bool = field(static=True)  # flag for whether to use parameter information gain ("novelty") when computing expected free energy
@@ -78,6 +84,8 @@ class Agent(Module):
     action_selection: str = field(static=True) # determinstic or stochastic action selection 
     sampling_mode : str = field(static=True) # whether to sample from full posterior over policies ("full") or from marginal posterior over actions ("marginal")
     inference_algo: str = field(static=True) # fpi, vmp, mmp, ovf
+    policy_chunk_size: Optional[int] = field(static=True) # number of policies whose expected free energy is evaluated in parallel (all policies if None)
+    learning_chunk_size: Optional[int] = field(static=True) # number of timesteps whose Dirichlet counts are accumulated at once during learning (all timesteps if None)
 
     learn_A: bool = field(static=True)
     learn_B: bool = field(static=True)
@@ -117,11 +125,14 @@ class Agent(Module):
         sampling_mode="marginal",
         inference_algo="fpi",
         num_iter=16,
+        fpi_tol=None,
         learn_A=True,
         learn_B=True,
         learn_C=False,
         learn_D=True,
-        learn_E=False
+        learn_E=False,
+        policy_chunk_size=None,
+        learning_chunk_size=None
     ):
         ### PyTree leaves
         self.A = A
@@ -180,6 +191,7 @@ class Agent(Module):
 
         ### Static parameters ###
         self.num_iter = num_iter
+        self.fpi_tol = fpi_tol
         self.inference_algo = inference_algo
         self.inductive_depth = inductive_depth
 
@@ -191,6 +203,8 @@ class Agent(Module):
         self.use_states_info_gain = use_states_info_gain
         self.use_param_info_gain = use_param_info_gain
         self.use_inductive = use_inductive
+        self.policy_chunk_size = policy_chunk_size
+        self.learning_chunk_size = learning_chunk_size
 
         if self.use_inductive and self.H is not None:
             # print("Using inductive inference...")
@@ -228,10 +242,15 @@ class Agent(Module):
             for factor_idx in self.control_fac_idx:
                 assert self.num_controls[factor_idx] > 1, "Control factor (and B matrix) dimensions are not consistent with user-given control_fac_idx"
 
-        if policies is not None:
-            self.policies = policies
-        else:
-            self._construct_policies()
+        if policies is None:
+            policies = self._construct_policies()
+        self.policy_tuples = tuple(tuple(tuple(a) for a in policy) for policy in jnp.asarray(policies).tolist())
+
+        # map each policy to its first multi-action once, rather than matching policies against multi-actions on every call
+        unique_multiactions, policy_multiaction_idx = np.unique(np.asarray(policies)[:, 0], axis=0, return_inverse=True)
+        padding = -np.ones((pymath.prod(self.num_controls) - len(unique_multiactions), self.num_factors), dtype=unique_multiactions.dtype)
+        self.unique_multiaction_tuples = tuple(tuple(a) for a in np.concatenate([unique_multiactions, padding]).tolist())
+        self.policy_multiaction_idx = tuple(policy_multiaction_idx.reshape(-1).tolist())
         
         # set E to uniform/uninformative prior over policies if not given
         if E is None:
@@ -241,25 +260,38 @@ class Agent(Module):
 
     def _construct_policies(self):
         
-        self.policies =  control.construct_policies(
+        return control.construct_policies(
             self.num_states, self.num_controls, self.policy_len, self.control_fac_idx
         )
 
+    @property
+    def policies(self):
+        """ Matrix of all possible policies, with shape ``(num_policies, policy_len, num_factors)`` """
+        return jnp.array(self.policy_tuples, dtype=jnp.int32)
+
     @vmap
     def _construct_I(self):
         return control.generate_I_matrix(self.H, self.B, self.inductive_threshold, self.inductive_depth)
 
+    @property
+    def returns_num_iters(self):
+        """ Whether ``infer_states`` also returns the number of fixed point iterations run by each agent (see ``fpi_tol``) """
+        return self.fpi_tol is not None and self.inference_algo in ["fpi", "ovf"]
+
     @property
     def unique_multiactions(self):
-        size = pymath.prod(self.num_controls)
-        return jnp.unique(self.policies[:, 0], axis=0, size=size, fill_value=-1)
+        """ The distinct first actions of the policies, with shape ``(prod(num_controls), num_factors)`` (padded with -1) """
+        return jnp.array(self.unique_multiaction_tuples, dtype=jnp.int32)
 
     @vmap
     def learning(self, beliefs_A, outcomes, actions, beliefs_B=None, lr_pA=1., lr_pB=1., **kwargs):
         agent = self
         if self.learn_A:
-            o_vec_seq = jtu.tree_map(lambda o, dim: nn.one_hot(o, dim), outcomes, self.num_obs)
-            qA = learning.update_obs_likelihood_dirichlet(self.pA, o_vec_seq, beliefs_A, self.A_dependencies, lr=lr_pA)
+            if not self.onehot_obs:
+                o_vec_seq = jtu.tree_map(lambda o, dim: nn.one_hot(o, dim), outcomes, self.num_obs)
+            else:
+                o_vec_seq = outcomes
+            qA = learning.update_obs_likelihood_dirichlet(self.pA, o_vec_seq, beliefs_A, self.A_dependencies, lr=lr_pA, chunk_size=self.learning_chunk_size)
             E_qA = jtu.tree_map(lambda x: maths.dirichlet_expected_value(x), qA)
             agent = tree_at(lambda x: (x.A, x.pA), agent, (E_qA, qA))
             
@@ -268,7 +300,7 @@ class Agent(Module):
             actions_seq = [actions[..., i] for i in range(actions.shape[-1])] # as many elements as there are control factors, where each element is a jnp.ndarray of shape (n_timesteps, )
             assert beliefs_B[0].shape[0] == actions_seq[0].shape[0] + 1
             actions_onehot = jtu.tree_map(lambda a, dim: nn.one_hot(a, dim, axis=-1), actions_seq, self.num_controls)
-            qB = learning.update_state_likelihood_dirichlet(self.pB, beliefs_B, actions_onehot, self.B_dependencies, lr=lr_pB)
+            qB = learning.update_state_likelihood_dirichlet(self.pB, beliefs_B, actions_onehot, self.B_dependencies, lr=lr_pB, chunk_size=self.learning_chunk_size)
             E_qB = jtu.tree_map(lambda x: maths.dirichlet_expected_value(x), qB)
 
             # if you have updated your beliefs about transitions, you need to re-compute the I matrix used for inductive inferenece
@@ -299,7 +331,7 @@ class Agent(Module):
         return agent
     
     @vmap
-    def infer_states(self, observations, past_actions, empirical_prior, qs_hist, mask=None):
+    def infer_states(self, observations, past_actions, empirical_prior, qs_hist, mask=None, hist_mask=None):
         """
         Update approximate posterior over hidden states by solving variational inference problem, given an observation.
 
@@ -312,6 +344,10 @@ class Agent(Module):
         empirical_prior: ``list`` or ``tuple`` of ``jax.numpy.ndarray`` of dtype object
             Empirical prior beliefs over hidden states. Depending on the inference algorithm chosen, the resulting ``empirical_prior`` variable may be a matrix (or list of matrices) 
             of additional dimensions to encode extra conditioning variables like timepoint and policy.
+        hist_mask: ``jax.numpy.ndarray`` of dtype bool, optional
+            Mask of the filled entries of fixed-capacity history buffers (see ``inference.init_history_buffer``). If given, ``qs_hist`` (for ``fpi`` and ``ovf``)
+            or ``observations`` and ``past_actions`` (for ``vmp`` and ``mmp``) are buffers of fixed shape, so that this method does not need to be
+            re-compiled at every timestep.
         Returns
         ---------
         qs: ``numpy.ndarray`` of dtype object
@@ -320,6 +356,9 @@ class Agent(Module):
             For example, in case the ``self.inference_algo == 'MMP' `` indexing structure is policy->timepoint-->factor, so that 
             ``qs[p_idx][t_idx][f_idx]`` refers to beliefs about marginal factor ``f_idx`` expected under policy ``p_idx`` 
             at timepoint ``t_idx``.
+        num_iters: ``jax.numpy.ndarray``
+            Only returned if ``self.fpi_tol`` is set and ``self.inference_algo`` is ``fpi`` or ``ovf``: the number of fixed point iterations
+            that each agent ran before its posterior converged, e.g. to tune ``num_iter`` down.
         """
         if not self.onehot_obs:
             o_vec = [nn.one_hot(o, self.num_obs[m]) for m, o in enumerate(observations)]
@@ -342,7 +381,9 @@ class Agent(Module):
             A_dependencies=self.A_dependencies,
             B_dependencies=self.B_dependencies,
             num_iter=self.num_iter,
-            method=self.inference_algo
+            method=self.inference_algo,
+            hist_mask=hist_mask,
+            tol=self.fpi_tol
         )
 
         return output
@@ -391,7 +432,8 @@ class Agent(Module):
             use_utility=self.use_utility,
             use_states_info_gain=self.use_states_info_gain,
             use_param_info_gain=self.use_param_info_gain,
-            use_inductive=self.use_inductive
+            use_inductive=self.use_inductive,
+            policy_chunk_size=self.policy_chunk_size
         )
 
         return q_pi, G
@@ -418,11 +460,9 @@ class Agent(Module):
             marginals = jtu.tree_reduce(outer, marginals)
 
         elif self.sampling_mode == "full":
-            locs = jnp.all(
-                self.policies[:, 0] == jnp.expand_dims(self.unique_multiactions, -2),
-                  -1
+            marginals = segment_sum(
+                q_pi, jnp.array(self.policy_multiaction_idx, dtype=jnp.int32), num_segments=len(self.unique_multiaction_tuples)
             )
-            marginals = jnp.where(locs, q_pi, 0.).sum(-1)
 
         # assert jnp.isclose(jnp.sum(marginals), 1.)  # this fails inside scan           
         return marginals
@@ -450,6 +490,128 @@ class Agent(Module):
 
         return action
     
+    @filter_jit
+    def step(self, observations, past_actions, empirical_prior, qs_hist, rng_key=None, hist_mask=None):
+        """
+        Run one full perception-action cycle -- state inference, policy inference, action selection and computation of the
+        empirical prior for the next timestep -- as a single jit-compiled function, avoiding the dispatch overhead and host round-trips
+        of calling ``infer_states``, ``infer_policies``, ``sample_action`` and ``update_empirical_prior`` separately.
+
+        Parameters
+        ----------
+        observations: ``list`` of ``jax.numpy.ndarray``
+            The observation input (see ``infer_states``). Each entry ``observations[m]`` has shape ``(batch_size, T)`` (or ``(batch_size, T, num_obs[m])``
+            if ``self.onehot_obs`` is ``True``).
+        past_actions: ``jax.numpy.ndarray`` or ``None``
+            The actions taken up to the current timestep (see ``infer_states``)
+        empirical_prior: ``list`` of ``jax.numpy.ndarray``
+            Empirical prior beliefs over hidden states at the current timestep
+        qs_hist: ``list`` of ``jax.numpy.ndarray`` or ``None``
+            History of posterior beliefs over hidden states (see ``infer_states``)
+        rng_key: ``jax.random.PRNGKey``, default ``None``
+            Random key used for action sampling, split across the batch of agents. Required if ``self.action_selection == "stochastic"``.
+        hist_mask: ``jax.numpy.ndarray`` of dtype bool, optional
+            Mask of the filled entries of fixed-capacity history buffers (see ``infer_states``)
+
+        Returns
+        ----------
+        action: 2D ``jax.numpy.ndarray``
+            Indices of the selected actions for each agent and control factor, with shape ``(batch_size, num_factors)``
+        empirical_prior: ``list`` of ``jax.numpy.ndarray``
+            Empirical prior beliefs over hidden states at the next timestep
+        qs: ``list`` of ``jax.numpy.ndarray``
+            Posterior beliefs over hidden states
+        q_pi: 2D ``jax.numpy.ndarray``
+            Posterior beliefs over policies
+        """
+
+        qs = self.infer_states(observations, past_actions, empirical_prior, qs_hist, hist_mask=hist_mask)
+        if self.returns_num_iters:
+            qs, _ = qs
+        q_pi, _ = self.infer_policies(qs)
+
+        batch_keys = None if rng_key is None else random.split(rng_key, self.batch_size)
+        action = self.sample_action(q_pi, rng_key=batch_keys)
+
+        empirical_prior, qs = self.update_empirical_prior(action, qs)
+
+        return action, empirical_prior, qs, q_pi
+
+    def precompile(self, num_timesteps=1, history_len=None):
+        """
+        Ahead-of-time compile the methods of the perception-action cycle (``infer_states``, ``infer_policies``, ``sample_action``,
+        ``update_empirical_prior``, ``step`` and, if parameters are learned, ``learning``) for the batch size of this agent and the given history shapes,
+        using ``jax.jit(...).lower(...).compile()``. The shapes and dtypes of the arguments are taken from the arrays of this agent.
+        This does not configure JAX: to load the compiled executables from disk in a restarted process, enable JAX's persistent compilation cache
+        (e.g. ``jax.config.update("jax_compilation_cache_dir", ...)``) before the first compilation of the process.
+
+        Parameters
+        ----------
+        num_timesteps: ``int``, default 1
+            Number of timesteps of the observation (and action) sequences passed to ``infer_states``, and of the sequences used for ``learning``
+        history_len: ``int``, default ``None``
+            Capacity of the fixed-size history buffers passed to ``infer_states`` (see ``inference.init_history_buffer``). If ``None``, histories are not buffered.
+            For ``vmp`` and ``mmp``, this overrides ``num_timesteps`` for ``infer_states``.
+
+        Returns
+        ----------
+        compiled: ``dict`` of ``jax.stages.Compiled``
+            The compiled executables, keyed by method name. Each one takes this agent (or any agent with the same shapes and static fields)
+            as its first argument, followed by the positional arguments of the method, e.g. ``compiled["infer_policies"](agent, qs)`` or
+            ``compiled["infer_states"](agent, observations, past_actions, empirical_prior, qs_hist, hist_mask)``.
+        """
+
+        batch_size = self.batch_size
+        filtering = self.inference_algo in ["fpi", "ovf"]
+        T = history_len if (history_len is not None and not filtering) else num_timesteps
+        shape = jax.ShapeDtypeStruct
+
+        # observations are one-hot vectors in the dtype of `A`, or indices in the dtype of the actions (see `policies`)
+        obs_dtype, int_dtype, belief_dtype = self.A[0].dtype, self.policies.dtype, self.D[0].dtype
+        if self.onehot_obs:
+            obs_shape = lambda T, no: shape((batch_size, T, no), obs_dtype)
+        else:
+            obs_shape = lambda T, no: shape((batch_size, T), int_dtype)
+
+        observations = [obs_shape(T, no) for no in self.num_obs]
+        past_actions = None if filtering else shape((batch_size, T - 1, self.num_factors), int_dtype)
+        empirical_prior = [shape((batch_size, ns), belief_dtype) for ns in self.num_states]
+
+        hist_mask, qs_hist = None, None
+        if history_len is not None:
+            hist_mask = shape((batch_size, history_len), jnp.bool_)
+            if filtering:
+                qs_hist = [shape((batch_size, history_len, ns), belief_dtype) for ns in self.num_states]
+
+        rng_key = shape((2,), jnp.uint32) if self.action_selection == "stochastic" else None
+        batch_keys = shape((batch_size, 2), jnp.uint32) if self.action_selection == "stochastic" else None
+
+        functions = {
+            "infer_states": (lambda agent, o, a, p, h, m: agent.infer_states(o, a, p, h, hist_mask=m), (observations, past_actions, empirical_prior, qs_hist, hist_mask)),
+            "step": (lambda agent, o, a, p, h, k, m: agent.step(o, a, p, h, rng_key=k, hist_mask=m), (observations, past_actions, empirical_prior, qs_hist, rng_key, hist_mask)),
+        }
+
+        # shapes of the intermediate results of the perception-action cycle
+        qs = jax.eval_shape(functions["infer_states"][0], self, *functions["infer_states"][1])
+        if self.returns_num_iters:
+            qs, _ = qs
+        q_pi, _ = jax.eval_shape(lambda agent, qs: agent.infer_policies(qs), self, qs)
+        action = jax.eval_shape(lambda agent, q_pi, k: agent.sample_action(q_pi, rng_key=k), self, q_pi, batch_keys)
+
+        functions["infer_policies"] = (lambda agent, qs: agent.infer_policies(qs), (qs,))
+        functions["sample_action"] = (lambda agent, q_pi, k: agent.sample_action(q_pi, rng_key=k), (q_pi, batch_keys))
+        functions["update_empirical_prior"] = (lambda agent, a, qs: agent.update_empirical_prior(a, qs), (action, qs))
+
+        learn_A = self.learn_A and self.pA is not None
+        learn_B = self.learn_B and self.pB is not None
+        if (learn_A or learn_B) and (learn_A or not self.learn_A) and (learn_B or not self.learn_B):
+            beliefs = [shape((batch_size, num_timesteps, ns), belief_dtype) for ns in self.num_states]
+            outcomes = [obs_shape(num_timesteps, no) for no in self.num_obs]
+            actions = shape((batch_size, num_timesteps - 1, self.num_factors), int_dtype)
+            functions["learning"] = (lambda agent, b, o, a: agent.learning(b, o, a), (beliefs, outcomes, actions))
+
+        return {name: jax.jit(f).lower(self, *args).compile() for name, (f, args) in functions.items()}
+
     def _get_default_params(self):
         method = self.inference_algo
         default_params = None
@@ -92,6 +92,39 @@ def run_factorized_fpi(A, obs, prior, A_dependencies, num_iter=1):
     qs = jtu.tree_map(nn.softmax, res)
     return qs
 
+def run_factorized_fpi_adaptive(A, obs, prior, A_dependencies, num_iter=16, tol=1e-4):
+    """
+    Run the fixed point iteration algorithm with sparse dependencies between factors and outcomes (stored in `A_dependencies`),
+    stopping as soon as the largest absolute change of the posterior over any hidden state factor, between two iterations, falls
+    below `tol`, or after `num_iter` iterations. The loop runs in a `lax.while_loop`; when vmapped over a batch, the posterior
+    of each batch element stops being updated once it has converged, and the loop ends when all of them have converged.
+
+    Returns the posterior and the number of iterations that were run, e.g. to tune `num_iter` down.
+    """
+
+    log_likelihoods = compute_log_likelihood_per_modality(obs, A)
+    log_prior = jtu.tree_map(log_stable, prior)
+    log_q = jtu.tree_map(jnp.zeros_like, prior)
+
+    def cond_fn(carry):
+        _, delta, i = carry
+        return (i < num_iter) & (delta >= tol)
+
+    def body_fn(carry):
+        log_q, _, i = carry
+        q = jtu.tree_map(nn.softmax, log_q)
+        marginal_ll = all_marginal_log_likelihood(q, log_likelihoods, A_dependencies)
+        log_q = jtu.tree_map(add, marginal_ll, log_prior)
+
+        delta = jtu.tree_reduce(jnp.maximum, jtu.tree_map(lambda x, y: jnp.abs(nn.softmax(x) - y).max(), log_q, q))
+
+        return log_q, delta, i + 1
+
+    res, _, num_iters = lax.while_loop(cond_fn, body_fn, (log_q, jnp.array(jnp.inf), jnp.array(0)))
+
+    qs = jtu.tree_map(nn.softmax, res)
+    return qs, num_iters
+
 def mirror_gradient_descent_step(tau, ln_A, lnB_past, lnB_future, ln_qs):
     """
     u_{k+1} = u_{k} - \nabla_p F_k
@@ -103,7 +136,11 @@ def mirror_gradient_descent_step(tau, ln_A, lnB_past, lnB_future, ln_qs):
 
     return qs
 
-def update_marginals(get_messages, obs, A, B, prior, A_dependencies, B_dependencies, num_iter=1, tau=1.,):
+def first_valid_step(mask):
+    """ Mask of the first filled entry of a right-aligned history buffer, given the mask of its filled entries """
+    return mask & ~jnp.pad(mask[:-1], (1, 0))
+
+def update_marginals(get_messages, obs, A, B, prior, A_dependencies, B_dependencies, num_iter=1, tau=1., mask=None):
     """" Version of marginal update that uses a sparse dependency matrix for A """
 
     T = obs[0].shape[0]
@@ -119,6 +156,10 @@ def update_marginals(get_messages, obs, A, B, prior, A_dependencies, B_dependenc
     # mapping over time dimension of obs array
     log_likelihoods = vmap(get_log_likelihood, (0, None))(obs, A) # this gives a sequence of log-likelihoods (one for each `t`)
 
+    if mask is not None:
+        # entries of a history buffer that have not been filled yet carry no evidence
+        log_likelihoods = jtu.tree_map(lambda ll: jnp.where(mask.reshape((T,) + (1,) * (ll.ndim - 1)), ll, 0.), log_likelihoods)
+
     # log marginals -> $\ln(q(s_t))$ for all time steps and factors
     ln_qs = jtu.tree_map( lambda p: jnp.broadcast_to(jnp.zeros_like(p), (T,) + p.shape), prior)
 
@@ -133,7 +174,7 @@ def update_marginals(get_messages, obs, A, B, prior, A_dependencies, B_dependenc
         ln_qs = jtu.tree_map(log_stable, qs)
         # messages from future $m_+(s_t)$ and past $m_-(s_t)$ for all time steps and factors. For t = T we have that $m_+(s_T) = 0$
         
-        lnB_past, lnB_future = get_messages(ln_B, B, qs, ln_prior, B_dependencies)
+        lnB_past, lnB_future = get_messages(ln_B, B, qs, ln_prior, B_dependencies, mask=mask)
 
         mgds = jtu.Partial(mirror_gradient_descent_step, tau)
 
@@ -209,7 +250,7 @@ def update_variational_filtering(obs, A, B, prior, A_dependencies, **kwargs):
 
     return qs, ps, qss
 
-def get_vmp_messages(ln_B, B, qs, ln_prior, B_dependencies):
+def get_vmp_messages(ln_B, B, qs, ln_prior, B_dependencies, mask=None):
     
     num_factors = len(qs)
     factors = list(range(num_factors))
@@ -238,7 +279,11 @@ def get_vmp_messages(ln_B, B, qs, ln_prior, B_dependencies):
 
     def forward(ln_b, q, ln_prior):
         msg = vmap(lambda x, y: y @ x)(q[:-1], ln_b) # ln_b has shape (num_states, num_states) qs[:-1] has shape (T-1, num_states)
-        return jnp.concatenate([jnp.expand_dims(ln_prior, 0), msg], axis=0)
+        msg = jnp.concatenate([jnp.expand_dims(ln_prior, 0), msg], axis=0)
+        # in a history buffer, the prior is the message to the first filled entry
+        if mask is not None:
+            msg = jnp.where(first_valid_step(mask)[:, None], ln_prior, msg)
+        return msg
     
     def backward(ln_b, q):
         # q_i B_ij
@@ -254,9 +299,10 @@ def get_vmp_messages(ln_B, B, qs, ln_prior, B_dependencies):
     
     return lnB_future, lnB_past 
 
-def run_vmp(A, B, obs, prior, A_dependencies, B_dependencies, num_iter=1, tau=1.):
+def run_vmp(A, B, obs, prior, A_dependencies, B_dependencies, num_iter=1, tau=1., mask=None):
     '''
-    Run variational message passing (VMP) on a sequence of observations
+    Run variational message passing (VMP) on a sequence of observations. If `mask` is given, the sequence is a right-aligned
+    history buffer whose filled entries are given by `mask`, and the prior applies to the first filled entry.
     '''
 
     qs = update_marginals(
@@ -268,11 +314,12 @@ def run_vmp(A, B, obs, prior, A_dependencies, B_dependencies, num_iter=1, tau=1.
         A_dependencies, 
         B_dependencies, 
         num_iter=num_iter, 
-        tau=tau
+        tau=tau,
+        mask=mask
     )
     return qs
 
-def get_mmp_messages(ln_B, B, qs, ln_prior, B_deps):
+def get_mmp_messages(ln_B, B, qs, ln_prior, B_deps, mask=None):
     
     num_factors = len(qs)
     factors = list(range(num_factors))
@@ -286,6 +333,9 @@ def get_mmp_messages(ln_B, B, qs, ln_prior, B_deps):
         msg = log_stable(factor_dot_flex(b, xs, dims, keep_dims=(0, 1) ))
         # append log_prior as a first message 
         msg = jnp.concatenate([jnp.expand_dims(ln_prior, 0), msg], axis=0)
+        # in a history buffer, the prior is the message to the first filled entry
+        if mask is not None:
+            msg = jnp.where(first_valid_step(mask)[:, None], ln_prior, msg)
         # mutliply with 1/2 all but the last msg
         T = len(msg)
         if T > 1:
@@ -328,7 +378,11 @@ def get_mmp_messages(ln_B, B, qs, ln_prior, B_deps):
 
     return lnB_future, lnB_past
 
-def run_mmp(A, B, obs, prior, A_dependencies, B_dependencies, num_iter=1, tau=1.):
+def run_mmp(A, B, obs, prior, A_dependencies, B_dependencies, num_iter=1, tau=1., mask=None):
+    '''
+    Run marginal message passing (MMP) on a sequence of observations. If `mask` is given, the sequence is a right-aligned
+    history buffer whose filled entries are given by `mask`, and the prior applies to the first filled entry.
+    '''
     qs = update_marginals(
         get_mmp_messages, 
         obs, 
@@ -338,7 +392,8 @@ def run_mmp(A, B, obs, prior, A_dependencies, B_dependencies, num_iter=1, tau=1.
         A_dependencies, 
         B_dependencies, 
         num_iter=num_iter, 
-        tau=tau
+        tau=tau,
+        mask=mask
     )
     return qs
 
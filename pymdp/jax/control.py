@@ -11,6 +11,7 @@ from functools import partial
 from jax.scipy.special import xlogy
 from jax import lax, jit, vmap, nn
 from jax import random as jr
+from jax.ops import segment_sum
 from itertools import chain
 from jaxtyping import Array
 
@@ -41,8 +42,8 @@ def get_marginals(q_pi, policies, num_controls):
 
     action_marginals = []
     for factor_i in range(num_factors):
-        actions = jnp.arange(num_controls[factor_i])[:, None]
-        action_marginals.append(jnp.where(actions==policies[:, 0, factor_i], q_pi, 0).sum(-1))
+        # sum the probabilities of the policies by their first action, in a single pass over the policies
+        action_marginals.append(segment_sum(q_pi, policies[:, 0, factor_i], num_segments=num_controls[factor_i]))
     
     return action_marginals
 
@@ -355,7 +356,7 @@ def compute_G_policy_inductive(qs_init, A, B, C, pA, pB, A_dependencies, B_depen
     _, neg_G = final_state
     return neg_G
 
-def update_posterior_policies_inductive(policy_matrix, qs_init, A, B, C, E, pA, pB, A_dependencies, B_dependencies, I, gamma=16.0, inductive_epsilon=1e-3, use_utility=True, use_states_info_gain=True, use_param_info_gain=False, use_inductive=True):
+def update_posterior_policies_inductive(policy_matrix, qs_init, A, B, C, E, pA, pB, A_dependencies, B_dependencies, I, gamma=16.0, inductive_epsilon=1e-3, use_utility=True, use_states_info_gain=True, use_param_info_gain=False, use_inductive=True, policy_chunk_size=None):
     # policy --> n_levels_factor_f x 1
     # factor --> n_levels_factor_f x n_policies
     ## vmap across policies
@@ -366,11 +367,70 @@ def update_posterior_policies_inductive(policy_matrix, qs_init, A, B, C, E, pA,
     # in_axes_list = (1,) * n_factors
     # all_efe_of_policies = vmap(compute_G_policy, in_axes=(in_axes_list, 0))(qs_init_pi, policy_matrix)
 
+    if policy_chunk_size is not None:
+        return update_posterior_policies_chunked(compute_G_fixed_states, policy_matrix, E, gamma, policy_chunk_size)
+
     # policies needs to be an NDarray of shape (n_policies, n_timepoints, n_control_factors)
     neg_efe_all_policies = vmap(compute_G_fixed_states)(policy_matrix)
 
     return nn.softmax(gamma * neg_efe_all_policies + log_stable(E)), neg_efe_all_policies
 
+def update_posterior_policies_chunked(compute_G, policy_matrix, E, gamma, chunk_size):
+    """
+    Compute the posterior over policies by evaluating the negative expected free energy of policies in chunks of ``chunk_size`` policies,
+    sequentially with ``lax.scan``. Intermediate arrays are only materialised for one chunk of policies at a time, which bounds peak memory
+    at the cost of parallelism across chunks. The posterior is normalised with a running (online) log-sum-exp over chunks.
+
+    Parameters
+    ----------
+    compute_G: ``Callable``
+        Function that returns the negative expected free energy of a single policy
+    policy_matrix: ``jax.numpy.ndarray``
+        Policies, with shape ``(n_policies, n_timepoints, n_control_factors)``
+    E: ``jax.numpy.ndarray``
+        Prior over policies
+    gamma: ``float``
+        Prior precision over policies
+    chunk_size: ``int``
+        Number of policies evaluated in parallel
+
+    Returns
+    ----------
+    q_pi: ``jax.numpy.ndarray``
+        Posterior over policies
+    neg_efe: ``jax.numpy.ndarray``
+        Negative expected free energy of each policy
+    """
+
+    n_policies = policy_matrix.shape[0]
+    n_chunks = -(-n_policies // chunk_size)
+    n_pad = n_chunks * chunk_size - n_policies
+
+    # pad with copies of the first policy, which are excluded from the normaliser through a log prior of -inf
+    padding = jnp.broadcast_to(policy_matrix[:1], (n_pad,) + policy_matrix.shape[1:])
+    policy_chunks = jnp.concatenate([policy_matrix, padding]).reshape((n_chunks, chunk_size) + policy_matrix.shape[1:])
+    log_prior_chunks = jnp.pad(log_stable(E), (0, n_pad), constant_values=-jnp.inf).reshape(n_chunks, chunk_size)
+
+    def scan_fn(carry, chunk):
+        running_max, running_sum = carry
+        policies, log_prior = chunk
+
+        neg_efe = vmap(compute_G)(policies)
+        logits = gamma * neg_efe + log_prior
+
+        new_max = jnp.maximum(running_max, logits.max())
+        running_sum = running_sum * jnp.exp(running_max - new_max) + jnp.exp(logits - new_max).sum()
+
+        return (new_max, running_sum), neg_efe
+
+    init = (jnp.array(-jnp.inf), jnp.array(0.))
+    (logits_max, exp_sum), neg_efe = lax.scan(scan_fn, init, (policy_chunks, log_prior_chunks))
+
+    neg_efe = neg_efe.reshape(-1)[:n_policies]
+    log_norm = logits_max + jnp.log(exp_sum)
+
+    return jnp.exp(gamma * neg_efe + log_stable(E) - log_norm), neg_efe
+
 def generate_I_matrix(H: List[Array], B: List[Array], threshold: float, depth: int):
     """ 
     Generates the `I` matrices used in inductive planning. These matrices stores the probability of reaching the goal state backwards from state j (columns) after i (rows) steps.
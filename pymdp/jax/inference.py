@@ -3,9 +3,56 @@
 # pylint: disable=no-member
 
 import jax.numpy as jnp
-from .algos import run_factorized_fpi, run_mmp, run_vmp
+from .algos import run_factorized_fpi, run_factorized_fpi_adaptive, run_mmp, run_vmp
+from .control import compute_expected_state
 from jax import tree_util as jtu
 
+def init_history_buffer(x, capacity):
+    """
+    Preallocate a fixed-capacity history buffer for each leaf of the pytree `x`, with a new leading axis of size `capacity`.
+    Buffers are right-aligned: the latest entry is always stored at index -1 (see `push_history_buffer`).
+    The mask of filled entries can itself be kept in a buffer, e.g. `init_history_buffer(jnp.array(False), capacity)`.
+    """
+    return jtu.tree_map(lambda leaf: jnp.zeros((capacity,) + jnp.shape(leaf), dtype=jnp.result_type(leaf)), x)
+
+def push_history_buffer(buffer, x):
+    """
+    Write the pytree `x` as the latest entry of a history buffer created with `init_history_buffer`, dropping the oldest entry.
+    The shape of the buffer never changes, so jitted functions taking it as input are compiled only once.
+    """
+    return jtu.tree_map(lambda b, leaf: jnp.roll(b, -1, axis=0).at[-1].set(leaf), buffer, x)
+
+def update_window_prior(prior, qs, B, past_actions, hist_mask, B_dependencies):
+    """
+    Carry the prior over the first timestep of a sliding inference window (history buffers of `vmp` and `mmp`, see `init_history_buffer`)
+    forward in time. Once the window is full, its oldest timestep leaves it when the next observation is pushed, and the prior over the
+    new first timestep is the posterior over the leaving timestep, propagated through `B` with the action taken at that timestep.
+    Until then, the first timestep of the window does not change, and neither does `prior`. This keeps the per-step cost of smoothing
+    constant, while the beliefs about timesteps that left the window still inform the inference.
+
+    Parameters
+    ----------
+    prior: ``list`` of ``jnp.ndarray``
+        Prior over the first timestep of the current window
+    qs: ``list`` of ``jnp.ndarray``
+        Posterior over the timesteps of the current window, of shape ``(capacity, num_states[f])`` for each factor
+    B: ``list`` of ``jnp.ndarray``
+        Transition model
+    past_actions: ``jnp.ndarray``
+        Actions taken at the timesteps of the current window, including the latest one, of shape ``(capacity, num_factors)``
+    hist_mask: ``jnp.ndarray``
+        Mask of the filled entries of the window, of shape ``(capacity,)``
+    B_dependencies: ``list`` of ``list`` of ``int``
+        Hidden state factors that each factor depends on
+
+    Returns
+    ----------
+    prior: ``list`` of ``jnp.ndarray``
+        Prior over the first timestep of the window after the next observation is pushed
+    """
+    leaving = compute_expected_state([q[0] for q in qs], B, past_actions[0], B_dependencies=B_dependencies)
+    return jtu.tree_map(lambda x, y: jnp.where(hist_mask[0], x, y), leaving, prior)
+
 def update_posterior_states(
         A, 
         B, 
@@ -16,13 +63,26 @@ def update_posterior_states(
         A_dependencies=None, 
         B_dependencies=None, 
         num_iter=16, 
-        method='fpi'
+        method='fpi',
+        hist_mask=None,
+        tol=None
     ):
+    """
+    If `hist_mask` is given, histories are stored in fixed-capacity buffers (see `init_history_buffer`) and `hist_mask` is the
+    mask of their filled entries, including the current timestep. For `fpi` and `ovf`, `qs_hist` is then a buffer that the
+    new posterior is pushed into; for `vmp` and `mmp`, `obs` and `past_actions` are buffers of observations and actions.
+
+    If `tol` is given, `fpi` and `ovf` stop iterating once the posterior has converged (see `algos.run_factorized_fpi_adaptive`),
+    after at most `num_iter` iterations, and the number of iterations that were run is returned together with `qs_hist`.
+    """
 
     if method == 'fpi' or method == "ovf":
         # format obs to select only last observation
         curr_obs = jtu.tree_map(lambda x: x[-1], obs)
-        qs = run_factorized_fpi(A, curr_obs, prior, A_dependencies, num_iter=num_iter)
+        if tol is None:
+            qs = run_factorized_fpi(A, curr_obs, prior, A_dependencies, num_iter=num_iter)
+        else:
+            qs, num_iters = run_factorized_fpi_adaptive(A, curr_obs, prior, A_dependencies, num_iter=num_iter, tol=tol)
     else:
         # format B matrices using action sequences here
         # TODO: past_actions can be None
@@ -38,11 +98,13 @@ def update_posterior_states(
 
         # outputs of both VMP and MMP should be a list of hidden state factors, where each qs[f].shape = (T, batch_dim, num_states_f)
         if method == 'vmp':
-            qs = run_vmp(A, B, obs, prior, A_dependencies, B_dependencies, num_iter=num_iter) 
+            qs = run_vmp(A, B, obs, prior, A_dependencies, B_dependencies, num_iter=num_iter, mask=hist_mask) 
         if method == 'mmp':
-            qs = run_mmp(A, B, obs, prior, A_dependencies, B_dependencies, num_iter=num_iter)
+            qs = run_mmp(A, B, obs, prior, A_dependencies, B_dependencies, num_iter=num_iter, mask=hist_mask)
     
-    if qs_hist is not None:
+    if qs_hist is not None and hist_mask is not None and (method == 'fpi' or method == "ovf"):
+        qs_hist = push_history_buffer(qs_hist, qs)
+    elif qs_hist is not None:
         if method == 'fpi' or method == "ovf":
             qs_hist = jtu.tree_map(lambda x, y: jnp.concatenate([x, jnp.expand_dims(y, 0)], 0), qs_hist, qs)
         else:
@@ -53,6 +115,9 @@ def update_posterior_states(
             qs_hist = jtu.tree_map(lambda x: jnp.expand_dims(x, 0), qs)
         else:
             qs_hist = qs
+
+    if tol is not None and (method == 'fpi' or method == "ovf"):
+        return qs_hist, num_iters
     
     return qs_hist
     
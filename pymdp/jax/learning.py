@@ -3,12 +3,46 @@
 # pylint: disable=no-member
 
 import numpy as np
-from .maths import multidimensional_outer
+from .maths import time_summed_outer
 from jax.tree_util import tree_map
-from jax import vmap
+from jax import lax
 import jax.numpy as jnp
 
-def update_obs_likelihood_dirichlet_m(pA_m, obs_m, qs, dependencies_m, lr=1.0):
+def accumulate_counts(arrs, chunk_size=None):
+    """
+    Sum over time of the outer products of a list of sequences (e.g. observations and posteriors over hidden states), i.e. the
+    Dirichlet pseudo-counts accumulated over a trajectory. The time axis is contracted directly, without building the per-timestep outer products.
+
+    Parameters
+    ----------
+    arrs: ``list`` of ``jnp.ndarray``
+        Sequences of shape ``(T, d_i)``
+    chunk_size: ``int``, default ``None``
+        If given, the counts are accumulated in a ``lax.scan`` over chunks of ``chunk_size`` timesteps, so that only one chunk of each sequence
+        enters a contraction at a time (the last chunk is zero-padded, which does not change the counts).
+
+    Returns
+    ----------
+    counts: ``jnp.ndarray``
+        Array of shape ``(d_1, ..., d_n)``
+    """
+    T = arrs[0].shape[0]
+    if chunk_size is None or chunk_size >= T:
+        return time_summed_outer(arrs)
+
+    num_chunks = -(-T // chunk_size)
+    pad = num_chunks * chunk_size - T
+    chunks = [jnp.pad(x, ((0, pad), (0, 0))).reshape((num_chunks, chunk_size) + x.shape[1:]) for x in arrs]
+
+    def scan_fn(counts, chunk):
+        return counts + time_summed_outer(chunk), None
+
+    init = jnp.zeros(tuple(x.shape[-1] for x in arrs), dtype=jnp.result_type(*arrs))
+    counts, _ = lax.scan(scan_fn, init, chunks)
+
+    return counts
+
+def update_obs_likelihood_dirichlet_m(pA_m, obs_m, qs, dependencies_m, lr=1.0, chunk_size=None):
     """ JAX version of ``pymdp.learning.update_obs_likelihood_dirichlet_m`` """
     # pA_m - parameters of the dirichlet from the prior
     # pA_m.shape = (no_m x num_states[k] x num_states[j] x ... x num_states[n]) where (k, j, n) are indices of the hidden state factors that are parents of modality m
@@ -24,19 +58,19 @@ def update_obs_likelihood_dirichlet_m(pA_m, obs_m, qs, dependencies_m, lr=1.0):
 
     relevant_factors = tree_map(lambda f_idx: qs[f_idx], dependencies_m)
 
-    dfda = vmap(multidimensional_outer)([obs_m] + relevant_factors).sum(axis=0)
+    dfda = accumulate_counts([obs_m] + relevant_factors, chunk_size=chunk_size)
 
     return pA_m + lr * dfda
     
-def update_obs_likelihood_dirichlet(pA, obs, qs, A_dependencies, lr=1.0):
+def update_obs_likelihood_dirichlet(pA, obs, qs, A_dependencies, lr=1.0, chunk_size=None):
     """ JAX version of ``pymdp.learning.update_obs_likelihood_dirichlet`` """
 
-    update_A_fn = lambda pA_m, obs_m, dependencies_m: update_obs_likelihood_dirichlet_m(pA_m, obs_m, qs, dependencies_m, lr=lr)
+    update_A_fn = lambda pA_m, obs_m, dependencies_m: update_obs_likelihood_dirichlet_m(pA_m, obs_m, qs, dependencies_m, lr=lr, chunk_size=chunk_size)
     qA = tree_map(update_A_fn, pA, obs, A_dependencies)
 
     return qA
 
-def update_state_likelihood_dirichlet_f(pB_f, actions_f, current_qs, qs_seq, dependencies_f, lr=1.0):
+def update_state_likelihood_dirichlet_f(pB_f, actions_f, current_qs, qs_seq, dependencies_f, lr=1.0, chunk_size=None):
     """ JAX version of ``pymdp.learning.update_state_likelihood_dirichlet_f`` """
     # pB_f - parameters of the dirichlet from the prior
     # pB_f.shape = (num_states[f] x num_states[f] x num_actions[f]) where f is the index of the hidden state factor
@@ -51,14 +85,14 @@ def update_state_likelihood_dirichlet_f(pB_f, actions_f, current_qs, qs_seq, dep
     # \kappa is an optional learning rate
 
     past_qs = tree_map(lambda f_idx: qs_seq[f_idx][:-1], dependencies_f)
-    dfdb = vmap(multidimensional_outer)([current_qs[1:]] + past_qs + [actions_f]).sum(axis=0)
+    dfdb = accumulate_counts([current_qs[1:]] + past_qs + [actions_f], chunk_size=chunk_size)
     qB_f = pB_f + lr * dfdb
 
     return qB_f
 
-def update_state_likelihood_dirichlet(pB, beliefs, actions_onehot, B_dependencies, lr=1.0):
+def update_state_likelihood_dirichlet(pB, beliefs, actions_onehot, B_dependencies, lr=1.0, chunk_size=None):
 
-    update_B_f_fn = lambda pB_f, action_f, qs_f, dependencies_f: update_state_likelihood_dirichlet_f(pB_f, action_f, qs_f, beliefs, dependencies_f, lr=lr)    
+    update_B_f_fn = lambda pB_f, action_f, qs_f, dependencies_f: update_state_likelihood_dirichlet_f(pB_f, action_f, qs_f, beliefs, dependencies_f, lr=lr, chunk_size=chunk_size)
     qB = tree_map(update_B_f_fn, pB, actions_onehot, beliefs, B_dependencies)
 
     return qB
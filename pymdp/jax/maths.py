@@ -115,12 +115,23 @@ def multidimensional_outer(arrs):
 
     return x
 
+def time_summed_outer(arrs):
+    """ Compute the sum over time of the outer products of a list of arrays of shape (T, d_i), i.e. ``vmap(multidimensional_outer)(arrs).sum(0)``,
+    as a single contraction over the time axis that never builds the (T, d_1, ..., d_n) tensor of per-timestep outer products """
+
+    args = []
+    for i, x in enumerate(arrs):
+        args.extend([x, [0, i + 1]])
+    args.append(list(range(1, len(arrs) + 1)))
+
+    return contract(*args, backend='jax')
+
 def spm_wnorm(A):
     """ 
     Returns Expectation of logarithm of Dirichlet parameters over a set of 
     Categorical distributions, stored in the columns of A.
     """
-    A = jnp.clip(A, a_min=MINVAL)
+    A = jnp.clip(A, MINVAL)
     norm = 1. / A.sum(axis=0)
     avg = 1. / A
     wA = norm - avg
@@ -131,7 +142,7 @@ def dirichlet_expected_value(dir_arr):
     Returns Expectation of Dirichlet parameters over a set of 
     Categorical distributions, stored in the columns of A.
     """
-    dir_arr = jnp.clip(dir_arr, a_min=MINVAL)
+    dir_arr = jnp.clip(dir_arr, MINVAL)
     expected_val = jnp.divide(dir_arr, dir_arr.sum(axis=0, keepdims=True))
     return expected_val
 
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Data-parallel sharding of batches of agents and environments across devices
+
+Batched `Agent`s and `PyMDPEnv`s store one model per entry of the leading axis of their arrays. Placing these arrays on a device mesh,
+split along the leading axis, lets the jit-compiled methods (e.g. `Agent.step` or `task.rollout`) run each shard of the batch on its own
+device, without any change to the methods themselves. On a CPU host, multiple devices can be emulated by setting
+`XLA_FLAGS=--xla_force_host_platform_device_count=<n>` before importing jax.
+"""
+
+import numpy as np
+import jax
+import jax.tree_util as jtu
+from jax.sharding import Mesh, NamedSharding, PartitionSpec
+from equinox import is_array
+
+def make_batch_mesh(devices=None, axis_name="batch"):
+    """
+    Build a one-dimensional device mesh over which the batch axis is split.
+
+    Parameters
+    ----------
+    devices: ``list`` of ``jax.Device``, default ``None``
+        The devices of the mesh. If ``None``, all available devices are used.
+    axis_name: ``str``, default ``"batch"``
+        Name of the mesh axis
+
+    Returns
+    ----------
+    mesh: ``jax.sharding.Mesh``
+    """
+    devices = jax.devices() if devices is None else devices
+    return Mesh(np.array(devices), (axis_name,))
+
+def shard_batch(tree, batch_size, mesh=None, axis_name="batch"):
+    """
+    Place the array leaves of a pytree (e.g. a batched ``Agent`` or ``PyMDPEnv``) on a device mesh. Leaves whose leading axis has size
+    ``batch_size`` are split along it across the devices of the mesh, and all other leaves are replicated on every device.
+
+    Parameters
+    ----------
+    tree: pytree
+        The pytree to shard
+    batch_size: ``int``
+        Size of the batch axis. Must be a multiple of the number of devices of the mesh.
+    mesh: ``jax.sharding.Mesh``, default ``None``
+        Device mesh with an axis named ``axis_name``. If ``None``, a mesh over all available devices is used.
+    axis_name: ``str``, default ``"batch"``
+        Name of the mesh axis that the batch axis is split over
+
+    Returns
+    ----------
+    tree: pytree
+        The same pytree, with its array leaves placed on the mesh
+    """
+    mesh = make_batch_mesh(axis_name=axis_name) if mesh is None else mesh
+
+    num_devices = mesh.shape[axis_name]
+    if batch_size % num_devices != 0:
+        raise ValueError(f"The batch size ({batch_size}) must be a multiple of the number of devices ({num_devices})")
+
+    batched = NamedSharding(mesh, PartitionSpec(axis_name))
+    replicated = NamedSharding(mesh, PartitionSpec())
+
+    def place(x):
+        if not is_array(x):
+            return x
+        sharding = batched if (x.ndim > 0 and x.shape[0] == batch_size) else replicated
+        return jax.device_put(x, sharding)
+
+    return jtu.tree_map(place, tree)
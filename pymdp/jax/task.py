@@ -3,77 +3,190 @@ from typing import Optional, List, Dict
 from jaxtyping import Array, PRNGKeyArray
 from functools import partial
 
-from equinox import Module, field, tree_at
-from jax import vmap, random as jr, tree_util as jtu
+from equinox import Module, field, tree_at, filter_jit
+from jax import vmap, lax, random as jr, tree_util as jtu
 import jax.numpy as jnp
 
+from . import inference
+
 def select_probs(positions, matrix, dependency_list, actions=None):
     args = tuple(p for i, p in enumerate(positions) if i in dependency_list)
     args += () if actions is None else (actions,)
 
     return matrix[..., *args]
 
-def cat_sample(key, p):
-    a = jnp.arange(p.shape[-1])
-    if p.ndim > 1:
-        choice = lambda key, p: jr.choice(key, a, p=p)
-        keys = jr.split(key, len(p))
-        return vmap(choice)(keys, p)
-
-    return jr.choice(key, a, p=p)
+def cat_sample(key, logits):
+    # sample from categorical distributions parameterised by their log-probabilities along the last axis (batched over all leading axes)
+    return jr.categorical(key, logits, axis=-1)
 
 class PyMDPEnv(Module):
     params: Dict
-    states: List[List[Array]]
+    log_params: Dict # log-probabilities of `params`, precomputed once for sampling
+    state: List[Array] # current hidden state (one index per hidden state factor)
+    init_state: List[Array]
+    trajectory: Optional[List[Array]] # preallocated buffer of the hidden states visited since the last reset (one array per hidden state factor)
+    t: Optional[Array] # write index of `trajectory`
     dependencies: Dict = field(static=True)
 
     def __init__(
-        self, params: Dict, dependencies: Dict, init_state: List[Array] = None
+        self, params: Dict, dependencies: Dict, init_state: List[Array] = None, trajectory_len: Optional[int] = None
     ):
         self.params = params
+        self.log_params = jtu.tree_map(jnp.log, {k: params[k] for k in ["A", "B", "D"]})
         self.dependencies = dependencies
 
         if init_state is None:
             init_state = jtu.tree_map(lambda x: jnp.argmax(x, -1), self.params["D"])
 
-        self.states = [init_state]
+        self.init_state = init_state
+        self.state = init_state
+
+        # states visited after `trajectory_len` steps are not recorded
+        if trajectory_len is not None:
+            self.trajectory = jtu.tree_map(lambda s: jnp.zeros(s.shape + (trajectory_len,), dtype=s.dtype), init_state)
+            self.t = jnp.zeros(init_state[0].shape, dtype=jnp.int32)
+        else:
+            self.trajectory = None
+            self.t = None
 
     def reset(self, key: Optional[PRNGKeyArray] = None):
         if key is None:
-            states = [self.states[0]]
+            state = self.init_state
         else:
-            probs = self.params["D"]
-            keys = list(jr.split(key, len(probs)))
-            states = [jtu.tree_map(cat_sample, keys, probs)]
+            log_probs = self.log_params["D"]
+            keys = list(jr.split(key, len(log_probs)))
+            state = jtu.tree_map(cat_sample, keys, log_probs)
 
-        return tree_at(lambda x: x.states, self, states)
+        env = tree_at(lambda x: x.state, self, state)
+        if self.trajectory is not None:
+            env = tree_at(lambda x: (x.trajectory, x.t), env, (jtu.tree_map(jnp.zeros_like, self.trajectory), jnp.zeros_like(self.t)))
+
+        return env
 
     @vmap
     def step(self, key: PRNGKeyArray, actions: Optional[Array] = None):
-        # return a list of random observations and states
+        # return a list of random observations and the environment in its new state
         key_state, key_obs = jr.split(key)
-        states = self.states
         if actions is not None:
             actions = list(actions)
-            _select_probs = partial(select_probs, states[-1])
-            state_probs = jtu.tree_map(
-                _select_probs, self.params["B"], self.dependencies["B"], actions
+            _select_probs = partial(select_probs, self.state)
+            state_log_probs = jtu.tree_map(
+                _select_probs, self.log_params["B"], self.dependencies["B"], actions
             )
 
-            keys = list(jr.split(key_state, len(state_probs)))
-            new_states = jtu.tree_map(cat_sample, keys, state_probs)
+            keys = list(jr.split(key_state, len(state_log_probs)))
+            new_state = jtu.tree_map(cat_sample, keys, state_log_probs)
+        else:
+            new_state = self.state
 
-            states.append(new_states)
+        _select_probs = partial(select_probs, new_state)
+        obs_log_probs = jtu.tree_map(
+            _select_probs, self.log_params["A"], self.dependencies["A"]
+        )
 
+        keys = list(jr.split(key_obs, len(obs_log_probs)))
+        new_obs = jtu.tree_map(cat_sample, keys, obs_log_probs)
+
+        env = tree_at(lambda x: x.state, self, new_state)
+        if self.trajectory is not None:
+            trajectory = jtu.tree_map(lambda x, s: x.at[self.t].set(s, mode="drop"), self.trajectory, new_state)
+            env = tree_at(lambda x: (x.trajectory, x.t), env, (trajectory, self.t + 1))
+
+        return new_obs, env
+
+@filter_jit
+def rollout(agent, env: PyMDPEnv, num_timesteps: int, rng_key: PRNGKeyArray, history_len: Optional[int] = None):
+    """
+    Run an active inference loop between a batch of agents (``pymdp.jax.agent.Agent``) and a batch of environments (``PyMDPEnv``)
+    for ``num_timesteps`` timesteps. The loop runs inside ``jax.lax.scan``, so that the whole episode compiles to a single XLA program.
+
+    Parameters
+    ----------
+    agent: ``pymdp.jax.agent.Agent``
+        The (batched) agent
+    env: ``PyMDPEnv``
+        The (batched) environment, with the same batch size as ``agent``
+    num_timesteps: ``int``
+        Number of timesteps to run
+    rng_key: ``jax.random.PRNGKey``
+        Random key used for sampling observations, state transitions and actions
+    history_len: ``int``, default ``None``
+        Capacity of the fixed-size history buffers (see ``pymdp.jax.inference.init_history_buffer``) that store the last ``history_len`` posteriors
+        (for the ``fpi`` and ``ovf`` inference algorithms) or observations and actions (for ``vmp`` and ``mmp``). Required for ``vmp`` and ``mmp``, for which
+        it is the inference horizon: smoothing runs over a sliding window of the last ``history_len`` timesteps, whose prior over the first timestep
+        starts at ``agent.D`` and is carried forward from the beliefs leaving the window (see ``pymdp.jax.inference.update_window_prior``).
+
+    Returns
+    ----------
+    last: ``dict``
+        The final ``"empirical_prior"``, ``"env"`` and ``"observation"`` of the loop, and the history buffers under ``"history"`` if ``history_len`` is given
+    info: ``dict``
+        The ``"observation"``, ``"action"``, ``"qs"`` and ``"q_pi"`` of every timestep, stacked along a leading time axis
+    """
+
+    filtering = agent.inference_algo in ["fpi", "ovf"]
+    if not filtering and history_len is None:
+        raise ValueError("`history_len` must be given for the `vmp` and `mmp` inference algorithms")
+
+    batch_size = agent.batch_size
+    init_buffer = lambda x, capacity: vmap(lambda y: inference.init_history_buffer(y, capacity))(x)
+    push_buffer = vmap(inference.push_history_buffer)
+    update_window_prior = vmap(
+        lambda prior, qs, B, actions, mask: inference.update_window_prior(prior, qs, B, actions, mask, agent.B_dependencies)
+    )
+
+    def step_fn(carry, _):
+        empirical_prior, env, obs, history, rng_key = carry
+        rng_key, key_agent, key_env = jr.split(rng_key, 3)
+
+        past_actions, qs_hist, hist_mask = None, None, None
+        agent_obs = jtu.tree_map(lambda o: jnp.expand_dims(o, -1), obs)
+        if history is not None:
+            history = dict(history, mask=push_buffer(history["mask"], jnp.ones(batch_size, dtype=bool)))
+            hist_mask = history["mask"]
+            if filtering:
+                qs_hist = history["qs"]
+            else:
+                history = dict(history, obs=push_buffer(history["obs"], obs))
+                agent_obs, past_actions, empirical_prior = history["obs"], history["actions"], history["prior"]
+
+        action, empirical_prior, qs, q_pi = agent.step(
+            agent_obs, past_actions, empirical_prior, qs_hist, rng_key=key_agent, hist_mask=hist_mask
+        )
+
+        if history is not None:
+            if filtering:
+                history = dict(history, qs=qs)
+            else:
+                window_actions = jnp.concatenate([history["actions"], jnp.expand_dims(action, 1)], 1)
+                prior = update_window_prior(history["prior"], qs, agent.B, window_actions, history["mask"])
+                history = dict(history, prior=prior)
+                if history_len > 1:
+                    history = dict(history, actions=push_buffer(history["actions"], action))
+
+        next_obs, env = env.step(jr.split(key_env, batch_size), action)
+
+        info = {"observation": obs, "action": action, "qs": jtu.tree_map(lambda x: x[:, -1], qs), "q_pi": q_pi}
+
+        return (empirical_prior, env, next_obs, history, rng_key), info
+
+    rng_key, key_env = jr.split(rng_key)
+    obs, env = env.step(jr.split(key_env, batch_size))
+
+    history = None
+    if history_len is not None:
+        history = {"mask": jnp.zeros((batch_size, history_len), dtype=bool)}
+        if filtering:
+            history["qs"] = init_buffer(agent.D, history_len)
         else:
-            new_states = states[-1]
+            history["obs"] = init_buffer(obs, history_len)
+            history["actions"] = init_buffer(jnp.zeros((batch_size, agent.num_factors), dtype=jnp.int32), history_len - 1)
+            history["prior"] = agent.D
 
-        _select_probs = partial(select_probs, new_states)
-        obs_probs = jtu.tree_map(
-            _select_probs, self.params["A"], self.dependencies["A"]
-        )
+    (empirical_prior, env, obs, history, _), info = lax.scan(step_fn, (agent.D, env, obs, history, rng_key), None, length=num_timesteps)
 
-        keys = list(jr.split(key_obs, len(obs_probs)))
-        new_obs = jtu.tree_map(cat_sample, keys, obs_probs)
+    last = {"empirical_prior": empirical_prior, "env": env, "observation": obs}
+    if history is not None:
+        last["history"] = history
 
-        return new_obs, tree_at(lambda x: (x.states), self, states)
\ No newline at end of file
+    return last, info
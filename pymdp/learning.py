@@ -42,8 +42,8 @@ def update_obs_likelihood_dirichlet(pA, A, obs, qs, lr=1.0, modalities="all"):
     num_modalities = len(pA)
     num_observations = [pA[modality].shape[0] for modality in range(num_modalities)]
 
-    obs_processed = utils.process_observation(obs, num_modalities, num_observations)
-    obs = utils.to_obj_array(obs_processed)
+    obs_processed = utils.process_observation(obs, num_modalities, num_observations, as_indices=True)
+    obs = obs_processed if isinstance(obs_processed, list) else utils.to_obj_array(obs_processed)
 
     if modalities == "all":
         modalities = list(range(num_modalities))
@@ -51,9 +51,15 @@ def update_obs_likelihood_dirichlet(pA, A, obs, qs, lr=1.0, modalities="all"):
     qA = copy.deepcopy(pA)
         
     for modality in modalities:
-        dfda = maths.spm_cross(obs[modality], qs)
-        dfda = dfda * (A[modality] > 0).astype("float")
-        qA[modality] = qA[modality] + (lr * dfda)
+        if isinstance(obs, list):
+            # observation index: only the Dirichlet parameters of the observed outcome are updated
+            o = obs[modality]
+            dfda = maths.spm_cross(qs) * (A[modality][o] > 0).astype("float")
+            qA[modality][o] = qA[modality][o] + (lr * dfda)
+        else:
+            dfda = maths.spm_cross(obs[modality], qs)
+            dfda = dfda * (A[modality] > 0).astype("float")
+            qA[modality] = qA[modality] + (lr * dfda)
 
     return qA
 
@@ -95,8 +101,8 @@ def update_obs_likelihood_dirichlet_factorized(pA, A, obs, qs, A_factor_list, lr
     num_modalities = len(pA)
     num_observations = [pA[modality].shape[0] for modality in range(num_modalities)]
 
-    obs_processed = utils.process_observation(obs, num_modalities, num_observations)
-    obs = utils.to_obj_array(obs_processed)
+    obs_processed = utils.process_observation(obs, num_modalities, num_observations, as_indices=True)
+    obs = obs_processed if isinstance(obs_processed, list) else utils.to_obj_array(obs_processed)
 
     if modalities == "all":
         modalities = list(range(num_modalities))
@@ -104,9 +110,15 @@ def update_obs_likelihood_dirichlet_factorized(pA, A, obs, qs, A_factor_list, lr
     qA = copy.deepcopy(pA)
         
     for modality in modalities:
-        dfda = maths.spm_cross(obs[modality], qs[A_factor_list[modality]])
-        dfda = dfda * (A[modality] > 0).astype("float")
-        qA[modality] = qA[modality] + (lr * dfda)
+        if isinstance(obs, list):
+            # observation index: only the Dirichlet parameters of the observed outcome are updated
+            o = obs[modality]
+            dfda = maths.spm_cross(qs[A_factor_list[modality]]) * (A[modality][o] > 0).astype("float")
+            qA[modality][o] = qA[modality][o] + (lr * dfda)
+        else:
+            dfda = maths.spm_cross(obs[modality], qs[A_factor_list[modality]])
+            dfda = dfda * (A[modality] > 0).astype("float")
+            qA[modality] = qA[modality] + (lr * dfda)
 
     return qA
 
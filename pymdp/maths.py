@@ -238,11 +238,15 @@ def spm_cross(x, y=None, *args):
 
 def dot_likelihood(A,obs):
 
-    s = np.ones(np.ndim(A), dtype = int)
-    s[0] = obs.shape[0]
-    X = A * obs.reshape(tuple(s))
-    X = np.sum(X, axis=0, keepdims=True)
-    LL = np.squeeze(X)
+    if isinstance(obs, (int, np.integer)):
+        # observation index: the likelihood is the slice of `A` at the observed outcome
+        LL = np.squeeze(A[obs])
+    else:
+        s = np.ones(np.ndim(A), dtype = int)
+        s[0] = obs.shape[0]
+        X = A * obs.reshape(tuple(s))
+        X = np.sum(X, axis=0, keepdims=True)
+        LL = np.squeeze(X)
 
     # check to see if `LL` is a scalar
     if np.prod(LL.shape) <= 1.0:
@@ -257,7 +261,7 @@ def get_joint_likelihood(A, obs, num_states):
     if type(num_states) is int:
         num_states = [num_states]
     A = utils.to_obj_array(A)
-    obs = utils.to_obj_array(obs)
+    obs = obs if isinstance(obs, list) else utils.to_obj_array(obs) # observations given as a list of indices are used as is
     ll = np.ones(tuple(num_states))
     for modality in range(len(A)):
         ll = ll * dot_likelihood(A[modality], obs[modality])
@@ -280,7 +284,7 @@ def get_joint_likelihood_seq_by_modality(A, obs, num_states):
 
     for t, obs_t in enumerate(obs):
         likelihood = utils.obj_array(n_modalities)
-        obs_t_obj = utils.to_obj_array(obs_t)
+        obs_t_obj = obs_t if isinstance(obs_t, list) else utils.to_obj_array(obs_t)
         for (m, A_m) in enumerate(A):
             likelihood[m] = dot_likelihood(A_m, obs_t_obj[m])
         ll_seq[t] = likelihood
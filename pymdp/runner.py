@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Multiprocess runner of agent-environment episodes
+
+"""
+
+import os
+import time
+import queue as queue_module
+import traceback
+import multiprocessing
+
+import numpy as np
+
+from pymdp.trajectory import TrajectoryWriter, TrajectoryReader
+
+RECORD_FIELDS = ["episode", "t", "obs", "action", "q_pi", "G", "timings"]
+TIMING_NAMES = ["infer_states", "infer_policies", "sample_action"] # order of the entries of the "timings" field
+
+def run_episode(agent, env, num_timesteps, episode=0):
+    """
+    Run one episode of the perception-action loop between an ``Agent`` and an ``Env``, yielding one record per timestep, with the
+    observation, the action, the posterior over policies, the negative expected free energies of the policies, and the wall-clock time
+    spent in ``infer_states``, ``infer_policies`` and ``sample_action`` (in the order of ``TIMING_NAMES``).
+    """
+    obs = env.reset()
+    for t in range(num_timesteps):
+        start = time.perf_counter()
+        agent.infer_states(obs)
+        inferred_states = time.perf_counter()
+        q_pi, G = agent.infer_policies()
+        inferred_policies = time.perf_counter()
+        action = agent.sample_action()
+        sampled_action = time.perf_counter()
+
+        yield {
+            "episode": np.array(episode),
+            "t": np.array(t),
+            "obs": np.array(obs, dtype=int),
+            "action": np.array(action, dtype=int),
+            "q_pi": np.array(q_pi, dtype=float),
+            "G": np.array(G, dtype=float),
+            "timings": np.array([inferred_states - start, inferred_policies - inferred_states, sampled_action - inferred_policies])
+        }
+
+        obs = env.step(action)
+
+def _run_worker(agent_factory, env_factory, episodes, seeds, num_timesteps, queue):
+    """ Run the given episodes, each after seeding the global NumPy random state with its own seed, and put their records on `queue` """
+    try:
+        for episode, seed in zip(episodes, seeds):
+            np.random.seed(seed.generate_state(1)[0])
+            agent, env = agent_factory(), env_factory()
+            for record in run_episode(agent, env, num_timesteps, episode=episode):
+                queue.put(record)
+    except Exception:
+        queue.put(("error", traceback.format_exc()))
+    queue.put(None)
+
+def run_episodes(
+    agent_factory,
+    env_factory,
+    num_episodes,
+    num_timesteps,
+    directory,
+    num_workers=None,
+    seed=None,
+    queue_size=256,
+    segment_size=1024,
+    mp_context="spawn",
+    poll_interval=1.0
+):
+    """
+    Run ``num_episodes`` episodes of ``num_timesteps`` timesteps between agents and environments, distributed across a pool of worker processes,
+    and stream the per-step records of all episodes (see ``run_episode``) to a trajectory log in ``directory`` (see ``pymdp.trajectory``).
+
+    Records are sent back to the parent process through a bounded queue, so that workers block, rather than filling up memory, whenever
+    records are produced faster than they are written to disk. Each episode seeds the global NumPy random state (used by ``Agent`` and the
+    environments) with its own seed, spawned from ``seed``, before the agent and environment are created, so that the records of each episode
+    do not depend on the number of workers nor on the order in which episodes are run.
+
+    Parameters
+    ----------
+    agent_factory: callable
+        Function without arguments that returns a new ``Agent``. Must be picklable (e.g. defined at the top level of a module).
+    env_factory: callable
+        Function without arguments that returns a new ``Env``. Must be picklable.
+    num_episodes: ``int``
+        Number of episodes
+    num_timesteps: ``int``
+        Number of timesteps of each episode
+    directory: ``str``
+        Directory of the trajectory log
+    num_workers: ``int``, default ``None``
+        Number of worker processes. Defaults to the number of CPUs. If ``0``, the episodes are run in the calling process.
+    seed: ``int``, default ``None``
+        Seed from which the seeds of the episodes are spawned
+    queue_size: ``int``, default 256
+        Maximum number of records waiting to be written
+    segment_size: ``int``, default 1024
+        Number of records per segment of the trajectory log
+    mp_context: ``str``, default "spawn"
+        Start method of the worker processes
+    poll_interval: ``float``, default 1.0
+        Time (in seconds) to wait for a record before checking whether a worker process died without finishing its episodes
+
+    Returns
+    ----------
+    reader: ``pymdp.trajectory.TrajectoryReader``
+        Reader of the trajectory log, with the records of all episodes in the order in which they were written
+    """
+    num_workers = os.cpu_count() if num_workers is None else num_workers
+    seeds = np.random.SeedSequence(seed).spawn(num_episodes)
+    writer = TrajectoryWriter(directory, segment_size=segment_size)
+
+    if num_workers == 0:
+        for episode in range(num_episodes):
+            np.random.seed(seeds[episode].generate_state(1)[0])
+            for record in run_episode(agent_factory(), env_factory(), num_timesteps, episode=episode):
+                writer.append(record)
+        writer.close()
+        return TrajectoryReader(directory)
+
+    ctx = multiprocessing.get_context(mp_context)
+    queue = ctx.Queue(maxsize=queue_size)
+    workers = []
+    for w in range(min(num_workers, num_episodes)):
+        episodes = list(range(w, num_episodes, num_workers))
+        worker = ctx.Process(
+            target=_run_worker, args=(agent_factory, env_factory, episodes, [seeds[e] for e in episodes], num_timesteps, queue), daemon=True
+        )
+        worker.start()
+        workers.append(worker)
+
+    errors = []
+    num_finished = 0
+    try:
+        while num_finished < len(workers):
+            try:
+                record = queue.get(timeout=poll_interval)
+            except queue_module.Empty:
+                # a worker that was killed, or crashed in the interpreter, never sends its end-of-episodes sentinel
+                dead = [worker for worker in workers if not worker.is_alive() and worker.exitcode != 0]
+                if len(dead) > 0:
+                    raise RuntimeError(f"A worker process exited with code {dead[0].exitcode} before finishing its episodes")
+                continue
+            if record is None:
+                num_finished += 1
+            elif isinstance(record, tuple):
+                errors.append(record[1])
+            else:
+                writer.append(record)
+    finally:
+        # also stops workers blocked on a full queue if the parent fails, e.g. while writing a record
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+        writer.close()
+
+    if len(errors) > 0:
+        raise RuntimeError("Episodes failed in a worker process:\n" + errors[0])
+
+    return TrajectoryReader(directory)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Columnar trajectory logs
+
+A trajectory log is a directory with one column per recorded field (e.g. observations, actions, beliefs, posteriors over policies),
+where every record of a column has the same dtype and shape. Columns are written in segments of a fixed number of records, each
+segment of each column in its own ``.npy`` file, and ``index.json`` stores the dtype and shape of each column and the length of each segment.
+Segments can be memory-mapped, so that logs of millions of steps are read without loading them into memory.
+
+"""
+
+import os
+import json
+
+import numpy as np
+
+from pymdp import utils
+
+INDEX_FILE = "index.json"
+
+def _segment_path(directory, field, segment):
+    return os.path.join(directory, f"{field}.{segment:06d}.npy")
+
+class TrajectoryWriter(object):
+    """
+    Writer of a columnar trajectory log. Records are dictionaries with one array per field; the dtype and shape of each column are fixed by the
+    first record. Records are buffered in preallocated arrays of ``segment_size`` records per column, which are written to disk (and the index
+    updated) whenever they are full, and by ``close``.
+
+    >>> with TrajectoryWriter(directory) as writer:
+    >>>     for t in range(T):
+    >>>         ...
+    >>>         writer.append(agent_record(agent, obs, t=t))
+    """
+
+    def __init__(self, directory, segment_size=4096):
+        self.directory = directory
+        self.segment_size = segment_size
+        os.makedirs(directory, exist_ok=True)
+
+        self.fields = None
+        self.segment_lengths = []
+        self._buffers = None
+        self._num_buffered = 0
+
+    def append(self, record):
+        """
+        Append a record, i.e. a ``dict`` mapping each field to an array (or scalar) with the dtype and shape of that field's column
+        """
+        if self.fields is None:
+            self.fields = {field: {"dtype": np.asarray(x).dtype.str, "shape": list(np.shape(x))} for field, x in record.items()}
+            self._buffers = {
+                field: np.empty((self.segment_size,) + tuple(spec["shape"]), dtype=spec["dtype"]) for field, spec in self.fields.items()
+            }
+        elif record.keys() != self.fields.keys():
+            raise ValueError(f"Records must have the fields {list(self.fields)}, got {list(record)}")
+
+        for field, x in record.items():
+            if list(np.shape(x)) != self.fields[field]["shape"]:
+                raise ValueError(f"Field `{field}` must have shape {tuple(self.fields[field]['shape'])}, got {np.shape(x)}")
+            self._buffers[field][self._num_buffered] = x
+
+        self._num_buffered += 1
+        if self._num_buffered == self.segment_size:
+            self.flush()
+
+    def flush(self):
+        """ Write the buffered records as a new segment of each column, and update the index """
+        if self._num_buffered == 0:
+            return
+        segment = len(self.segment_lengths)
+        for field, buffer in self._buffers.items():
+            np.save(_segment_path(self.directory, field, segment), buffer[:self._num_buffered])
+        self.segment_lengths.append(self._num_buffered)
+        self._num_buffered = 0
+        self._write_index()
+
+    def close(self):
+        self.flush()
+
+    def _write_index(self):
+        # write to a temporary file first, so that readers never see a partially written index
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"fields": self.fields, "segments": self.segment_lengths}, f)
+        os.replace(path + ".tmp", path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class TrajectoryReader(object):
+    """
+    Reader of a columnar trajectory log written by ``TrajectoryWriter``. The segments of every column are memory-mapped (read-only), so that
+    ``segments`` and ``iter_segments`` give zero-copy access to the log, while ``reader[field]`` and ``read`` copy the requested records into memory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            index = json.load(f)
+        self.fields = index["fields"]
+        self.segment_lengths = index["segments"]
+        self._offsets = np.concatenate([[0], np.cumsum(self.segment_lengths)]).astype(int)
+
+        self._segments = {
+            field: [np.load(_segment_path(directory, field, s), mmap_mode="r") for s in range(len(self.segment_lengths))] for field in self.fields
+        }
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def segments(self, field):
+        """ Memory-mapped segments of the column of ``field`` """
+        return self._segments[field]
+
+    def iter_segments(self):
+        """ Iterate over the segments of the log, as ``dict`` s mapping each field to a memory-mapped segment of its column """
+        for s in range(len(self.segment_lengths)):
+            yield {field: segments[s] for field, segments in self._segments.items()}
+
+    def read(self, field, start=0, stop=None):
+        """ Read the records ``start`` to ``stop`` of the column of ``field`` into memory """
+        stop = len(self) if stop is None else min(stop, len(self))
+        first, last = np.searchsorted(self._offsets, [start, stop], side="right") - 1
+        parts = [
+            self._segments[field][s][max(start - self._offsets[s], 0):stop - self._offsets[s]] for s in range(first, min(last + 1, len(self.segment_lengths)))
+        ]
+        if len(parts) == 0:
+            return np.empty((0,) + tuple(self.fields[field]["shape"]), dtype=self.fields[field]["dtype"])
+        return np.concatenate(parts)
+
+    def __getitem__(self, field):
+        return self.read(field)
+
+def agent_record(agent, obs, t=None):
+    """
+    Record of the current step of an ``Agent`` (after ``infer_states``, ``infer_policies`` and ``sample_action``), in a fixed-width format for
+    ``TrajectoryWriter``: the observation ``"obs"`` and action ``"action"`` as integer indices, the posterior over each hidden state factor ``f``
+    as ``"qs_<f>"``, and the posterior over policies ``"q_pi"`` and negative expected free energies ``"G"`` of the policies.
+
+    Parameters
+    ----------
+    agent: ``pymdp.agent.Agent``
+        The agent, using the ``VANILLA`` or ``FILTER`` inference algorithm
+    obs: ``list`` of ``int``
+        The observation that the agent received at this step
+    t: ``int``, default ``None``
+        Timestep of the record. Defaults to the current timestep of the agent.
+
+    Returns
+    ----------
+    record: ``dict``
+        Mapping from field names to arrays
+    """
+    if agent.inference_algo not in ["VANILLA", "FILTER"]:
+        raise NotImplementedError("Trajectory records are only supported for the `VANILLA` and `FILTER` inference algorithms")
+
+    record = {
+        "t": np.array(agent.curr_timestep if t is None else t, dtype=np.int64),
+        "obs": np.array(obs, dtype=np.int64).reshape(-1),
+        "action": np.array(agent.action, dtype=np.int64),
+    }
+    for f, qs_f in enumerate(utils.to_obj_array(agent.qs)):
+        record[f"qs_{f}"] = np.asarray(qs_f, dtype=np.float64)
+    record["q_pi"] = np.asarray(agent.q_pi, dtype=np.float64)
+    record["G"] = np.asarray(agent.G, dtype=np.float64)
+
+    return record
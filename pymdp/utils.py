@@ -301,7 +301,7 @@ def obj_array_from_list(list_input):
         arr[i] = item
     return arr
 
-def process_observation_seq(obs_seq, n_modalities, n_observations):
+def process_observation_seq(obs_seq, n_modalities, n_observations, as_indices=False):
     """
     Helper function for formatting observations    
 
@@ -309,13 +309,14 @@ def process_observation_seq(obs_seq, n_modalities, n_observations):
         or `tuple` (obs for each modality), or `list` (obs for each modality)
         If list, the entries could be object arrays of one-hots, in which
         case this function returns `obs_seq` as is.
+        If `as_indices` is True, integer observations are kept as lists of indices (see `process_observation`)
     """
     proc_obs_seq = obj_array(len(obs_seq))
     for t, obs_t in enumerate(obs_seq):
-        proc_obs_seq[t] = process_observation(obs_t, n_modalities, n_observations)
+        proc_obs_seq[t] = process_observation(obs_t, n_modalities, n_observations, as_indices=as_indices)
     return proc_obs_seq
 
-def process_observation(obs, num_modalities, num_observations):
+def process_observation(obs, num_modalities, num_observations, as_indices=False):
     """
     Helper function for formatting observations    
     USAGE NOTES:
@@ -329,8 +330,13 @@ def process_observation(obs, num_modalities, num_observations):
     of one-hot vectors.
     - If `obs` is a tuple, same logic as applies for list (see above).
     - if `obs` is a numpy object array (array of arrays), this function will return `obs` unchanged.
+    - If `as_indices` is True and `obs` is an int, or a list or tuple of ints, this function will return a list of the observation indices 
+    (one per modality) instead of one-hot vectors. Functions that accept observations as indices use them to index the observed outcome directly.
     """
 
+    if as_indices and is_obs_indices(obs):
+        return [int(o) for o in obs] if isinstance(obs, (list, tuple)) else [int(obs)]
+
     if isinstance(obs, np.ndarray) and not is_obj_array(obs):
         assert num_modalities == 1, "If `obs` is a 1D numpy array, `num_modalities` must be equal to 1"
         assert len(np.where(obs)[0]) == 1, "If `obs` is a 1D numpy array, it must be a one hot vector (e.g. np.array([0.0, 1.0, 0.0, ....]))"
@@ -346,6 +352,14 @@ def process_observation(obs, num_modalities, num_observations):
 
     return obs
 
+def is_obs_indices(obs):
+    """
+    Whether `obs` is an observation given as indices, i.e. an int, or a list or tuple of ints (one per modality)
+    """
+    if isinstance(obs, (list, tuple)):
+        return all(isinstance(o, (int, np.integer)) for o in obs)
+    return isinstance(obs, (int, np.integer))
+
 def convert_observation_array(obs, num_obs):
     """
     Converts from SPM-style observation array to infer-actively one-hot object arrays.
@@ -201,6 +201,124 @@ class TestAgent(unittest.TestCase):
         self.assertEqual(len(agent.prev_obs), T)
         self.assertEqual(len(agent.prev_actions), T)
 
+    def test_mmp_likelihood_cache(self):
+        """
+        Tests that the rolling likelihood cache used by MMP inference stores the likelihoods of the observations within the inference horizon,
+        including after the ``A`` array of the agent has been replaced (e.g. by learning).
+        """
+
+        num_obs = [3, 2]
+        num_states = [4, 3]
+        num_controls = [1, 3]
+        A = utils.random_A_matrix(num_obs, num_states)
+        B = utils.random_B_matrix(num_states, num_controls)
+
+        inference_horizon = 3
+        agent = Agent(A=A, B=B, control_fac_idx=[1], inference_algo="MMP", policy_len=1, inference_horizon=inference_horizon)
+
+        T = 6
+        for t in range(T):
+
+            o = [np.random.randint(num_ob) for num_ob in num_obs]
+            qs_out = agent.infer_states(o)
+
+            latest_obs = agent.prev_obs[-inference_horizon:]
+            lh_seq_validation = maths.get_joint_likelihood_seq_by_modality(agent.A, utils.process_observation_seq(latest_obs, len(num_obs), num_obs), num_states)
+            self.assertEqual(len(agent.lh_cache['lh_seq']), min(t + 1, inference_horizon))
+            for lh_t_out, lh_t_validation in zip(agent.lh_cache['lh_seq'], lh_seq_validation):
+                for lh_m_out, lh_m_validation in zip(lh_t_out, lh_t_validation):
+                    self.assertTrue(np.allclose(lh_m_out, lh_m_validation))
+
+            latest_actions = agent.prev_actions[-(inference_horizon-1):] if (agent.prev_actions is not None and t >= inference_horizon) else agent.prev_actions
+            qs_validation, _ = inference.update_posterior_states_full_factorized(
+                agent.A, agent.mb_dict, agent.B, agent.B_factor_list, latest_obs, agent.policies, latest_actions, prior = agent.latest_belief, policy_sep_prior = False
+            )
+            for p_idx in range(len(agent.policies)):
+                for qs_t_out, qs_t_validation in zip(qs_out[p_idx], qs_validation[p_idx]):
+                    for qs_f_out, qs_f_validation in zip(qs_t_out, qs_t_validation):
+                        self.assertTrue(np.allclose(qs_f_out, qs_f_validation))
+
+            agent.infer_policies()
+            agent.sample_action()
+            if t == T // 2:
+                agent.A = utils.random_A_matrix(num_obs, num_states)
+
+    def test_forward_backward_active_inference(self):
+        """
+        Tests the whole active inference loop with exact (forward-backward) inference, and that this inference algorithm
+        can only be used with independent hidden state factors
+        """
+
+        num_obs = [3, 2]
+        num_states = [4, 3]
+        num_controls = [1, 3]
+        A_factor_list = [[0], [1]]
+        A = utils.random_A_matrix(num_obs, num_states, A_factor_list=A_factor_list)
+        B = utils.random_B_matrix(num_states, num_controls)
+
+        C = utils.obj_array_zeros(num_obs)
+        C[1][0] = 1.0  
+        C[1][1] = -2.0  
+
+        agent = Agent(A=A, B=B, C=C, A_factor_list=A_factor_list, control_fac_idx=[1], inference_algo="FB", policy_len=2, inference_horizon=3)
+
+        T = 10
+        for t in range(T):
+
+            o = [np.random.randint(num_ob) for num_ob in num_obs]
+            qs_out = agent.infer_states(o)
+            self.assertEqual(len(qs_out[0]), min(t + 1, agent.inference_horizon) + agent.policy_len)
+            agent.infer_policies()
+            agent.sample_action()
+
+        self.assertEqual(len(agent.prev_obs), T)
+        self.assertTrue(np.allclose(agent.F, agent.F[0]))
+
+        with self.assertRaises(ValueError):
+            Agent(A=utils.random_A_matrix(num_obs, num_states), B=B, inference_algo="FB")
+
+    def test_filter_active_inference(self):
+        """
+        Tests the whole active inference loop with exact filtering of the joint posterior over hidden states, and the fall back
+        to fixed point iteration when the joint state space is too large
+        """
+
+        num_obs = [3, 2]
+        num_states = [4, 3]
+        num_controls = [1, 3]
+        B_factor_list = [[0, 1], [1]]
+        A = utils.random_A_matrix(num_obs, num_states)
+        B = utils.random_B_matrix(num_states, num_controls, B_factor_list=B_factor_list)
+
+        agent = Agent(A=A, B=B, B_factor_list=B_factor_list, control_fac_idx=[1], inference_algo="FILTER")
+
+        T = 5
+        for t in range(T):
+
+            o = [np.random.randint(num_ob) for num_ob in num_obs]
+            qs_joint_prior = agent.qs_joint
+            qs_out = agent.infer_states(o)
+
+            if t == 0:
+                joint_prior = maths.spm_cross(agent.D)
+            else:
+                joint_prior = control.get_expected_joint_states(qs_joint_prior, B, B_factor_list, agent.action)
+            ll = maths.get_joint_likelihood(A, o, num_states)
+            qs_joint_validation = ll * joint_prior / (ll * joint_prior).sum()
+            self.assertTrue(np.allclose(agent.qs_joint, qs_joint_validation))
+            self.assertTrue(np.allclose(qs_out[0], qs_joint_validation.sum(axis=1)))
+
+            agent.infer_policies()
+            agent.sample_action()
+
+        agent = Agent(A=A, B=B, B_factor_list=B_factor_list, control_fac_idx=[1], inference_algo="FILTER", max_joint_states=10)
+        agent_vanilla = Agent(A=A, B=B, B_factor_list=B_factor_list, control_fac_idx=[1], inference_algo="VANILLA")
+        qs_out = agent.infer_states([0, 1])
+        qs_vanilla = agent_vanilla.infer_states([0, 1])
+        self.assertIsNone(agent.qs_joint)
+        for f in range(len(num_states)):
+            self.assertTrue(np.allclose(qs_out[f], qs_vanilla[f]))
+
     def test_agent_with_A_learning_vanilla(self):
         """ Unit test for updating prior Dirichlet parameters over likelihood model (pA) with the ``Agent`` class,
         in the case that you're using "vanilla" inference mode.
@@ -803,6 +921,187 @@ class TestAgent(unittest.TestCase):
             if t > 0:
                 agent.update_B(qs_prev = agent.qs_hist[-2]) # need to have `save_belief_hist=True` for this to work
 
+    def test_agent_with_receding_planner(self):
+        """
+        Test that an instance of the `Agent` class with the receding-horizon planner computes the same policy posterior as the full planner,
+        when all surviving plans are re-used, and that it runs an active inference loop when only some of the plans are re-used
+        """
+
+        num_obs = [5, 4]
+        num_states = [3, 2]
+        num_controls = [3, 2]
+
+        A = utils.random_A_matrix(num_obs, num_states)
+        B = utils.random_B_matrix(num_states, num_controls)
+
+        agent_test = Agent(A=A, B=B, policy_len=3, planner="receding")
+        agent_val = Agent(A=A, B=B, policy_len=3)
+
+        obs_seq = []
+        for t in range(5):
+            obs_seq.append([np.random.randint(obs_dim) for obs_dim in num_obs])
+
+        for t in range(5):
+            agent_test.infer_states(obs_seq[t])
+            agent_val.infer_states(obs_seq[t])
+
+            q_pi_out, G_out = agent_test.infer_policies()
+            q_pi_val, G_val = agent_val.infer_policies()
+            self.assertTrue(np.allclose(G_out, G_val))
+            self.assertTrue(np.allclose(q_pi_out, q_pi_val))
+
+            action = agent_val.sample_action()
+            agent_test.action = action
+            agent_test.step_time()
+
+        # with uninformative observations the posterior is the predicted belief, so the evaluations of the surviving policy suffixes are re-used
+        A_flat = utils.obj_array_uniform([[obs_dim] + num_states for obs_dim in num_obs])
+        pA = utils.dirichlet_like(A_flat)
+        agent = Agent(A=A_flat, B=B, pA=pA, policy_len=3, planner="receding")
+        for t in range(3):
+            agent.infer_states(obs_seq[t])
+            policy_tree_prev = agent.policy_tree
+            agent.infer_policies()
+            if t > 0:
+                action_key = tuple(int(a) for a in agent.action)
+                reused = [prefix for prefix, node in agent.policy_tree.items() if policy_tree_prev.get((action_key,) + prefix) is node]
+                self.assertEqual(len(reused), len([prefix for prefix in policy_tree_prev if prefix[0] == action_key and len(prefix) > 1]))
+                self.assertTrue(len(reused) > 0)
+            agent.sample_action()
+
+        # learning changes the model, so the previous plan is discarded
+        agent.update_A(obs_seq[3])
+        self.assertIsNone(agent.policy_tree)
+
+        agent = Agent(A=A, B=B, policy_len=3, planner="receding", num_reused_plans=1)
+        for t in range(5):
+            agent.infer_states(obs_seq[t])
+            q_pi, G = agent.infer_policies()
+            self.assertTrue(np.isclose(q_pi.sum(), 1.0))
+            agent.sample_action()
+
+        with self.assertRaises(NotImplementedError):
+            Agent(A=A, B=B, inference_algo="MMP", planner="receding")
+
+    def test_agent_with_beam_planner(self):
+        """
+        Test that an instance of the `Agent` class with the beam search planner can run an active inference loop with a deep planning horizon
+        """
+
+        num_obs = [5, 4]
+        num_states = [3, 2]
+        num_controls = [3, 2]
+
+        A = utils.random_A_matrix(num_obs, num_states)
+        B = utils.random_B_matrix(num_states, num_controls)
+        C = utils.obj_array_zeros(num_obs)
+        C[0][0] = 1.0
+
+        agent = Agent(A=A, B=B, C=C, policy_len=10, planner="beam", beam_width=5)
+
+        for t in range(3):
+            agent.infer_states([np.random.randint(obs_dim) for obs_dim in num_obs])
+            q_pi, G = agent.infer_policies()
+            self.assertEqual(len(q_pi), 5)
+            self.assertEqual(len(agent.policies), 5)
+            self.assertEqual(agent.policies[0].shape, (10, 2))
+            agent.sample_action()
+
+        with self.assertRaises(ValueError):
+            Agent(A=A, B=B, E=np.ones(6) / 6, planner="beam")
+
+    def test_agent_with_mcts_planner(self):
+        """
+        Test that an instance of the `Agent` class with the Monte Carlo tree search planner can run an active inference loop with a deep planning horizon
+        """
+
+        num_obs = [5, 4]
+        num_states = [3, 2]
+        num_controls = [3, 2]
+
+        A = utils.random_A_matrix(num_obs, num_states)
+        B = utils.random_B_matrix(num_states, num_controls)
+        C = utils.obj_array_zeros(num_obs)
+        C[0][0] = 1.0
+
+        agent = Agent(A=A, B=B, C=C, policy_len=10, planner="mcts", num_simulations=50)
+
+        for t in range(3):
+            agent.infer_states([np.random.randint(obs_dim) for obs_dim in num_obs])
+            q_pi, G = agent.infer_policies()
+            self.assertEqual(len(q_pi), len(agent.policies))
+            self.assertEqual(agent.policies[0].shape, (10, 2))
+            self.assertTrue(sum([stats[0] for prefix, stats in agent.search_tree.items() if len(prefix) == 1]) >= 50)
+            agent.sample_action()
+
+        with self.assertRaises(ValueError):
+            Agent(A=A, B=B, E=np.ones(6) / 6, planner="mcts")
+
+    def test_agent_infer_policies_deadline(self):
+        """
+        Test that `infer_policies` with a deadline masks out the policies that were not evaluated in time, and that it evaluates
+        every policy when the deadline is not reached
+        """
+
+        num_obs = [5, 4]
+        num_states = [3, 2]
+        num_controls = [3, 2]
+
+        A = utils.random_A_matrix(num_obs, num_states)
+        B = utils.random_B_matrix(num_states, num_controls)
+        C = utils.obj_array_zeros(num_obs)
+        C[0][0] = 1.0
+
+        agent = Agent(A=A, B=B, C=C, policy_len=2)
+        agent.infer_states([0, 0])
+
+        q_pi_val, G_val = agent.infer_policies()
+        self.assertTrue(agent.policies_evaluated.all())
+
+        q_pi, G = agent.infer_policies(deadline=60.)
+        self.assertTrue(agent.policies_evaluated.all())
+        self.assertTrue(np.allclose(q_pi, q_pi_val))
+
+        # the policy with the highest posterior probability at the previous call is evaluated first
+        q_pi, G = agent.infer_policies(deadline=0.)
+        self.assertEqual(agent.policies_evaluated.sum(), 1)
+        self.assertTrue(agent.policies_evaluated[np.argmax(q_pi_val)])
+        self.assertTrue((q_pi[~agent.policies_evaluated] == 0.).all())
+        agent.sample_action()
+
+        agent = Agent(A=A, B=B, C=C, policy_len=2, planner="beam")
+        agent.infer_states([0, 0])
+        with self.assertRaises(NotImplementedError):
+            agent.infer_policies(deadline=0.)
+
+    def test_agent_policy_pruning(self):
+        """
+        Test that an instance of the `Agent` class prunes policies with low prior probability and reports the number of pruned policies
+        """
+
+        num_obs = [5, 4]
+        num_states = [3, 2]
+        num_controls = [3, 2]
+
+        A = utils.random_A_matrix(num_obs, num_states)
+        B = utils.random_B_matrix(num_states, num_controls)
+        C = utils.obj_array_zeros(num_obs)
+        C[0][0] = 1.0
+
+        E = utils.norm_dist(np.random.rand(36))
+
+        agent = Agent(A=A, B=B, C=C, E=E, policy_len=2, policy_prune_top_k=5)
+        agent.infer_states([0, 0])
+        q_pi, G = agent.infer_policies()
+
+        self.assertEqual(agent.num_pruned_policies, 31)
+        self.assertTrue((q_pi[agent.policies_pruned] == 0.).all())
+        self.assertFalse(agent.policies_pruned[np.argsort(-E)[:5]].any())
+        agent.sample_action()
+
+        with self.assertRaises(NotImplementedError):
+            Agent(A=A, B=B, C=C, E=E, policy_len=2, policy_prune_top_k=5, inference_algo="MMP")
+
 
         
 
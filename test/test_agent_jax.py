@@ -15,6 +15,10 @@ import jax.tree_util as jtu
 
 from pymdp.jax.maths import compute_log_likelihood_single_modality
 from pymdp.jax.utils import norm_dist
+from pymdp.jax.agent import Agent
+from pymdp.jax import control
+from pymdp.jax.task import PyMDPEnv, rollout
+from pymdp.utils import random_A_matrix, random_B_matrix
 from equinox import Module
 from typing import Any, List
 
@@ -58,6 +62,278 @@ class TestAgentJax(unittest.TestCase):
             validation_qs = nn.softmax(compute_log_likelihood_single_modality(all_obs[id_to_check], all_A[id_to_check]))
             self.assertTrue(jnp.allclose(validation_qs, all_qs[id_to_check]))
 
+    def test_agent_step(self):
+        """
+        Test that the fused `step` method of the agent gives the same result as calling each method of the perception-action cycle separately
+        """
+
+        batch_size = 3
+        num_obs = [3, 4]
+        num_states = [3, 2]
+        num_controls = [2, 2]
+
+        A = [jnp.broadcast_to(a, (batch_size,) + a.shape) for a in random_A_matrix(num_obs, num_states)]
+        B = [jnp.broadcast_to(b, (batch_size,) + b.shape) for b in random_B_matrix(num_states, num_controls)]
+        C = [jnp.zeros((batch_size, no)) for no in num_obs]
+        D = [jnp.ones((batch_size, ns)) / ns for ns in num_states]
+
+        agent = Agent(A, B, C, D, None, None, None, policy_len=2)
+
+        obs = [random.randint(random.PRNGKey(m), (batch_size, 1), 0, no) for m, no in enumerate(num_obs)]
+
+        action, empirical_prior, qs, q_pi = agent.step(obs, None, agent.D, None)
+
+        qs_val = agent.infer_states(obs, None, agent.D, None)
+        q_pi_val, _ = agent.infer_policies(qs_val)
+        action_val = agent.sample_action(q_pi_val)
+        empirical_prior_val, _ = agent.update_empirical_prior(action_val, qs_val)
+
+        self.assertTrue(jnp.allclose(q_pi, q_pi_val))
+        self.assertTrue((action == action_val).all())
+
+        # evaluating policies in chunks does not change the posterior over policies
+        chunked_agent = Agent(A, B, C, D, None, None, None, policy_len=2, policy_chunk_size=5)
+        q_pi_chunked, _ = chunked_agent.infer_policies(qs_val)
+        self.assertTrue(jnp.allclose(q_pi_chunked, q_pi_val, atol=1e-5))
+        for f in range(len(num_states)):
+            self.assertTrue(jnp.allclose(qs[f], qs_val[f]))
+            self.assertTrue(jnp.allclose(empirical_prior[f], empirical_prior_val[f]))
+
+    def test_agent_infer_states_num_iters(self):
+        """
+        Test that an agent with a fixed point iteration tolerance returns the number of iterations each agent ran, and
+        that stopping early gives the same posterior as running all iterations
+        """
+
+        batch_size = 3
+        num_obs = [3, 4]
+        num_states = [3, 2]
+        num_controls = [2, 2]
+
+        A = [jnp.broadcast_to(a, (batch_size,) + a.shape) for a in random_A_matrix(num_obs, num_states)]
+        B = [jnp.broadcast_to(b, (batch_size,) + b.shape) for b in random_B_matrix(num_states, num_controls)]
+        C = [jnp.zeros((batch_size, no)) for no in num_obs]
+        D = [jnp.ones((batch_size, ns)) / ns for ns in num_states]
+
+        agent = Agent(A, B, C, D, None, None, None, num_iter=100, fpi_tol=1e-5)
+        agent_val = Agent(A, B, C, D, None, None, None, num_iter=100)
+
+        obs = [random.randint(random.PRNGKey(m), (batch_size, 1), 0, no) for m, no in enumerate(num_obs)]
+
+        qs, num_iters = agent.infer_states(obs, None, agent.D, None)
+        qs_val = agent_val.infer_states(obs, None, agent_val.D, None)
+
+        self.assertEqual(num_iters.shape, (batch_size,))
+        self.assertTrue((num_iters < 100).all())
+        for f in range(len(num_states)):
+            self.assertTrue(jnp.allclose(qs[f], qs_val[f], atol=1e-4))
+
+        action, _, qs_step, _ = agent.step(obs, None, agent.D, None)
+        for f in range(len(num_states)):
+            self.assertTrue(jnp.allclose(qs_step[f], qs[f]))
+
+    def test_agent_learning_chunks(self):
+        """
+        Test that accumulating the Dirichlet counts of an agent over chunks of timesteps (``learning_chunk_size``) gives the same
+        posterior parameters as accumulating them over the whole sequence at once
+        """
+
+        batch_size = 2
+        num_obs = [3, 4]
+        num_states = [3, 2]
+        num_controls = [2, 2]
+        T = 7
+
+        A = [jnp.broadcast_to(a, (batch_size,) + a.shape) for a in random_A_matrix(num_obs, num_states)]
+        B = [jnp.broadcast_to(b, (batch_size,) + b.shape) for b in random_B_matrix(num_states, num_controls)]
+        C = [jnp.zeros((batch_size, no)) for no in num_obs]
+        D = [jnp.ones((batch_size, ns)) / ns for ns in num_states]
+        pA = [jnp.ones_like(a) for a in A]
+        pB = [jnp.ones_like(b) for b in B]
+
+        outcomes = [random.randint(random.PRNGKey(m), (batch_size, T), 0, no) for m, no in enumerate(num_obs)]
+        beliefs = [nn.softmax(random.normal(random.PRNGKey(f), (batch_size, T, ns)), -1) for f, ns in enumerate(num_states)]
+        actions = jnp.stack([random.randint(random.PRNGKey(10 + f), (batch_size, T - 1), 0, nc) for f, nc in enumerate(num_controls)], -1)
+
+        agent = Agent(A, B, C, D, None, pA, pB)
+        learned_val = agent.learning(beliefs, outcomes, actions)
+        for chunk_size in [1, 3]:
+            chunked_agent = Agent(A, B, C, D, None, pA, pB, learning_chunk_size=chunk_size)
+            learned = chunked_agent.learning(beliefs, outcomes, actions)
+            for m in range(len(num_obs)):
+                self.assertTrue(jnp.allclose(learned.pA[m], learned_val.pA[m], atol=1e-5))
+            for f in range(len(num_states)):
+                self.assertTrue(jnp.allclose(learned.pB[f], learned_val.pB[f], atol=1e-5))
+
+    def test_precompile(self):
+        """
+        Test that the ahead-of-time compiled methods of the agent give the same results as the methods themselves, including
+        the learning of an agent with one-hot observations
+        """
+
+        batch_size = 3
+        num_obs = [3, 4]
+        num_states = [3, 2]
+        num_controls = [2, 2]
+
+        A = [jnp.broadcast_to(a, (batch_size,) + a.shape) for a in random_A_matrix(num_obs, num_states)]
+        B = [jnp.broadcast_to(b, (batch_size,) + b.shape) for b in random_B_matrix(num_states, num_controls)]
+        C = [jnp.zeros((batch_size, no)) for no in num_obs]
+        D = [jnp.ones((batch_size, ns)) / ns for ns in num_states]
+
+        agent = Agent(A, B, C, D, None, None, None, policy_len=2)
+
+        compiled = agent.precompile()
+        self.assertEqual(set(compiled), {"infer_states", "infer_policies", "sample_action", "update_empirical_prior", "step"})
+
+        obs = [random.randint(random.PRNGKey(m), (batch_size, 1), 0, no) for m, no in enumerate(num_obs)]
+
+        action, empirical_prior, qs, q_pi = compiled["step"](agent, obs, None, agent.D, None, None, None)
+        qs_val = agent.infer_states(obs, None, agent.D, None)
+        q_pi_val, _ = agent.infer_policies(qs_val)
+
+        self.assertTrue(jnp.allclose(compiled["infer_policies"](agent, qs_val)[0], q_pi_val))
+        self.assertTrue(jnp.allclose(q_pi, q_pi_val))
+        self.assertTrue((action == agent.sample_action(q_pi_val)).all())
+        for f in range(len(num_states)):
+            self.assertTrue(jnp.allclose(qs[f], qs_val[f]))
+
+        # the executables compiled for one agent can be called with any agent that has the same shapes
+        other_agent = Agent(A, B, [c + 1. for c in C], D, None, None, None, policy_len=2)
+        q_pi_other, _ = compiled["infer_policies"](other_agent, qs_val)
+        self.assertTrue(jnp.allclose(q_pi_other, other_agent.infer_policies(qs_val)[0]))
+
+        # with one-hot observations, the outcomes used for learning are one-hot vectors as well
+        pA = [jnp.ones_like(a) for a in A]
+        onehot_agent = Agent(A, B, C, D, None, pA, None, policy_len=2, onehot_obs=True, learn_B=False)
+        compiled = onehot_agent.precompile(num_timesteps=2)
+        self.assertIn("learning", compiled)
+
+        outcomes = [nn.one_hot(random.randint(random.PRNGKey(m), (batch_size, 2), 0, no), no) for m, no in enumerate(num_obs)]
+        beliefs = [jnp.ones((batch_size, 2, ns)) / ns for ns in num_states]
+        actions = jnp.zeros((batch_size, 1, len(num_states)), dtype=jnp.int32)
+        learned = compiled["learning"](onehot_agent, beliefs, outcomes, actions)
+        learned_val = onehot_agent.learning(beliefs, outcomes, actions)
+        for m in range(len(num_obs)):
+            self.assertTrue(jnp.allclose(learned.pA[m], learned_val.pA[m]))
+
+    def test_multiaction_probabilities(self):
+        """
+        Test that the marginal and joint probabilities of the first actions of the policies match the sums of the probabilities
+        of the policies that start with each action
+        """
+
+        batch_size = 2
+        num_obs = [3, 4]
+        num_states = [3, 2]
+        num_controls = [3, 2]
+
+        A = [jnp.broadcast_to(a, (batch_size,) + a.shape) for a in random_A_matrix(num_obs, num_states)]
+        B = [jnp.broadcast_to(b, (batch_size,) + b.shape) for b in random_B_matrix(num_states, num_controls)]
+        C = [jnp.zeros((batch_size, no)) for no in num_obs]
+        D = [jnp.ones((batch_size, ns)) / ns for ns in num_states]
+
+        # a subset of the possible policies, whose first actions do not cover all multi-actions
+        policies = jnp.array([[[2, 1], [0, 0]], [[0, 0], [1, 1]], [[2, 1], [1, 0]], [[1, 0], [0, 1]], [[0, 0], [2, 0]]])
+        q_pi = nn.softmax(random.normal(random.PRNGKey(0), (batch_size, len(policies))), -1)
+
+        agent = Agent(A, B, C, D, None, None, None, policies=policies, sampling_mode="full")
+
+        unique_multiactions = agent.unique_multiactions
+        self.assertEqual(unique_multiactions.shape, (6, 2))
+        self.assertTrue((unique_multiactions[:3] == jnp.array([[0, 0], [1, 0], [2, 1]])).all())
+        self.assertTrue((unique_multiactions[3:] == -1).all())
+
+        probs = agent.multiaction_probabilities(q_pi)
+        for i, multiaction in enumerate(unique_multiactions[:3]):
+            expected = jnp.where((policies[:, 0] == multiaction).all(-1), q_pi, 0.).sum(-1)
+            self.assertTrue(jnp.allclose(probs[:, i], expected))
+        self.assertTrue(jnp.allclose(probs[:, 3:], 0.))
+
+        agent = Agent(A, B, C, D, None, None, None, policies=policies, sampling_mode="marginal")
+        probs = agent.multiaction_probabilities(q_pi).reshape((batch_size,) + tuple(num_controls))
+        for f, nc in enumerate(num_controls):
+            marginals = control.get_marginals(q_pi[0], policies, num_controls)[f]
+            expected = jnp.where(jnp.arange(nc)[:, None] == policies[:, 0, f], q_pi[0], 0.).sum(-1)
+            self.assertTrue(jnp.allclose(marginals, expected))
+            self.assertTrue(jnp.allclose(probs[0].sum(1 - f), expected))
+
+    def test_rollout(self):
+        """
+        Test that `rollout` runs a batch of agents against a batch of `PyMDPEnv` environments inside a single scan
+        """
+
+        batch_size, num_timesteps = 3, 5
+        num_obs = [3, 4]
+        num_states = [3, 2]
+        num_controls = [2, 2]
+
+        A = [jnp.broadcast_to(a, (batch_size,) + a.shape) for a in random_A_matrix(num_obs, num_states)]
+        B = [jnp.broadcast_to(b, (batch_size,) + b.shape) for b in random_B_matrix(num_states, num_controls)]
+        C = [jnp.zeros((batch_size, no)) for no in num_obs]
+        D = [jnp.ones((batch_size, ns)) / ns for ns in num_states]
+
+        agent = Agent(A, B, C, D, None, None, None, action_selection="stochastic")
+        env = PyMDPEnv({"A": A, "B": B, "D": D}, {"A": agent.A_dependencies, "B": agent.B_dependencies})
+
+        last, info = rollout(agent, env, num_timesteps, random.PRNGKey(0))
+
+        self.assertEqual(info["action"].shape, (num_timesteps, batch_size, len(num_controls)))
+        self.assertEqual(info["q_pi"].shape, (num_timesteps, batch_size, len(agent.policies)))
+        for m, no in enumerate(num_obs):
+            self.assertEqual(info["observation"][m].shape, (num_timesteps, batch_size))
+            self.assertTrue(((info["observation"][m] >= 0) & (info["observation"][m] < no)).all())
+        for f, ns in enumerate(num_states):
+            self.assertEqual(info["qs"][f].shape, (num_timesteps, batch_size, ns))
+            self.assertEqual(last["empirical_prior"][f].shape, (batch_size, ns))
+        self.assertTrue(jnp.allclose(info["q_pi"].sum(-1), 1.0))
+
+        # with history buffers, marginal message passing can run inside the scan as well
+        agent = Agent(A, B, C, D, None, None, None, action_selection="stochastic", inference_algo="mmp")
+        last, info = rollout(agent, env, num_timesteps, random.PRNGKey(0), history_len=3)
+
+        self.assertEqual(last["history"]["mask"].shape, (batch_size, 3))
+        self.assertTrue(last["history"]["mask"].all())
+        self.assertEqual(last["history"]["actions"].shape, (batch_size, 2, len(num_controls)))
+        self.assertTrue(jnp.allclose(info["q_pi"].sum(-1), 1.0))
+
+        with self.assertRaises(ValueError):
+            rollout(agent, env, num_timesteps, random.PRNGKey(0))
+
+    def test_rollout_sliding_window(self):
+        """
+        Test that smoothing over a sliding window carries the beliefs leaving the window forward as the prior over its first timestep:
+        with a single hidden state factor and a window of one timestep, `vmp` and `mmp` reduce to exact Bayesian filtering, as does `fpi`
+        """
+
+        batch_size, num_timesteps = 3, 6
+        num_obs = [4]
+        num_states = [3]
+        num_controls = [2]
+
+        A = [jnp.broadcast_to(a, (batch_size,) + a.shape) for a in random_A_matrix(num_obs, num_states)]
+        B = [jnp.broadcast_to(b, (batch_size,) + b.shape) for b in random_B_matrix(num_states, num_controls)]
+        C = [jnp.zeros((batch_size, no)) for no in num_obs]
+        D = [jnp.ones((batch_size, ns)) / ns for ns in num_states]
+
+        env = PyMDPEnv({"A": A, "B": B, "D": D}, {"A": [[0]], "B": [[0]]})
+
+        agent = Agent(A, B, C, D, None, None, None, action_selection="stochastic")
+        _, info = rollout(agent, env, num_timesteps, random.PRNGKey(0))
+
+        for inference_algo in ["vmp", "mmp"]:
+            agent = Agent(A, B, C, D, None, None, None, action_selection="stochastic", inference_algo=inference_algo)
+            last, info_window = rollout(agent, env, num_timesteps, random.PRNGKey(0), history_len=1)
+
+            self.assertTrue((info_window["action"] == info["action"]).all())
+            self.assertTrue(jnp.allclose(info_window["qs"][0], info["qs"][0], atol=1e-5))
+
+        # the prior over the first timestep of a longer window moves away from `D` once the window has started sliding
+        agent = Agent(A, B, C, D, None, None, None, action_selection="stochastic", inference_algo="mmp")
+        last, _ = rollout(agent, env, num_timesteps, random.PRNGKey(0), history_len=3)
+        self.assertTrue(jnp.allclose(last["history"]["prior"][0].sum(-1), 1.0))
+        self.assertFalse(jnp.allclose(last["history"]["prior"][0], D[0]))
+
 if __name__ == "__main__":
     unittest.main()       
 
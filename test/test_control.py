@@ -164,6 +164,33 @@ class TestControl(unittest.TestCase):
         for qs_f, qs_val_f in zip(qs_pi_0[0], qs_pi_0_validation[0]):
             self.assertTrue(np.allclose(qs_f, qs_val_f))
 
+    def test_get_expected_joint_states(self):
+        """
+        Test computing the expected joint distribution over hidden states after an action, with `B` array inter-factor dependencies,
+        and that its marginals coincide with `get_expected_states_interactions` when the joint distribution factorizes
+        """
+        
+        num_states = [3, 4]
+        num_controls = [3, 2]
+
+        B_factor_list = [[0], [0, 1]]
+
+        qs = utils.random_single_categorical(num_states)
+        B = utils.random_B_matrix(num_states, num_controls, B_factor_list=B_factor_list)
+        action = np.array([2, 1])
+
+        qs_joint = np.random.rand(*num_states)
+        qs_joint = qs_joint / qs_joint.sum()
+        qs_joint_next = control.get_expected_joint_states(qs_joint, B, B_factor_list, action)
+
+        qs_joint_next_validation = np.einsum('ai,bij,ij->ab', B[0][..., action[0]], B[1][..., action[1]], qs_joint)
+        self.assertTrue(np.allclose(qs_joint_next, qs_joint_next_validation))
+
+        qs_next = control.get_expected_states_interactions(qs, B, B_factor_list, action.reshape(1, -1))[0]
+        qs_joint_next = control.get_expected_joint_states(maths.spm_cross(qs), B, B_factor_list, action)
+        self.assertTrue(np.allclose(qs_joint_next.sum(axis=1), qs_next[0]))
+        self.assertTrue(np.allclose(qs_joint_next.sum(axis=0), qs_next[1]))
+
     def test_get_expected_obs_factorized(self):
         """
         Test the new version of `get_expected_obs` that includes sparse dependencies of `A` array on hidden state factors (not all observation modalities depend on all hidden state factors)
@@ -1697,5 +1724,260 @@ class TestControl(unittest.TestCase):
         sampled_action = control._sample_policy_test(q_pi, policies, num_controls, action_selection="deterministic", seed=seeds[1])
         self.assertEqual(sampled_action[0], 2)
 
+    def test_update_posterior_policies_receding(self):
+        """
+        Test that the receding-horizon policy update gives the same result as `update_posterior_policies_factorized`, both when
+        evaluating the policies from scratch and when re-using the policy tree of the previous timestep
+        """
+
+        num_obs = [3, 3]
+        num_states = [3, 2]
+        num_controls = [3, 2]
+
+        A_factor_list = [[0, 1], [1]]
+        B_factor_list = [[0], [0, 1]]
+
+        qs = utils.random_single_categorical(num_states)
+        A = utils.random_A_matrix(num_obs, num_states, A_factor_list=A_factor_list)
+        B = utils.random_B_matrix(num_states, num_controls, B_factor_list=B_factor_list)
+        C = utils.obj_array_from_list([np.array([1.0, 0.0, -1.0]), np.zeros(3)])
+        pA = utils.dirichlet_like(A)
+        pB = utils.dirichlet_like(B)
+
+        policies = control.construct_policies(num_states, num_controls, policy_len=3)
+
+        efe_kwargs = {"use_utility": True, "use_states_info_gain": True, "use_param_info_gain": True, "pA": pA, "pB": pB, "gamma": 16.0}
+
+        q_pi_val, efe_val = control.update_posterior_policies_factorized(qs, A, B, C, A_factor_list, B_factor_list, policies, **efe_kwargs)
+        q_pi, efe, policy_tree = control.update_posterior_policies_receding(qs, A, B, C, A_factor_list, B_factor_list, policies, **efe_kwargs)
+
+        self.assertTrue(np.allclose(efe, efe_val))
+        self.assertTrue(np.allclose(q_pi, q_pi_val))
+
+        """ Re-use the plan after taking an action, when the new posterior is exactly the one predicted under that action """
+        action = policies[np.argmax(q_pi)][0]
+        qs_next = policy_tree[(tuple(action),)][0]
+
+        q_pi_val, efe_val = control.update_posterior_policies_factorized(qs_next, A, B, C, A_factor_list, B_factor_list, policies, **efe_kwargs)
+        q_pi_next, efe_next, _ = control.update_posterior_policies_receding(
+            qs_next, A, B, C, A_factor_list, B_factor_list, policies, action=action, q_pi_prev=q_pi, policy_tree=policy_tree, **efe_kwargs
+        )
+
+        self.assertTrue(np.allclose(efe_next, efe_val))
+        self.assertTrue(np.allclose(q_pi_next, q_pi_val))
+
+        """ Only carry over the suffixes of the two best surviving policies """
+        qs_next = utils.random_single_categorical(num_states)
+        q_pi_next, efe_next, _ = control.update_posterior_policies_receding(
+            qs_next, A, B, C, A_factor_list, B_factor_list, policies, action=action, q_pi_prev=q_pi, policy_tree=policy_tree, num_reused_plans=2, **efe_kwargs
+        )
+
+        evaluated = np.isfinite(efe_next)
+        self.assertEqual(evaluated.sum(), 2 * np.prod(num_controls))
+        self.assertTrue(np.isclose(q_pi_next.sum(), 1.0))
+        self.assertTrue((q_pi_next[~evaluated] == 0.).all())
+
+        _, efe_val = control.update_posterior_policies_factorized(qs_next, A, B, C, A_factor_list, B_factor_list, policies, **efe_kwargs)
+        self.assertTrue(np.allclose(efe_next[evaluated], efe_val[evaluated]))
+
+    def test_update_posterior_policies_beam(self):
+        """
+        Test that beam search finds the same policies as full enumeration when the beam is as wide as the policy space,
+        and that it keeps `beam_width` policies of the requested depth otherwise
+        """
+
+        num_obs = [3, 3]
+        num_states = [3, 2]
+        num_controls = [3, 2]
+
+        A_factor_list = [[0, 1], [1]]
+        B_factor_list = [[0], [0, 1]]
+
+        qs = utils.random_single_categorical(num_states)
+        A = utils.random_A_matrix(num_obs, num_states, A_factor_list=A_factor_list)
+        B = utils.random_B_matrix(num_states, num_controls, B_factor_list=B_factor_list)
+        C = utils.obj_array_from_list([np.array([1.0, 0.0, -1.0]), np.zeros(3)])
+
+        policies = control.construct_policies(num_states, num_controls, policy_len=2)
+
+        q_pi_val, efe_val = control.update_posterior_policies_factorized(qs, A, B, C, A_factor_list, B_factor_list, policies)
+        q_pi, efe, beam_policies = control.update_posterior_policies_beam(
+            qs, A, B, C, A_factor_list, B_factor_list, num_controls, policy_len=2, beam_width=len(policies)
+        )
+
+        self.assertEqual(len(beam_policies), len(policies))
+        for p_idx, policy in enumerate(beam_policies):
+            val_idx = [i for i, policy_val in enumerate(policies) if (policy_val == policy).all()][0]
+            self.assertTrue(np.isclose(efe[p_idx], efe_val[val_idx]))
+            self.assertTrue(np.isclose(q_pi[p_idx], q_pi_val[val_idx]))
+
+        q_pi, efe, beam_policies = control.update_posterior_policies_beam(
+            qs, A, B, C, A_factor_list, B_factor_list, num_controls, policy_len=6, beam_width=4
+        )
+
+        self.assertEqual(len(beam_policies), 4)
+        self.assertTrue(all([policy.shape == (6, len(num_controls)) for policy in beam_policies]))
+        self.assertTrue(np.isclose(q_pi.sum(), 1.0))
+        self.assertTrue((np.diff(efe) <= 0.).all())
+
+    def test_update_posterior_policies_mcts(self):
+        """
+        Test that Monte Carlo tree search finds the best policy of full enumeration when the simulation budget covers the policy space,
+        that the search tree below the executed action is re-used, and that a wall-clock budget alone can be used
+        """
+
+        np.random.seed(1)
+
+        num_obs = [3, 3]
+        num_states = [3, 2]
+        num_controls = [3, 2]
+
+        A_factor_list = [[0, 1], [1]]
+        B_factor_list = [[0], [0, 1]]
+
+        qs = utils.random_single_categorical(num_states)
+        A = utils.random_A_matrix(num_obs, num_states, A_factor_list=A_factor_list)
+        B = utils.random_B_matrix(num_states, num_controls, B_factor_list=B_factor_list)
+        C = utils.obj_array_from_list([np.array([1.0, 0.0, -1.0]), np.zeros(3)])
+
+        policies = control.construct_policies(num_states, num_controls, policy_len=2)
+        _, efe_val = control.update_posterior_policies_factorized(qs, A, B, C, A_factor_list, B_factor_list, policies)
+
+        q_pi, efe, mcts_policies, search_tree = control.update_posterior_policies_mcts(
+            qs, A, B, C, A_factor_list, B_factor_list, num_controls, policy_len=2, num_simulations=300
+        )
+
+        self.assertTrue(np.isclose(efe.max(), efe_val.max()))
+        self.assertTrue(np.isclose(q_pi.sum(), 1.0))
+        self.assertTrue(all([policy.shape == (2, len(num_controls)) for policy in mcts_policies]))
+
+        action = mcts_policies[np.argmax(q_pi)][0]
+        _, _, _, new_tree = control.update_posterior_policies_mcts(
+            qs, A, B, C, A_factor_list, B_factor_list, num_controls, policy_len=2, num_simulations=1, action=action, search_tree=search_tree
+        )
+        # every node below the executed action must have been carried over from the previous search
+        reused = {prefix[1:]: stats for prefix, stats in search_tree.items() if len(prefix) > 1 and prefix[0] == tuple(action.astype(int))}
+        self.assertTrue(len(reused) > 0)
+        for prefix, stats in reused.items():
+            self.assertIn(prefix, new_tree)
+            self.assertGreaterEqual(new_tree[prefix][0], stats[0])
+
+        q_pi, efe, mcts_policies, _ = control.update_posterior_policies_mcts(
+            qs, A, B, C, A_factor_list, B_factor_list, num_controls, policy_len=3, num_simulations=None, time_budget=0.05
+        )
+        self.assertTrue(len(mcts_policies) > 0)
+        self.assertTrue(np.isclose(q_pi.sum(), 1.0))
+
+        with self.assertRaises(ValueError):
+            control.update_posterior_policies_mcts(
+                qs, A, B, C, A_factor_list, B_factor_list, num_controls, num_simulations=None, time_budget=None
+            )
+
+    def test_update_posterior_policies_anytime(self):
+        """
+        Test that the anytime policy evaluation matches the factorized version without a deadline, and that it only evaluates
+        the highest-priority policies when the deadline is reached
+        """
+
+        num_obs = [3, 3]
+        num_states = [3, 2]
+        num_controls = [3, 2]
+
+        A_factor_list = [[0, 1], [1]]
+        B_factor_list = [[0], [0, 1]]
+
+        qs = utils.random_single_categorical(num_states)
+        A = utils.random_A_matrix(num_obs, num_states, A_factor_list=A_factor_list)
+        B = utils.random_B_matrix(num_states, num_controls, B_factor_list=B_factor_list)
+        C = utils.obj_array_from_list([np.array([1.0, 0.0, -1.0]), np.zeros(3)])
+
+        policies = control.construct_policies(num_states, num_controls, policy_len=2)
+        E = utils.norm_dist(np.random.rand(len(policies)))
+
+        q_pi_val, efe_val = control.update_posterior_policies_factorized(qs, A, B, C, A_factor_list, B_factor_list, policies, E=E)
+        q_pi, efe, evaluated = control.update_posterior_policies_anytime(qs, A, B, C, A_factor_list, B_factor_list, policies, E=E)
+
+        self.assertTrue(evaluated.all())
+        self.assertTrue(np.allclose(q_pi, q_pi_val))
+        self.assertTrue(np.allclose(efe, efe_val))
+
+        # with a deadline of 0 seconds, only the policy with the highest priority is evaluated
+        priority = np.random.rand(len(policies))
+        q_pi, efe, evaluated = control.update_posterior_policies_anytime(
+            qs, A, B, C, A_factor_list, B_factor_list, policies, deadline=0., priority=priority, E=E
+        )
+
+        self.assertEqual(evaluated.sum(), 1)
+        self.assertTrue(evaluated[np.argmax(priority)])
+        self.assertTrue(np.isclose(efe[evaluated][0], efe_val[np.argmax(priority)]))
+        self.assertTrue(np.isinf(efe[~evaluated]).all())
+        self.assertTrue(np.isclose(q_pi[evaluated][0], 1.0))
+        self.assertTrue((q_pi[~evaluated] == 0.).all())
+
+        # without a priority, policies are evaluated in order of their prior probability
+        _, _, evaluated = control.update_posterior_policies_anytime(
+            qs, A, B, C, A_factor_list, B_factor_list, policies, deadline=0., E=E
+        )
+        self.assertTrue(evaluated[np.argmax(E)])
+
+    def test_update_posterior_policies_pruned(self):
+        """
+        Test the pruning of policies based on their prior probability: by threshold, by top-k and by branch-and-bound
+        """
+
+        num_obs = [3, 3]
+        num_states = [3, 2]
+        num_controls = [3, 2]
+
+        A_factor_list = [[0, 1], [1]]
+        B_factor_list = [[0], [0, 1]]
+
+        qs = utils.random_single_categorical(num_states)
+        A = utils.random_A_matrix(num_obs, num_states, A_factor_list=A_factor_list)
+        B = utils.random_B_matrix(num_states, num_controls, B_factor_list=B_factor_list)
+        C = utils.obj_array_from_list([np.array([1.0, 0.0, -1.0]), np.zeros(3)])
+
+        policies = control.construct_policies(num_states, num_controls, policy_len=2)
+        n_policies = len(policies)
+
+        E = np.full(n_policies, 1e-20)
+        E[:4] = np.array([0.4, 0.3, 0.2, 0.1])
+        E = utils.norm_dist(E)
+
+        q_pi_val, efe_val = control.update_posterior_policies_factorized(qs, A, B, C, A_factor_list, B_factor_list, policies, E=E)
+
+        # without any pruning rule, the result is the same as without pruning
+        q_pi, efe, pruned = control.update_posterior_policies_pruned(qs, A, B, C, A_factor_list, B_factor_list, policies, E=E)
+        self.assertFalse(pruned.any())
+        self.assertTrue(np.allclose(q_pi, q_pi_val))
+        self.assertTrue(np.allclose(efe, efe_val))
+
+        q_pi, efe, pruned = control.update_posterior_policies_pruned(qs, A, B, C, A_factor_list, B_factor_list, policies, E_threshold=0.15, E=E)
+        self.assertEqual(pruned.sum(), n_policies - 3)
+        self.assertTrue(np.allclose(efe[:3], efe_val[:3]))
+        self.assertTrue(np.isinf(efe[pruned]).all())
+        self.assertTrue((q_pi[pruned] == 0.).all())
+        self.assertTrue(np.isclose(q_pi.sum(), 1.0))
+
+        q_pi, efe, pruned = control.update_posterior_policies_pruned(qs, A, B, C, A_factor_list, B_factor_list, policies, top_k=2, E=E)
+        self.assertEqual(pruned.sum(), n_policies - 2)
+        self.assertFalse(pruned[:2].any())
+
+        # the policies with negligible prior probability cannot be competitive, so branch-and-bound prunes them
+        q_pi_val, _ = control.update_posterior_policies_factorized(qs, A, B, C, A_factor_list, B_factor_list, policies, E=E, gamma=1.0)
+        q_pi, efe, pruned = control.update_posterior_policies_pruned(qs, A, B, C, A_factor_list, B_factor_list, policies, bound_tol=1e-6, E=E, gamma=1.0)
+        self.assertFalse(pruned[:4].any())
+        self.assertTrue(pruned[4:].all())
+        self.assertTrue(np.allclose(q_pi, q_pi_val, atol=1e-6))
+
+        # the bound holds for every policy
+        G_bound = control.calc_neg_efe_upper_bound(A, C, 2)
+        self.assertTrue((efe_val <= G_bound).all())
+
+        with self.assertRaises(ValueError):
+            control.update_posterior_policies_pruned(
+                qs, A, B, C, A_factor_list, B_factor_list, policies, bound_tol=1e-6, use_param_info_gain=True, pA=utils.dirichlet_like(A), E=E
+            )
+
 if __name__ == "__main__":
     unittest.main()
@@ -140,5 +140,38 @@ class TestControlJax(unittest.TestCase):
             self.assertTrue(np.allclose(info_gain, info_gain_validation, atol=1e-5))
     
 
+    def test_update_posterior_policies_chunked(self):
+        """
+        Test that evaluating policies in chunks gives the same posterior over policies and negative expected free energies as evaluating
+        all policies at once, including when the number of policies is not a multiple of the chunk size
+        """
+
+        num_obs = [3, 4]
+        num_states = [3, 2]
+        num_controls = [3, 2]
+        A_dependencies = [[0, 1], [1]]
+        B_dependencies = [[0], [1]]
+
+        A = [jnp.array(a) for a in utils.random_A_matrix(num_obs, num_states, A_factor_list=A_dependencies)]
+        B = [jnp.array(b) for b in utils.random_B_matrix(num_states, num_controls)]
+        C = [jnp.array(c) for c in utils.obj_array_uniform(num_obs)]
+        qs = [jnp.array(q) for q in utils.random_single_categorical(num_states)]
+        I = [jnp.zeros((1, ns)) for ns in num_states]
+
+        policies = ctl_jax.construct_policies(num_states, num_controls, policy_len=2)
+        E = jnp.array(utils.norm_dist(np.random.rand(len(policies))))
+
+        q_pi, G = ctl_jax.update_posterior_policies_inductive(
+            policies, qs, A, B, C, E, None, None, A_dependencies, B_dependencies, I, use_inductive=False
+        )
+
+        for chunk_size in [1, 7, len(policies)]:
+            q_pi_chunked, G_chunked = ctl_jax.update_posterior_policies_inductive(
+                policies, qs, A, B, C, E, None, None, A_dependencies, B_dependencies, I, use_inductive=False, policy_chunk_size=chunk_size
+            )
+            self.assertEqual(G_chunked.shape, G.shape)
+            self.assertTrue(jnp.allclose(G_chunked, G, atol=1e-5))
+            self.assertTrue(jnp.allclose(q_pi_chunked, q_pi, atol=1e-5))
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
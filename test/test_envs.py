@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Unit Tests
+__author__: Dimitrije Markovic, Conor Heins
+"""
+
+import unittest
+
+import numpy as np
+
+from pymdp import utils
+from pymdp.envs import TabularEnv, VecEnv, GridWorldEnv, DGridWorldEnv, TMazeEnv, RandomDotMotion, VisualForagingEnv, initialize_scene_construction_GM
+from pymdp.default_models import generate_grid_world_transitions
+from pymdp.envs.tabular import build_alias_tables
+
+class TestEnvs(unittest.TestCase):
+
+    def test_vec_env_grid_world(self):
+        """
+        Tests that a vectorized grid world moves every copy deterministically, as the single environment does
+        """
+
+        env = GridWorldEnv(shape=[3, 4], init_state=5)
+        vec_env = VecEnv.from_env(env, num_envs=50, seed=0)
+
+        obs = vec_env.reset()
+        self.assertEqual(obs.shape, (50, 1))
+        self.assertTrue((obs == 5).all())
+
+        state = vec_env.state[:, 0]
+        for _ in range(10):
+            actions = vec_env.sample_action()
+            obs = vec_env.step(actions)
+            expected = np.array([env.P[s][a] for s, a in zip(state, actions[:, 0])])
+            self.assertTrue((vec_env.state[:, 0] == expected).all())
+            self.assertTrue((obs[:, 0] == expected).all())
+            state = expected
+
+    def test_vec_env_sampling(self):
+        """
+        Tests that the initial states and the observations sampled for all copies at once follow the initial state distribution and
+        the observation model of the generative process
+        """
+
+        num_envs = 20000
+
+        env = TMazeEnv(reward_probs=[0.8, 0.2])
+        vec_env = VecEnv.from_env(env, num_envs=num_envs, seed=1)
+        vec_env.reset()
+
+        self.assertTrue((vec_env.state[:, 0] == 0).all())
+        self.assertTrue(np.isclose((vec_env.state[:, 1] == 1).mean(), 0.5, atol=0.02))
+
+        # move every copy to the first arm and compare the frequencies of reward outcomes with the observation model
+        obs = vec_env.step(np.tile([1, 0], (num_envs, 1)))
+        self.assertTrue((obs[:, 0] == 1).all())
+        A_reward = env.get_likelihood_dist()[1]
+        for reward_condition in range(2):
+            in_condition = vec_env.state[:, 1] == reward_condition
+            freqs = np.bincount(obs[in_condition, 1], minlength=3) / in_condition.sum()
+            self.assertTrue(np.allclose(freqs, A_reward[:, 1, reward_condition], atol=0.02))
+
+        env = RandomDotMotion(precision=2.0, dot_direction="UP")
+        vec_env = VecEnv.from_env(env, num_envs=num_envs, seed=2)
+        obs = vec_env.reset(state=np.tile([1, 0], (num_envs, 1)))
+        self.assertTrue(np.allclose(np.bincount(obs[:, 0], minlength=5) / num_envs, env.dot_dist, atol=0.02))
+
+        # breaking stops the sampling of dot motion
+        obs = vec_env.step(np.tile([0, 1], (num_envs, 1)))
+        self.assertTrue((obs[:, 0] == 0).all() and (obs[:, 1] == 1).all())
+
+    def test_alias_tables(self):
+        """
+        Tests that the alias tables of a set of categorical distributions encode exactly those distributions
+        """
+
+        probs = np.random.default_rng(0).dirichlet(np.ones(7), size=20)
+        probs[0] = utils.onehot(3, 7)
+        accept, alias = build_alias_tables(probs)
+
+        num_outcomes = probs.shape[1]
+        reconstructed = accept / num_outcomes
+        for c in range(probs.shape[0]):
+            np.add.at(reconstructed[c], alias[c], (1.0 - accept[c]) / num_outcomes)
+        self.assertTrue(np.allclose(reconstructed, probs))
+
+    def test_tabular_env(self):
+        """
+        Tests that a tabular generative process with sparse dependencies samples states and observations from the columns of `B` and `A`
+        that the current states and actions select, both for a single environment and for a batch of environments, and that sampling
+        is reproducible given the random number generator
+        """
+
+        num_obs = [4, 3]
+        num_states = [3, 2]
+        num_controls = [2, 1]
+        A_factor_list = [[0, 1], [1]]
+        B_factor_list = [[0, 1], [1]]
+
+        A = utils.random_A_matrix(num_obs, num_states, A_factor_list=A_factor_list)
+        B = utils.random_B_matrix(num_states, num_controls, B_factor_list=B_factor_list)
+        D = utils.random_single_categorical(num_states)
+
+        env = TabularEnv(A, B, D, A_factor_list=A_factor_list, B_factor_list=B_factor_list, rng=np.random.default_rng(0))
+        obs = env.reset()
+        self.assertEqual(len(obs), len(num_obs))
+        self.assertEqual(len(env.step(env.sample_action())), len(num_obs))
+
+        num_envs = 20000
+        vec_env = TabularEnv(A, B, D, A_factor_list=A_factor_list, B_factor_list=B_factor_list, num_envs=num_envs, rng=np.random.default_rng(1))
+        vec_env.reset(state=np.tile([2, 1], (num_envs, 1)))
+        obs = vec_env.step(np.tile([1, 0], (num_envs, 1)))
+
+        freqs = np.bincount(vec_env.state[:, 0], minlength=num_states[0]) / num_envs
+        self.assertTrue(np.allclose(freqs, B[0][:, 2, 1, 1], atol=0.02))
+        for s in range(num_states[1]):
+            in_state = vec_env.state[:, 1] == s
+            freqs = np.bincount(obs[in_state, 1], minlength=num_obs[1]) / in_state.sum()
+            self.assertTrue(np.allclose(freqs, A[1][:, s], atol=0.03))
+
+        # the same random number generator state gives the same trajectory
+        trajectories = []
+        for _ in range(2):
+            env = TabularEnv(A, B, D, A_factor_list=A_factor_list, B_factor_list=B_factor_list, num_envs=5, rng=np.random.default_rng(2))
+            trajectories.append([env.reset()] + [env.step(np.zeros((5, 2), dtype=int)) for _ in range(5)])
+        self.assertTrue(np.array_equal(np.stack(trajectories[0]), np.stack(trajectories[1])))
+
+        with self.assertRaises(ValueError):
+            TabularEnv(A, B, utils.obj_array_ones(num_states), A_factor_list=A_factor_list, B_factor_list=B_factor_list)
+
+    def test_grid_world_transitions(self):
+        """
+        Tests the transition models of grid worlds against moves computed location by location
+        """
+
+        num_rows, num_cols = 3, 4
+        action_labels = ["UP", "RIGHT", "DOWN", "LEFT", "STAY"]
+        moves = [(-1, 0), (0, 1), (1, 0), (0, -1), (0, 0)]
+
+        B = generate_grid_world_transitions(action_labels, num_rows=num_rows, num_cols=num_cols)
+        env_B = GridWorldEnv(shape=[num_rows, num_cols], init_state=0).get_transition_dist()
+        self.assertTrue(np.array_equal(B, env_B)) # the environment's actions are in the same order
+
+        for s in range(num_rows * num_cols):
+            row, col = divmod(s, num_cols)
+            for a, (d_row, d_col) in enumerate(moves):
+                next_row, next_col = min(max(row + d_row, 0), num_rows - 1), min(max(col + d_col, 0), num_cols - 1)
+                self.assertTrue(np.array_equal(B[:, s, a], utils.onehot(next_row * num_cols + next_col, num_rows * num_cols)))
+
+        env = DGridWorldEnv(shape=[2, 3], init_state=2)
+        self.assertEqual([env.P[2][a] for a in range(env.n_control)], [1, 2, 2])
+        self.assertEqual(env.step(env.LEFT), 1)
+        self.assertTrue(utils.is_normalized(env.get_transition_dist()))
+
+        with self.assertRaises(ValueError):
+            generate_grid_world_transitions(["UP", "JUMP"])
+
+    def test_scene_construction_likelihoods(self):
+        """
+        Tests the observation models of the scene construction environment and generative model
+        """
+
+        scenes = np.array([[[0, 2], [1, 0]], [[2, 2], [0, 1]]])
+        A = VisualForagingEnv(scenes=scenes).get_likelihood_dist()
+        self.assertTrue(utils.is_normalized(A))
+        self.assertTrue(np.array_equal(A[1][:, 0, :], np.tile(utils.onehot(0, 3)[:, None], (1, 2)))) # nothing is seen at the starting location
+        for scene_id, scene in enumerate(scenes):
+            for cell, feature in enumerate(scene.flatten()):
+                self.assertEqual(A[1][feature, cell + 1, scene_id], 1.0)
+
+        parameters, mapping, _ = initialize_scene_construction_GM()
+        A = parameters["A"]
+        self.assertTrue(utils.is_normalized(A))
+
+        # the first state is the `UP_RIGHT` scene with 'UP' in quadrant 1 and 'RIGHT' in quadrant 2
+        what_obs_names = mapping["what_obs_names"]
+        self.assertEqual([what_obs_names[o] for o in A[0][:, 0, 1:5].argmax(0)], ["UP", "RIGHT", "null", "null"])
+        self.assertEqual([what_obs_names[o] for o in A[0][:, 0, 5:].argmax(0)], ["correct!", "incorrect!", "incorrect!", "incorrect!"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -173,6 +173,116 @@ class TestInference(unittest.TestCase):
         for qs_f_val, qs_f_out in zip(qs_validation, qs_out):
             self.assertTrue(np.isclose(qs_f_val, qs_f_out).all())
     
+    def test_update_posterior_states_obs_indices(self):
+        """
+        Tests that inference from observation indices, which slices the observed outcome out of each `A[m]`, gives the same posteriors
+        as inference from one-hot observations, both for fixed-point iteration and for marginal message passing.
+        """
+
+        num_states = [3, 4]
+        num_obs = [3, 3, 5]
+        num_controls = [2, 1]
+
+        mb_dict = {'A_factor_list': [[0], [1], [0, 1]],
+                    'A_modality_list': [[0, 2], [1, 2]]}
+
+        A = utils.random_A_matrix(num_obs, num_states, A_factor_list=mb_dict['A_factor_list'])
+        B = utils.random_B_matrix(num_states, num_controls)
+        prior = utils.random_single_categorical(num_states)
+
+        obs_seq = [[np.random.randint(obs_dim) for obs_dim in num_obs] for _ in range(3)]
+        obs_seq_onehots = [utils.process_observation(obs, len(num_obs), num_obs) for obs in obs_seq]
+
+        self.assertEqual(utils.process_observation(obs_seq[0], len(num_obs), num_obs, as_indices=True), obs_seq[0])
+
+        qs_indices = inference.update_posterior_states_factorized(A, tuple(obs_seq[0]), num_obs, num_states, mb_dict, prior=prior)
+        qs_onehots = inference.update_posterior_states_factorized(A, obs_seq_onehots[0], num_obs, num_states, mb_dict, prior=prior)
+        for qs_f_indices, qs_f_onehots in zip(qs_indices, qs_onehots):
+            self.assertTrue(np.allclose(qs_f_indices, qs_f_onehots))
+
+        policies = [np.array([[a, 0]]) for a in range(num_controls[0])]
+        prev_actions = [np.array([0, 0]), np.array([1, 0])]
+        qs_seq_indices, F_indices = inference.update_posterior_states_full_factorized(
+            A, mb_dict, B, [[0], [1]], obs_seq, policies, prev_actions, prior=prior, policy_sep_prior=False
+        )
+        qs_seq_onehots, F_onehots = inference.update_posterior_states_full_factorized(
+            A, mb_dict, B, [[0], [1]], obs_seq_onehots, policies, prev_actions, prior=prior, policy_sep_prior=False
+        )
+        self.assertTrue(np.allclose(F_indices, F_onehots))
+        for p_idx in range(len(policies)):
+            for qs_t_indices, qs_t_onehots in zip(qs_seq_indices[p_idx], qs_seq_onehots[p_idx]):
+                for qs_f_indices, qs_f_onehots in zip(qs_t_indices, qs_t_onehots):
+                    self.assertTrue(np.allclose(qs_f_indices, qs_f_onehots))
+
+    def test_update_posterior_states_forward_backward(self):
+        """
+        Tests exact (forward-backward) inference over a window of observations against the posterior marginals and evidence
+        computed by enumerating all the state sequences, for two independent hidden state factors
+        """
+
+        num_states = [3, 2]
+        num_obs = [4, 3, 2]
+        num_controls = [2, 3]
+        mb_dict = {'A_factor_list': [[0], [1], [0]],
+                    'A_modality_list': [[0, 2], [1]]}
+
+        A = utils.random_A_matrix(num_obs, num_states, A_factor_list=mb_dict['A_factor_list'])
+        B = utils.random_B_matrix(num_states, num_controls)
+        prior = utils.random_single_categorical(num_states)
+
+        T = 3
+        obs_seq = [[np.random.randint(obs_dim) for obs_dim in num_obs] for _ in range(T)]
+        prev_actions = [np.array([1, 0]), np.array([0, 2])]
+        policies = [np.array([[a_0, a_1]]) for a_0 in range(num_controls[0]) for a_1 in range(num_controls[1])]
+
+        qs_seq_pi, F = inference.update_posterior_states_forward_backward(A, mb_dict, B, obs_seq, policies, prev_actions, prior=prior, policy_sep_prior=False)
+
+        # enumerate the joint probability of all sequences of states of each factor
+        log_evidence = 0.0
+        for f, ns_f in enumerate(num_states):
+            joint = np.zeros(T * [ns_f])
+            for s_seq in np.ndindex(*joint.shape):
+                p = prior[f][s_seq[0]]
+                for t in range(T):
+                    if t > 0:
+                        p *= B[f][s_seq[t], s_seq[t-1], prev_actions[t-1][f]]
+                    for m in mb_dict['A_modality_list'][f]:
+                        p *= A[m][obs_seq[t][m], s_seq[t]]
+                joint[s_seq] = p
+            log_evidence += np.log(joint.sum())
+            for t in range(T):
+                qs_t_valid = joint.sum(axis=tuple(i for i in range(T) if i != t)) / joint.sum()
+                for p_idx, policy in enumerate(policies):
+                    self.assertTrue(np.allclose(qs_seq_pi[p_idx][t][f], qs_t_valid))
+                    self.assertTrue(np.allclose(qs_seq_pi[p_idx][T][f], B[f][:, :, policy[0, f]].dot(qs_seq_pi[p_idx][T-1][f])))
+
+        self.assertTrue(np.allclose(F, -log_evidence))
+
+    def test_update_posterior_states_filter(self):
+        """
+        Tests exact filtering of the joint posterior over hidden states with an observation, against Bayes' rule
+        applied to the joint likelihood of the observation, with a modality whose factors are not listed in ascending order
+        """
+
+        num_states = [3, 4]
+        num_obs = [3, 3, 5]
+        mb_dict = {'A_factor_list': [[0], [1], [1, 0]],
+                    'A_modality_list': [[0, 2], [1, 2]]}
+
+        A = utils.random_A_matrix(num_obs, num_states, A_factor_list=mb_dict['A_factor_list'])
+        joint_prior = np.random.rand(*num_states)
+        joint_prior = joint_prior / joint_prior.sum()
+
+        obs = [np.random.randint(obs_dim) for obs_dim in num_obs]
+        qs_out, qs_joint_out = inference.update_posterior_states_filter(A, obs, num_obs, num_states, mb_dict, joint_prior)
+
+        ll = A[0][obs[0]][:, None] * A[1][obs[1]][None, :] * A[2][obs[2]].T
+        qs_joint_validation = ll * joint_prior / (ll * joint_prior).sum()
+
+        self.assertTrue(np.allclose(qs_joint_out, qs_joint_validation))
+        self.assertTrue(np.allclose(qs_out[0], qs_joint_validation.sum(axis=1)))
+        self.assertTrue(np.allclose(qs_out[1], qs_joint_validation.sum(axis=0)))
+
     def test_update_posterior_states_factorized_noVFE_compute(self):
         """
         Tests the version of `update_posterior_states` where an `mb_dict` is provided as an argument to factorize
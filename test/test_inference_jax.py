@@ -10,8 +10,11 @@ import unittest
 
 import numpy as np
 import jax.numpy as jnp
+from jax import nn, random, vmap
 
 from pymdp.jax.algos import run_vanilla_fpi as fpi_jax
+from pymdp.jax.algos import run_factorized_fpi, run_factorized_fpi_adaptive
+from pymdp.jax import inference as inference_jax
 from pymdp.algos import run_vanilla_fpi as fpi_numpy
 from pymdp import utils, maths
 
@@ -230,5 +233,102 @@ class TestInferenceJax(unittest.TestCase):
             for f, _ in enumerate(qs_jax):
                 self.assertTrue(np.allclose(qs_numpy[f], qs_jax[f]))
 
+    def test_history_buffer(self):
+        """
+        Tests that inference with fixed-capacity history buffers gives the same posteriors as inference with histories that grow over time,
+        for the filled entries of the buffers
+        """
+
+        num_obs = [3, 4]
+        num_states = [3, 2]
+        num_controls = [2, 2]
+        A_dependencies = [[0, 1], [0, 1]]
+        B_dependencies = [[0], [1]]
+
+        A = [jnp.array(a) for a in utils.random_A_matrix(num_obs, num_states)]
+        B = [jnp.array(b) for b in utils.random_B_matrix(num_states, num_controls)]
+        prior = [jnp.ones(ns) / ns for ns in num_states]
+
+        T, capacity = 3, 5
+        obs = [nn.one_hot(random.randint(random.PRNGKey(m), (T,), 0, no), no) for m, no in enumerate(num_obs)]
+        actions = random.randint(random.PRNGKey(T), (T - 1, len(num_controls)), 0, 2)
+
+        obs_buffer = inference_jax.init_history_buffer([o[0] for o in obs], capacity)
+        actions_buffer = inference_jax.init_history_buffer(actions[0], capacity - 1)
+        qs_buffer = inference_jax.init_history_buffer(prior, capacity)
+        mask = inference_jax.init_history_buffer(jnp.array(False), capacity)
+
+        for t in range(T):
+            obs_buffer = inference_jax.push_history_buffer(obs_buffer, [o[t] for o in obs])
+            mask = inference_jax.push_history_buffer(mask, True)
+            if t > 0:
+                actions_buffer = inference_jax.push_history_buffer(actions_buffer, actions[t - 1])
+
+            qs_buffer = inference_jax.update_posterior_states(
+                A, B, obs_buffer, None, prior=prior, qs_hist=qs_buffer, A_dependencies=A_dependencies, method='fpi', hist_mask=mask
+            )
+            qs = inference_jax.update_posterior_states(
+                A, B, [o[:t+1] for o in obs], None, prior=prior, A_dependencies=A_dependencies, method='fpi'
+            )
+            for f in range(len(num_states)):
+                self.assertEqual(qs_buffer[f].shape, (capacity, num_states[f]))
+                self.assertTrue(np.allclose(qs_buffer[f][-1], qs[f][-1]))
+
+        self.assertTrue((mask == jnp.array([False, False, True, True, True])).all())
+
+        for method in ['vmp', 'mmp']:
+            qs = inference_jax.update_posterior_states(
+                A, B, obs, actions, prior=prior, A_dependencies=A_dependencies, B_dependencies=B_dependencies, method=method
+            )
+            qs_buffer = inference_jax.update_posterior_states(
+                A, B, obs_buffer, actions_buffer, prior=prior, A_dependencies=A_dependencies, B_dependencies=B_dependencies, method=method, hist_mask=mask
+            )
+            for f in range(len(num_states)):
+                self.assertEqual(qs_buffer[f].shape, (capacity, num_states[f]))
+                self.assertTrue(np.allclose(qs_buffer[f][mask], qs[f], atol=1e-5))
+
+    def test_fixed_point_iteration_adaptive(self):
+        """
+        Tests that fixed point iteration with early stopping runs at most `num_iter` iterations, stops once the posterior has converged,
+        and counts the iterations of each element of a vmapped batch separately
+        """
+
+        num_obs = [3, 4]
+        num_states = [3, 2]
+        A_dependencies = [[0, 1], [1]]
+
+        A = [jnp.array(a) for a in utils.random_A_matrix(num_obs, num_states, A_factor_list=A_dependencies)]
+        prior = [jnp.array(d) for d in utils.random_single_categorical(num_states)]
+        obs = [nn.one_hot(1, no) for no in num_obs]
+
+        # without a tolerance, all iterations are run
+        qs, num_iters = run_factorized_fpi_adaptive(A, obs, prior, A_dependencies, num_iter=5, tol=0.)
+        qs_val = run_factorized_fpi(A, obs, prior, A_dependencies, num_iter=5)
+        self.assertEqual(num_iters, 5)
+        for f in range(len(num_states)):
+            self.assertTrue(np.allclose(qs[f], qs_val[f]))
+
+        qs, num_iters = run_factorized_fpi_adaptive(A, obs, prior, A_dependencies, num_iter=100, tol=1e-5)
+        qs_val = run_factorized_fpi(A, obs, prior, A_dependencies, num_iter=100)
+        self.assertTrue(num_iters < 100)
+        for f in range(len(num_states)):
+            self.assertTrue(np.allclose(qs[f], qs_val[f], atol=1e-4))
+
+        # with uninformative likelihoods, the posterior is the (uniform) prior after a single iteration
+        A_flat = [jnp.ones_like(a) / a.shape[0] for a in A]
+        uniform = [jnp.ones(ns) / ns for ns in num_states]
+        batched = lambda xs, ys: [jnp.stack([x, y]) for x, y in zip(xs, ys)]
+
+        fpi = vmap(lambda A, obs, prior: run_factorized_fpi_adaptive(A, obs, prior, A_dependencies, num_iter=100, tol=1e-5))
+        qs, num_iters = fpi(batched(A_flat, A), batched(obs, obs), batched(uniform, prior))
+
+        _, num_iters_flat = run_factorized_fpi_adaptive(A_flat, obs, uniform, A_dependencies, num_iter=100, tol=1e-5)
+        _, num_iters_val = run_factorized_fpi_adaptive(A, obs, prior, A_dependencies, num_iter=100, tol=1e-5)
+        self.assertEqual(num_iters_flat, 1)
+        self.assertTrue((num_iters == jnp.array([num_iters_flat, num_iters_val])).all())
+        for f in range(len(num_states)):
+            self.assertTrue(np.allclose(qs[f][0], uniform[f]))
+            self.assertTrue(np.allclose(qs[f][1], qs_val[f], atol=1e-4))
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
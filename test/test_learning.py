@@ -297,6 +297,31 @@ class TestLearning(unittest.TestCase):
         for modality, obs_dim in enumerate(num_obs):
             self.assertTrue(np.allclose(pA_updated_test[modality], pA_updated_valid[modality]))
 
+    def test_update_pA_factorized_obs_indices(self):
+        """
+        Test that updating the Dirichlet parameters over a sparse sensory likelihood (pA) with observation indices, which only updates the parameters
+        of the observed outcomes, gives the same result as updating them with one-hot observations
+        """
+
+        num_states = [2, 6, 5]
+        num_obs = [3, 4, 5]
+        A_factor_list = [[0], [1, 2], [0, 2]]
+
+        qs = utils.random_single_categorical(num_states)
+        A = utils.random_A_matrix(num_obs, num_states, A_factor_list=A_factor_list)
+        A[1][:, 0, :] = utils.onehot(1, num_obs[1])[:, None] # zeros in `A` mask the updates
+        pA = utils.dirichlet_like(A, scale=1.0)
+
+        observation = [np.random.randint(obs_dim) for obs_dim in num_obs]
+        observation_obj_array = utils.process_observation(observation, len(num_obs), num_obs)
+
+        pA_updated_indices = learning.update_obs_likelihood_dirichlet_factorized(pA, A, observation, qs, A_factor_list, lr=0.5)
+        pA_updated_onehots = learning.update_obs_likelihood_dirichlet_factorized(pA, A, observation_obj_array, qs, A_factor_list, lr=0.5)
+
+        for modality in range(len(num_obs)):
+            self.assertTrue(np.allclose(pA_updated_indices[modality], pA_updated_onehots[modality]))
+            self.assertFalse(pA_updated_indices[modality] is pA[modality])
+
     def test_update_pB_single_factor_no_actions(self):
         """
         Test for updating prior Dirichlet parameters over transition likelihood (pB)
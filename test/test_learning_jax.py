@@ -11,10 +11,13 @@ import unittest
 import numpy as np
 import jax.numpy as jnp
 import jax.tree_util as jtu
+from jax import nn, vmap, random as jr
 
 from pymdp.learning import update_obs_likelihood_dirichlet as update_pA_numpy
 from pymdp.learning import update_obs_likelihood_dirichlet_factorized as update_pA_numpy_factorized
 from pymdp.jax.learning import update_obs_likelihood_dirichlet as update_pA_jax
+from pymdp.jax.learning import update_state_likelihood_dirichlet as update_pB_jax
+from pymdp.jax.maths import multidimensional_outer
 from pymdp import utils, maths
 
 class TestLearningJax(unittest.TestCase):
@@ -127,6 +130,38 @@ class TestLearningJax(unittest.TestCase):
             for modality, obs_dim in enumerate(num_obs):
                 self.assertTrue(np.allclose(qA_jax_test[modality],qA_np_test[modality]))
 
+    def test_update_likelihoods_over_trajectory(self):
+        """
+        Testing that the Dirichlet updates over a trajectory, which contract the time axis directly (optionally in chunks of timesteps), match
+        the sum over time of the per-timestep outer products
+        """
+
+        T = 23
+        num_obs = [4, 3]
+        num_states = [3, 2]
+        num_controls = [2, 3]
+        A_dependencies = [[0, 1], [1]]
+        B_dependencies = [[0], [0, 1]]
+
+        keys = jr.split(jr.PRNGKey(0), 4)
+        obs = [nn.one_hot(jr.randint(k, (T,), 0, no), no) for k, no in zip(jr.split(keys[0], 2), num_obs)]
+        qs = [nn.softmax(jr.normal(k, (T, ns)), -1) for k, ns in zip(jr.split(keys[1], 2), num_states)]
+        actions = [nn.one_hot(jr.randint(k, (T - 1,), 0, nc), nc) for k, nc in zip(jr.split(keys[2], 2), num_controls)]
+
+        pA = [jnp.ones((no,) + tuple(num_states[f] for f in deps)) for no, deps in zip(num_obs, A_dependencies)]
+        pB = [jnp.ones((num_states[f],) + tuple(num_states[i] for i in deps) + (num_controls[f],)) for f, deps in enumerate(B_dependencies)]
+
+        for chunk_size in [None, 5, T]:
+            qA = update_pA_jax(pA, obs, qs, A_dependencies, lr=0.5, chunk_size=chunk_size)
+            for m, deps in enumerate(A_dependencies):
+                expected = pA[m] + 0.5 * vmap(multidimensional_outer)([obs[m]] + [qs[f] for f in deps]).sum(0)
+                self.assertTrue(np.allclose(qA[m], expected, atol=1e-5))
+
+            qB = update_pB_jax(pB, qs, actions, B_dependencies, chunk_size=chunk_size)
+            for f, deps in enumerate(B_dependencies):
+                expected = pB[f] + vmap(multidimensional_outer)([qs[f][1:]] + [qs[i][:-1] for i in deps] + [actions[f]]).sum(0)
+                self.assertTrue(np.allclose(qB[f], expected, atol=1e-5))
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -13,9 +13,11 @@ import unittest
 import numpy as np
 from scipy.io import loadmat
 
+from pymdp import utils
 from pymdp.utils import get_model_dimensions, convert_observation_array
-from pymdp.algos import run_mmp
-from pymdp.maths import get_joint_likelihood_seq
+from pymdp.algos import run_mmp, run_mmp_factorized
+from pymdp.algos.mmp import get_mmp_message_operators
+from pymdp.maths import get_joint_likelihood_seq, get_joint_likelihood_seq_by_modality, spm_norm
 
 DATA_PATH = "test/matlab_crossval/output/"
 
@@ -169,6 +171,44 @@ class MMP(unittest.TestCase):
 
         for f in range(num_factors):
             self.assertTrue(np.isclose(result_spm[f].squeeze(), result_pymdp[f]).all())
+
+    def test_mmp_message_operators(self):
+        """
+        Tests that the transition operators of `run_mmp_factorized` are only re-computed when `B` changes, and that
+        passing them in gives the same posteriors as computing them within `run_mmp_factorized`
+        """
+
+        num_obs = [3, 4]
+        num_states = [2, 3, 4]
+        num_controls = [2, 1, 3]
+        A_factor_list = [[0, 1], [2]]
+        B_factor_list = [[0], [0, 1], [2]]
+        mb_dict = {'A_factor_list': A_factor_list, 'A_modality_list': [[0], [0], [1]]}
+
+        A = utils.random_A_matrix(num_obs, num_states, A_factor_list=A_factor_list)
+        B = utils.random_B_matrix(num_states, num_controls, B_factor_list=B_factor_list)
+
+        msg_ops = get_mmp_message_operators(B, B_factor_list)
+        self.assertIs(get_mmp_message_operators(B, B_factor_list, msg_ops), msg_ops)
+        self.assertIsNot(get_mmp_message_operators(utils.random_B_matrix(num_states, num_controls, B_factor_list=B_factor_list), B_factor_list, msg_ops), msg_ops)
+
+        self.assertIsNone(msg_ops['trans_B'][1])
+        for f in [0, 2]:
+            for u in range(num_controls[f]):
+                self.assertTrue(np.allclose(msg_ops['trans_B'][f][..., u], spm_norm(B[f][..., u].T)))
+
+        prev_obs = [[np.random.randint(obs_dim) for obs_dim in num_obs] for _ in range(3)]
+        lh_seq = get_joint_likelihood_seq_by_modality(A, prev_obs, num_states)
+        prev_actions = np.array([[1, 0, 2], [0, 0, 1]])
+        policy = np.array([[1, 0, 0], [0, 0, 2]])
+
+        qs_seq, F = run_mmp_factorized(lh_seq, mb_dict, B, B_factor_list, policy, prev_actions=prev_actions, grad_descent=False)
+        qs_seq_ops, F_ops = run_mmp_factorized(lh_seq, mb_dict, B, B_factor_list, policy, prev_actions=prev_actions, grad_descent=False, msg_ops=msg_ops)
+
+        self.assertTrue(np.isclose(F, F_ops))
+        for qs_t, qs_t_ops in zip(qs_seq, qs_seq_ops):
+            for f in range(len(num_states)):
+                self.assertTrue(np.allclose(qs_t[f], qs_t_ops[f]))
     
     """"
     @ NOTE (from Conor Heins 07.04.2021)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Unit Tests
+__author__: Dimitrije Markovic, Conor Heins
+"""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from pymdp.agent import Agent
+from pymdp.envs import TMazeEnv
+from pymdp.runner import run_episodes, TIMING_NAMES
+
+def make_env():
+    return TMazeEnv(reward_probs=[0.9, 0.1])
+
+def make_agent():
+    env = make_env()
+    agent = Agent(A=env.get_likelihood_dist(), B=env.get_transition_dist(), control_fac_idx=[0], action_selection="stochastic")
+    agent.C[1][1], agent.C[1][2] = 3.0, -3.0
+    return agent
+
+def make_broken_env():
+    raise ValueError("broken environment")
+
+def make_dying_env():
+    os._exit(1) # the worker process dies without reporting an error
+
+class TestRunner(unittest.TestCase):
+
+    def test_run_episodes(self):
+        """
+        Tests that episodes run across worker processes stream one record per timestep to the trajectory log, and that the records
+        of each episode only depend on the seed, not on the number of workers
+        """
+
+        num_episodes, num_timesteps = 4, 3
+
+        with tempfile.TemporaryDirectory() as directory:
+            reader = run_episodes(make_agent, make_env, num_episodes, num_timesteps, directory, num_workers=2, seed=0, queue_size=2, segment_size=5)
+            self.assertEqual(reader.segment_lengths, [5, 5, 2])
+            records = {field: reader[field] for field in reader.fields}
+
+        num_policies = len(make_agent().policies)
+        self.assertEqual(records["obs"].shape, (num_episodes * num_timesteps, 3))
+        self.assertEqual(records["action"].shape, (num_episodes * num_timesteps, 2))
+        self.assertEqual(records["q_pi"].shape, (num_episodes * num_timesteps, num_policies))
+        self.assertEqual(records["G"].shape, (num_episodes * num_timesteps, num_policies))
+        self.assertEqual(records["timings"].shape, (num_episodes * num_timesteps, len(TIMING_NAMES)))
+        self.assertTrue(np.allclose(records["q_pi"].sum(-1), 1.0))
+
+        order = np.lexsort((records["t"], records["episode"]))
+        self.assertTrue((records["episode"][order] == np.repeat(np.arange(num_episodes), num_timesteps)).all())
+        self.assertTrue((records["t"][order] == np.tile(np.arange(num_timesteps), num_episodes)).all())
+
+        with tempfile.TemporaryDirectory() as directory:
+            reader = run_episodes(make_agent, make_env, num_episodes, num_timesteps, directory, num_workers=0, seed=0)
+            records_inline = {field: reader[field] for field in reader.fields}
+
+        for field in ["obs", "action", "q_pi"]:
+            self.assertTrue(np.allclose(records[field][order], records_inline[field]))
+
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(RuntimeError):
+                run_episodes(make_agent, make_broken_env, 2, num_timesteps, directory, num_workers=1)
+
+    def test_run_episodes_dead_worker(self):
+        """
+        Tests that the parent process raises, rather than waiting forever, when a worker process dies before finishing its episodes
+        """
+
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(RuntimeError):
+                run_episodes(make_agent, make_dying_env, 2, 3, directory, num_workers=2, poll_interval=0.1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Unit Tests
+__author__: Dimitrije Markovic, Conor Heins
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+
+import jax.numpy as jnp
+from jax import random
+
+from pymdp.jax.agent import Agent
+from pymdp.jax.task import PyMDPEnv, rollout
+from pymdp.jax.sharding import make_batch_mesh, shard_batch
+from pymdp.utils import random_A_matrix, random_B_matrix
+
+MULTI_DEVICE_SCRIPT = """
+import os
+os.environ["XLA_FLAGS"] = "--xla_force_host_platform_device_count=4"
+import jax, jax.numpy as jnp
+from pymdp.jax.sharding import make_batch_mesh, shard_batch
+
+assert len(jax.devices()) == 4
+x = shard_batch({"batched": jnp.ones((8, 3)), "replicated": jnp.ones(3)}, 8, make_batch_mesh())
+assert len(x["batched"].addressable_shards) == 4 and x["batched"].addressable_shards[0].data.shape == (2, 3)
+assert x["replicated"].addressable_shards[0].data.shape == (3,)
+try:
+    shard_batch(jnp.ones((6, 3)), 6, make_batch_mesh())
+    raise AssertionError("expected a ValueError")
+except ValueError:
+    pass
+"""
+
+class TestShardingJax(unittest.TestCase):
+
+    def test_sharded_rollout(self):
+        """
+        Tests that a rollout of agents and environments whose batches are sharded across the available devices gives the same result as
+        an unsharded rollout
+        """
+
+        batch_size, num_timesteps = 4, 5
+        num_obs = [3, 4]
+        num_states = [3, 2]
+        num_controls = [2, 2]
+
+        A = [jnp.broadcast_to(a, (batch_size,) + a.shape) for a in random_A_matrix(num_obs, num_states)]
+        B = [jnp.broadcast_to(b, (batch_size,) + b.shape) for b in random_B_matrix(num_states, num_controls)]
+        C = [jnp.zeros((batch_size, no)) for no in num_obs]
+        D = [jnp.ones((batch_size, ns)) / ns for ns in num_states]
+
+        agent = Agent(A, B, C, D, None, None, None, action_selection="stochastic")
+        env = PyMDPEnv({"A": A, "B": B, "D": D}, {"A": agent.A_dependencies, "B": agent.B_dependencies})
+
+        _, info = rollout(agent, env, num_timesteps, random.PRNGKey(0))
+
+        mesh = make_batch_mesh()
+        _, info_sharded = rollout(shard_batch(agent, batch_size, mesh), shard_batch(env, batch_size, mesh), num_timesteps, random.PRNGKey(0))
+
+        self.assertTrue((info["action"] == info_sharded["action"]).all())
+        self.assertTrue(jnp.allclose(info["q_pi"], info_sharded["q_pi"], atol=1e-5))
+
+    def test_multi_device_sharding(self):
+        """
+        Tests that batches are split across emulated host devices (which have to be set up before jax is imported, hence in a separate process)
+        """
+
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([repo_root] + sys.path))
+        result = subprocess.run([sys.executable, "-c", MULTI_DEVICE_SCRIPT], env=env, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+if __name__ == "__main__":
+    unittest.main()
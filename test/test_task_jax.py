@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Unit Tests
+__author__: Dimitrije Markovic, Conor Heins
+"""
+
+import unittest
+
+import numpy as np
+import jax.numpy as jnp
+from jax import lax, jit, random
+
+from pymdp.jax.task import PyMDPEnv
+
+class TestTaskJax(unittest.TestCase):
+
+    def test_env_step_in_scan(self):
+        """
+        Tests that a batch of `PyMDPEnv` environments can be stepped inside a jitted `lax.scan`, with deterministic dynamics and observations,
+        and that the visited states are recorded in the preallocated trajectory buffer
+        """
+
+        batch_size, num_steps, num_states = 4, 6, 5
+
+        A = jnp.broadcast_to(jnp.eye(num_states), (batch_size, num_states, num_states))
+        # action 0 stays in the current state, action 1 moves to the next state
+        B = jnp.stack([jnp.eye(num_states), jnp.roll(jnp.eye(num_states), 1, axis=0)], -1)
+        B = jnp.broadcast_to(B, (batch_size,) + B.shape)
+        D = jnp.broadcast_to(jnp.eye(num_states)[0], (batch_size, num_states))
+
+        env = PyMDPEnv({"A": [A], "B": [B], "D": [D]}, {"A": [[0]], "B": [[0]]}, trajectory_len=num_steps)
+        actions = jnp.ones((num_steps, batch_size, 1), dtype=jnp.int32)
+
+        @jit
+        def run(env, key):
+            def step_fn(env, xs):
+                key, action = xs
+                obs, env = env.step(random.split(key, batch_size), action)
+                return env, obs[0]
+            return lax.scan(step_fn, env, (random.split(key, num_steps), actions))
+
+        env, obs = run(env, random.PRNGKey(0))
+
+        expected = jnp.broadcast_to(jnp.arange(1, num_steps + 1)[:, None] % num_states, (num_steps, batch_size))
+        self.assertTrue((obs == expected).all())
+        self.assertTrue((env.state[0] == expected[-1]).all())
+        self.assertTrue((env.trajectory[0] == expected.T).all())
+        self.assertTrue((env.t == num_steps).all())
+
+        env = env.reset()
+        self.assertTrue((env.state[0] == 0).all())
+        self.assertTrue((env.t == 0).all())
+
+    def test_env_reset_sampling(self):
+        """
+        Tests that sampling initial states with `reset` follows the initial state distribution `D`
+        """
+
+        batch_size, num_states = 20000, 3
+
+        D = jnp.broadcast_to(jnp.array([0.2, 0.5, 0.3]), (batch_size, num_states))
+        A = jnp.broadcast_to(jnp.eye(num_states), (batch_size, num_states, num_states))
+        B = jnp.broadcast_to(jnp.eye(num_states)[..., None], (batch_size, num_states, num_states, 1))
+
+        env = PyMDPEnv({"A": [A], "B": [B], "D": [D]}, {"A": [[0]], "B": [[0]]}).reset(random.PRNGKey(1))
+        freqs = np.bincount(np.array(env.state[0]), minlength=num_states) / batch_size
+
+        self.assertTrue(np.allclose(freqs, D[0], atol=0.02))
+
+if __name__ == "__main__":
+    unittest.main()
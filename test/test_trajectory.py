@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Unit Tests
+__author__: Dimitrije Markovic, Conor Heins
+"""
+
+import tempfile
+import unittest
+
+import numpy as np
+
+from pymdp.agent import Agent
+from pymdp.envs import TMazeEnv
+from pymdp.trajectory import TrajectoryWriter, TrajectoryReader, agent_record
+
+class TestTrajectory(unittest.TestCase):
+
+    def test_write_read(self):
+        """
+        Tests that records written in segments are read back with their dtypes and shapes, through memory-mapped segments
+        and through reads of arbitrary ranges of records
+        """
+
+        num_records = 10
+        rng = np.random.default_rng(0)
+        records = [{"t": np.array(t), "obs": rng.integers(5, size=3), "q_pi": rng.random(4).astype(np.float32)} for t in range(num_records)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            with TrajectoryWriter(directory, segment_size=4) as writer:
+                for record in records:
+                    writer.append(record)
+
+                with self.assertRaises(ValueError):
+                    writer.append({"t": np.array(0), "obs": np.zeros(2, dtype=int), "q_pi": np.zeros(4, dtype=np.float32)})
+                with self.assertRaises(ValueError):
+                    writer.append({"t": np.array(0)})
+
+            reader = TrajectoryReader(directory)
+            self.assertEqual(len(reader), num_records)
+            self.assertEqual(reader.segment_lengths, [4, 4, 2])
+
+            for field in records[0]:
+                expected = np.stack([record[field] for record in records])
+                self.assertEqual(reader[field].dtype, expected.dtype)
+                self.assertTrue(np.array_equal(reader[field], expected))
+                self.assertTrue(all(isinstance(segment, np.memmap) for segment in reader.segments(field)))
+                self.assertTrue(np.array_equal(np.concatenate(list(reader.segments(field))), expected))
+                for start, stop in [(0, 4), (3, 9), (5, 6), (8, 20), (6, 6)]:
+                    self.assertTrue(np.array_equal(reader.read(field, start, stop), expected[start:stop]))
+
+            self.assertEqual([len(segment["obs"]) for segment in reader.iter_segments()], [4, 4, 2])
+
+    def test_agent_record(self):
+        """
+        Tests recording the beliefs, policy posteriors, expected free energies, observations and actions of an agent over an episode,
+        for the `VANILLA` and `FILTER` inference algorithms
+        """
+
+        for inference_algo in ["VANILLA", "FILTER"]:
+            env = TMazeEnv(reward_probs=[0.9, 0.1])
+            agent = Agent(A=env.get_likelihood_dist(), B=env.get_transition_dist(), control_fac_idx=[0], inference_algo=inference_algo)
+
+            num_timesteps = 3
+            qs_hist = []
+            with tempfile.TemporaryDirectory() as directory:
+                with TrajectoryWriter(directory, segment_size=2) as writer:
+                    obs = env.reset()
+                    for t in range(num_timesteps):
+                        qs_hist.append(agent.infer_states(obs))
+                        agent.infer_policies()
+                        action = agent.sample_action()
+                        writer.append(agent_record(agent, obs, t=t))
+                        obs = env.step(action)
+
+                reader = TrajectoryReader(directory)
+                self.assertTrue(np.array_equal(reader["t"], np.arange(num_timesteps)))
+                self.assertEqual(reader["obs"].shape, (num_timesteps, agent.num_modalities))
+                self.assertTrue(np.array_equal(reader["action"][-1], agent.action))
+                for f in range(agent.num_factors):
+                    self.assertTrue(np.allclose(reader[f"qs_{f}"], np.stack([qs[f] for qs in qs_hist])))
+                self.assertTrue(np.allclose(reader["q_pi"][-1], agent.q_pi))
+                self.assertTrue(np.allclose(reader["G"][-1], agent.G))
+
+if __name__ == "__main__":
+    unittest.main()